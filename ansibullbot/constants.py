@@ -138,6 +138,8 @@ def get_config(p, section, key, env_var, default,
 
     if value_type in ['integer', 'int', 'float', 'boolean']:
         return value
+    elif value_type == 'list' and isinstance(value, list):
+        return value
     else:
         return to_text(value, errors='surrogate_or_strict', nonstring='passthru')
 
@@ -244,6 +246,16 @@ DEFAULT_GITHUB_TOKEN = get_config(
     value_type='string'
 )
 
+# extra tokens used only for reads, writes always use the bot's identity
+DEFAULT_GITHUB_READ_TOKENS = get_config(
+    p,
+    DEFAULTS,
+    'github_read_tokens',
+    '%s_GITHUB_READ_TOKENS' % PROG_NAME.upper(),
+    '',
+    value_type='list'
+)
+
 DEFAULT_SHIPPABLE_TOKEN = get_config(
     p,
     DEFAULTS,
@@ -281,6 +293,100 @@ DEFAULT_STALE_WINDOW = get_config(
     value_type='int'
 )
 
+# seconds the repo's assignees and labels and the org's members and
+# core team are used before they are fetched again
+DEFAULT_REFERENCE_TTL = get_config(
+    p,
+    DEFAULTS,
+    'reference_ttl',
+    '%s_REFERENCE_TTL' % PROG_NAME.upper(),
+    3600,
+    value_type='int'
+)
+
+# minimum seconds between two api writes
+DEFAULT_WRITE_INTERVAL = get_config(
+    p,
+    DEFAULTS,
+    'write_interval',
+    '%s_WRITE_INTERVAL' % PROG_NAME.upper(),
+    1.0,
+    value_type='float'
+)
+
+# comments and issues created per window, count:seconds pairs kept
+# below github's secondary rate limits
+DEFAULT_WRITE_LIMITS = get_config(
+    p,
+    DEFAULTS,
+    'write_limits',
+    '%s_WRITE_LIMITS' % PROG_NAME.upper(),
+    '20:60,450:3600',
+    value_type='list'
+)
+
+# with --force in the daemon and webhook loops, journal the actions
+# and write them from a background thread while triage moves on
+DEFAULT_WRITE_BEHIND = get_config(
+    p,
+    DEFAULTS,
+    'write_behind',
+    '%s_WRITE_BEHIND' % PROG_NAME.upper(),
+    True,
+    value_type='boolean'
+)
+
+DEFAULT_ACTION_JOURNAL = get_config(
+    p,
+    DEFAULTS,
+    'action_journal',
+    '%s_ACTION_JOURNAL' % PROG_NAME.upper(),
+    '~/.ansibullbot/cache/actions.sqlite',
+    value_type='path'
+)
+
+# attempts for each journaled action before it is given up
+DEFAULT_ACTION_RETRIES = get_config(
+    p,
+    DEFAULTS,
+    'action_retries',
+    '%s_ACTION_RETRIES' % PROG_NAME.upper(),
+    5,
+    value_type='int'
+)
+
+# issues fetched in background threads ahead of the one being
+# triaged, 0 fetches each issue when the loop reaches it
+DEFAULT_PREFETCH_ISSUES = get_config(
+    p,
+    DEFAULTS,
+    'prefetch_issues',
+    '%s_PREFETCH_ISSUES' % PROG_NAME.upper(),
+    4,
+    value_type='int'
+)
+
+# Send If-None-Match/If-Modified-Since on api GETs so unchanged
+# responses come back as (free) 304s
+DEFAULT_CONDITIONAL_REQUESTS = get_config(
+    p,
+    DEFAULTS,
+    'conditional_requests',
+    '%s_CONDITIONAL_REQUESTS' % PROG_NAME.upper(),
+    True,
+    value_type='boolean'
+)
+
+# bytes of compressed conditional request bodies to keep before evicting
+DEFAULT_CONDITIONAL_CACHE_SIZE = get_config(
+    p,
+    DEFAULTS,
+    'conditional_cache_size',
+    '%s_CONDITIONAL_CACHE_SIZE' % PROG_NAME.upper(),
+    256 * 1024 * 1024,
+    value_type='int'
+)
+
 ###########################################
 #   METADATA RECEIVER
 ###########################################
@@ -302,3 +408,212 @@ DEFAULT_RECEIVER_PORT = get_config(
     None,
     value_type='int'
 )
+
+# unsent payloads are kept here while the receiver is unreachable
+DEFAULT_RECEIVER_SPOOL = get_config(
+    p,
+    'receiver',
+    'spool',
+    '%s_RECEIVER_SPOOL' % PROG_NAME.upper(),
+    '~/.ansibullbot/cache/receiver.spool',
+    value_type='path'
+)
+
+# records per bulk post
+DEFAULT_RECEIVER_BATCH_SIZE = get_config(
+    p,
+    'receiver',
+    'batch_size',
+    '%s_RECEIVER_BATCH_SIZE' % PROG_NAME.upper(),
+    100,
+    value_type='int'
+)
+
+# seconds to wait for a batch to fill before sending it anyway
+DEFAULT_RECEIVER_FLUSH_INTERVAL = get_config(
+    p,
+    'receiver',
+    'flush_interval',
+    '%s_RECEIVER_FLUSH_INTERVAL' % PROG_NAME.upper(),
+    5,
+    value_type='int'
+)
+
+# longest wait between retries while the receiver is down
+DEFAULT_RECEIVER_MAX_BACKOFF = get_config(
+    p,
+    'receiver',
+    'max_backoff',
+    '%s_RECEIVER_MAX_BACKOFF' % PROG_NAME.upper(),
+    5 * 60,
+    value_type='int'
+)
+
+###########################################
+#   SHIPPABLE RESPONSE CACHE
+###########################################
+
+# seconds before a cached response is refetched, by endpoint class
+DEFAULT_SHIPPABLE_TTL_RUNS = get_config(
+    p,
+    'shippable',
+    'ttl_runs',
+    '%s_SHIPPABLE_TTL_RUNS' % PROG_NAME.upper(),
+    5 * 60,
+    value_type='int'
+)
+
+DEFAULT_SHIPPABLE_TTL_RUN = get_config(
+    p,
+    'shippable',
+    'ttl_run',
+    '%s_SHIPPABLE_TTL_RUN' % PROG_NAME.upper(),
+    10 * 60,
+    value_type='int'
+)
+
+DEFAULT_SHIPPABLE_TTL_JOBS = get_config(
+    p,
+    'shippable',
+    'ttl_jobs',
+    '%s_SHIPPABLE_TTL_JOBS' % PROG_NAME.upper(),
+    10 * 60,
+    value_type='int'
+)
+
+DEFAULT_SHIPPABLE_TTL_REPORTS = get_config(
+    p,
+    'shippable',
+    'ttl_reports',
+    '%s_SHIPPABLE_TTL_REPORTS' % PROG_NAME.upper(),
+    60 * 60,
+    value_type='int'
+)
+
+# bytes of compressed responses to keep before evicting
+DEFAULT_SHIPPABLE_CACHE_SIZE = get_config(
+    p,
+    'shippable',
+    'cache_size',
+    '%s_SHIPPABLE_CACHE_SIZE' % PROG_NAME.upper(),
+    512 * 1024 * 1024,
+    value_type='int'
+)
+
+###########################################
+#   WEBHOOKS
+###########################################
+
+# github users whose comments and events are the bot's own, shared by
+# the triager and scripts/ansibot_webhooks.py
+BOTNAMES = ['ansibot', 'gregdek', 'robynbergeron']
+
+# commands given to the bot at the start of a comment line
+VALID_COMMANDS = [
+    'needs_info',
+    '!needs_info',
+    'notabug',
+    'bot_status',
+    'bot_broken',
+    '!bot_broken',
+    'bot_skip',
+    '!bot_skip',
+    'wontfix',
+    'bug_resolved',
+    'resolved_by_pr',
+    'needs_contributor',
+    '!needs_contributor',
+    'needs_rebase',
+    '!needs_rebase',
+    'needs_revision',
+    '!needs_revision',
+    'shipit',
+    '!shipit',
+    'duplicate_of',
+    'close_me'
+]
+
+# commands the fact plugins (ci_rebuild, label_commands) act on
+PLUGIN_COMMANDS = ['rebuild_merge', '+label', '-label']
+
+# shared secret configured on the github webhook
+DEFAULT_WEBHOOK_SECRET = get_config(
+    p,
+    'webhooks',
+    'secret',
+    '%s_WEBHOOK_SECRET' % PROG_NAME.upper(),
+    '',
+    value_type='string'
+)
+
+# the queue the webhook receiver fills and the triager drains
+DEFAULT_WEBHOOK_QUEUE = get_config(
+    p,
+    'webhooks',
+    'queue',
+    '%s_WEBHOOK_QUEUE' % PROG_NAME.upper(),
+    '~/.ansibullbot/cache/webhooks.sqlite',
+    value_type='path'
+)
+
+# seconds between queue checks when it is empty
+DEFAULT_WEBHOOK_POLL_INTERVAL = get_config(
+    p,
+    'webhooks',
+    'poll_interval',
+    '%s_WEBHOOK_POLL_INTERVAL' % PROG_NAME.upper(),
+    5,
+    value_type='int'
+)
+
+# issues per priority class (command, ci, updated, stale) a daemon loop
+# triages, the rest wait for the next loop. 0 is no limit.
+DEFAULT_SCHEDULER_BUDGETS = get_config(
+    p,
+    'scheduler',
+    'budgets',
+    '%s_SCHEDULER_BUDGETS' % PROG_NAME.upper(),
+    '',
+    value_type='list'
+)
+
+# score weights of the command, ci, recency and stale signals
+DEFAULT_SCHEDULER_WEIGHTS = get_config(
+    p,
+    'scheduler',
+    'weights',
+    '%s_SCHEDULER_WEIGHTS' % PROG_NAME.upper(),
+    '',
+    value_type='list'
+)
+
+# where --worker_id triagers keep their issue leases and heartbeats,
+# sqlite:///path or package.module:Class[:argument] for other backends
+DEFAULT_SHARD_LEASE_STORE = get_config(
+    p,
+    'sharding',
+    'lease_store',
+    '%s_SHARD_LEASE_STORE' % PROG_NAME.upper(),
+    'sqlite:///~/.ansibullbot/cache/leases.sqlite',
+    value_type='string'
+)
+
+# seconds an issue stays leased to the worker triaging it
+DEFAULT_SHARD_LEASE_TTL = get_config(
+    p,
+    'sharding',
+    'lease_ttl',
+    '%s_SHARD_LEASE_TTL' % PROG_NAME.upper(),
+    900,
+    value_type='int'
+)
+
+# seconds without a heartbeat before a worker's shard is handed out
+DEFAULT_SHARD_HEARTBEAT_TTL = get_config(
+    p,
+    'sharding',
+    'heartbeat_ttl',
+    '%s_SHARD_HEARTBEAT_TTL' % PROG_NAME.upper(),
+    120,
+    value_type='int'
+)
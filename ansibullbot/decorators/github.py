@@ -13,11 +13,20 @@ import ssl
 import sys
 import time
 from ansibullbot.errors import RateLimitError
+from ansibullbot.utils.token_pool import get_token_pool
 
 import ansibullbot.constants as C
 
 
 def get_rate_limit():
+
+    # the pool already knows the bot's quota from the last response
+    pool = get_token_pool()
+    if pool:
+        quota = pool.get_quota()
+        if quota:
+            return {'resources': {'core': quota}}
+
     username = C.DEFAULT_GITHUB_USERNAME
     password = C.DEFAULT_GITHUB_PASSWORD
     token = C.DEFAULT_GITHUB_TOKEN
@@ -63,6 +72,16 @@ def get_reset_time(fn, args):
     # default to 62 minutes
     reset_time = 60 * 62
 
+    # while the bot can still write, the call that hit the limit was a
+    # read and the pool knows when a read token has quota again
+    pool = get_token_pool()
+    if pool:
+        quota = pool.get_quota()
+        if quota and quota['remaining'] > 0:
+            reset_time = max(pool.get_reset_time(), 5)
+            logging.debug('get_reset_time [pool]: %s(s)' % reset_time)
+            return reset_time
+
     rl = get_rate_limit()
 
     if rl:
@@ -31,6 +31,7 @@ import json
 import logging
 import os
 import pytz
+import time
 
 import ansibullbot.constants as C
 
@@ -39,14 +40,27 @@ from ansibullbot.triagers.defaulttriager import DefaultTriager
 from ansibullbot.wrappers.ghapiwrapper import GithubWrapper
 from ansibullbot.wrappers.issuewrapper import IssueWrapper
 
+from ansibullbot.utils.cache_store import get_cache_store
 from ansibullbot.utils.extractors import extract_pr_number_from_comment
+from ansibullbot.utils.fact_pipeline import LazyMeta
+from ansibullbot.utils.fact_pipeline import declare_facts
+from ansibullbot.utils.iterators import PrefetchingRepoIssuesIterator
 from ansibullbot.utils.iterators import RepoIssuesIterator
+from ansibullbot.utils.meta_index import MetaIndex
 from ansibullbot.utils.moduletools import ModuleIndexer
 from ansibullbot.utils.version_tools import AnsibleVersionIndexer
 from ansibullbot.utils.file_tools import FileIndexer
 from ansibullbot.utils.shippable_api import ShippableRuns
 from ansibullbot.utils.systemtools import run_command
+from ansibullbot.utils.systemtools import write_atomic
 from ansibullbot.utils.receiver_client import post_to_receiver
+from ansibullbot.utils.receiver_client import set_receiver_worker
+from ansibullbot.utils.reference_data import get_reference_data
+from ansibullbot.utils.scheduler import PriorityScheduler
+from ansibullbot.utils.scheduler import parse_class_values
+from ansibullbot.utils.sharding import ShardWorker
+from ansibullbot.utils.sharding import get_lease_store
+from ansibullbot.utils.webhook_queue import WebhookQueue
 from ansibullbot.utils.webscraper import GithubWebScraper
 from ansibullbot.utils.gh_gql_client import GithubGraphQLClient
 
@@ -90,7 +104,7 @@ ERROR_CODES = {
 
 class AnsibleTriage(DefaultTriager):
 
-    BOTNAMES = ['ansibot', 'gregdek', 'robynbergeron']
+    BOTNAMES = C.BOTNAMES
 
     EMPTY_ACTIONS = {
         'newlabel': [],
@@ -139,29 +153,7 @@ class AnsibleTriage(DefaultTriager):
         'network': "networking"
     }
 
-    VALID_COMMANDS = [
-        'needs_info',
-        '!needs_info',
-        'notabug',
-        'bot_status',
-        'bot_broken',
-        '!bot_broken',
-        'bot_skip',
-        '!bot_skip',
-        'wontfix',
-        'bug_resolved',
-        'resolved_by_pr',
-        'needs_contributor',
-        '!needs_contributor',
-        'needs_rebase',
-        '!needs_rebase',
-        'needs_revision',
-        '!needs_revision',
-        'shipit',
-        '!shipit',
-        'duplicate_of',
-        'close_me'
-    ]
+    VALID_COMMANDS = C.VALID_COMMANDS
 
     ISSUE_REQUIRED_FIELDS = [
         'issue type',
@@ -178,9 +170,6 @@ class AnsibleTriage(DefaultTriager):
 
     def __init__(self, args):
 
-        self._ansible_members = []
-        self._ansible_core_team = []
-
         self.args = args
         self.last_run = None
         self.daemonize = None
@@ -215,12 +204,31 @@ class AnsibleTriage(DefaultTriager):
         self.cachedir = os.path.expanduser(self.cachedir)
         self.cachedir_base = self.cachedir
 
+        # last processed time and updated_at for every dumped meta
+        self.meta_index = MetaIndex(get_cache_store(self.cachedir_base))
+
+        # labels, org members and the core team, refreshed after a ttl
+        self.reference = get_reference_data(
+            self.cachedir_base,
+            ttl=C.DEFAULT_REFERENCE_TTL
+        )
+
         # repo objects
         self.repos = {}
 
         # scraped summaries for all issues
         self.issue_summaries = {}
 
+        # {repo: [numbers]} when triaging just what webhooks touched
+        self.webhook_targets = None
+        # {repo: [numbers]} with bot commands in their new comments
+        self.webhook_commands = {}
+        # {repo: set(numbers)} of webhook targets left for a later batch
+        self.webhook_skipped = {}
+
+        # time to triage per priority class, kept across loops
+        self.triage_latency = {}
+
         self.set_logger()
         logging.info('starting bot')
 
@@ -240,6 +248,19 @@ class AnsibleTriage(DefaultTriager):
         if hasattr(self.args, 'pause') and self.args.pause:
             self.always_pause = True
 
+        # with --worker_id the issues are split with the other workers
+        self.shard = None
+        if getattr(self.args, 'worker_id', None):
+            logging.info('joining shard workers as %s' % self.args.worker_id)
+            set_receiver_worker(self.args.worker_id)
+            self.shard = ShardWorker(
+                self.args.worker_id,
+                get_lease_store(C.DEFAULT_SHARD_LEASE_STORE),
+                lease_ttl=C.DEFAULT_SHARD_LEASE_TTL,
+                heartbeat_ttl=C.DEFAULT_SHARD_HEARTBEAT_TTL
+            )
+            self.shard.start()
+
         # connect to github
         logging.info('creating api connection')
         self.gh = self._connect()
@@ -256,9 +277,13 @@ class AnsibleTriage(DefaultTriager):
         else:
             self.gqlc = None
 
+        # forced daemon and webhook runs write from a background thread,
+        # started by run() once there is something to replay entries with
+        self.executor = None
+
         # get valid labels
         logging.info('getting labels')
-        self.valid_labels = self.get_valid_labels('ansible/ansible')
+        logging.info('%s valid labels' % len(self.valid_labels))
 
         # extend managed labels
         self.MANAGED_LABELS += self.ISSUE_TYPES.values()
@@ -305,17 +330,32 @@ class AnsibleTriage(DefaultTriager):
             else:
                 self.args.start_at = resume['number'] + 1
 
+    @property
+    def valid_labels(self):
+        return self.reference.get(
+            'ansible/ansible',
+            'labels',
+            lambda: self.get_valid_labels('ansible/ansible')
+        )
+
     @property
     def ansible_members(self):
-        if not self._ansible_members:
-            self._ansible_members = self.get_ansible_members()
-        return [x for x in self._ansible_members]
+        return self.reference.get(
+            'ansible',
+            'members',
+            self.get_ansible_members
+        )
 
     @property
     def ansible_core_team(self):
-        if not self._ansible_core_team:
-            self._ansible_core_team = self.get_ansible_core_team()
-        return [x for x in self._ansible_core_team if x not in self.BOTNAMES]
+        return self.reference.get(
+            'ansible',
+            'core_team',
+            lambda: [
+                x for x in self.get_ansible_core_team()
+                if x not in self.BOTNAMES
+            ]
+        )
 
     def get_rate_limit(self):
         return self.gh.get_rate_limit().raw_data
@@ -323,12 +363,14 @@ class AnsibleTriage(DefaultTriager):
     def run(self):
         '''Primary execution method'''
 
-        # update on each run to pull in new data
-        logging.info('updating module indexer')
-        self.module_indexer.update()
+        # update on each run to pull in new data, webhook batches
+        # rely on the last full run
+        if self.webhook_targets is None:
+            logging.info('updating module indexer')
+            self.module_indexer.update()
 
-        # update shippable run data
-        self.SR.update()
+            # update shippable run data
+            self.SR.update()
 
         # get all of the open issues [or just one]
         self.collect_repos()
@@ -337,11 +379,20 @@ class AnsibleTriage(DefaultTriager):
         if self.args.collect_only:
             return
 
+        # entries journaled before a restart are replayed right away and
+        # need the indexers, SR and the collected repos
+        if self.executor is None and self.use_write_behind():
+            self.start_action_executor()
+
         # loop through each repo made by collect_repos
         for item in self.repos.items():
             repopath = item[0]
             repo = item[1]['repo']
 
+            if self.webhook_targets is not None and \
+                    repopath not in self.webhook_targets:
+                continue
+
             # skip repos based on args
             if self.skiprepo:
                 if repopath in self.skiprepo:
@@ -395,6 +446,21 @@ class AnsibleTriage(DefaultTriager):
                     redo = False
                     continue
 
+                # the last triage of it hasn't been written out yet
+                if self.executor and \
+                        self.executor.journal.pending(repopath, number):
+                    logging.info('%s has journaled actions, skipping' % number)
+                    if self.webhook_targets is not None:
+                        self.webhook_skipped.setdefault(
+                            repopath, set()
+                        ).add(number)
+                    continue
+
+                # another worker may be triaging it after a ring change
+                if self.shard and not self.shard.acquire(repopath, number):
+                    logging.info('%s is leased by another worker' % number)
+                    continue
+
                 # users may want to re-run this issue after manual intervention
                 redo = True
 
@@ -425,77 +491,6 @@ class AnsibleTriage(DefaultTriager):
                         file_indexer=self.file_indexer
                     )
 
-                    if self.args.skip_no_update:
-                        lmeta = self.load_meta(iw)
-
-                        if lmeta:
-
-                            now = datetime.datetime.now()
-                            mod_repo = (iw.repo_full_name in MREPOS)
-                            skip = False
-
-                            if lmeta['updated_at'] == iw.updated_at.isoformat():
-                                skip = True
-
-                            if skip and not mod_repo:
-                                if iw.is_pullrequest():
-                                    ua = iw.pullrequest.updated_at.isoformat()
-                                    if lmeta['updated_at'] < ua:
-                                        skip = False
-
-                            if skip and not mod_repo:
-
-                                # re-check ansible/ansible after
-                                # a window of time since the last check.
-                                lt = lmeta['time']
-                                lt = datetime.datetime.strptime(
-                                    lt,
-                                    '%Y-%m-%dT%H:%M:%S.%f'
-                                )
-                                delta = (now - lt)
-                                delta = delta.days
-                                if delta > C.DEFAULT_STALE_WINDOW:
-                                    msg = '!skipping: %s' % delta
-                                    msg += ' days since last check'
-                                    logging.info(msg)
-                                    skip = False
-
-                                # if last process time is older than
-                                # last completion time on shippable, we need
-                                # to reprocess because the ci status has
-                                # probabaly changed.
-                                if skip and iw.is_pullrequest():
-                                    ua = iw.pullrequest.updated_at.isoformat()
-                                    mua = datetime.datetime.strptime(
-                                        lmeta['updated_at'],
-                                        '%Y-%m-%dT%H:%M:%S'
-                                    )
-                                    lsr = self.SR.get_last_completion(iw.number)
-                                    if (lsr and lsr > mua) or \
-                                            ua > lmeta['updated_at']:
-                                        skip = False
-
-                            # was this in the stale list?
-                            if skip and not mod_repo:
-                                if iw.number in self.repos[repopath]['stale']:
-                                    skip = False
-
-                            # do a final check on the timestamp in meta
-                            if skip and not mod_repo:
-                                # 2017-04-12T11:05:08.980077
-                                mts = datetime.datetime.strptime(
-                                    lmeta['time'],
-                                    '%Y-%m-%dT%H:%M:%S.%f'
-                                )
-                                delta = (now - mts).days
-                                if delta > C.DEFAULT_STALE_WINDOW:
-                                    skip = False
-
-                            if skip:
-                                msg = 'skipping: no changes since last run'
-                                logging.info(msg)
-                                continue
-
                     # pre-processing for non-module repos
                     if iw.repo_full_name not in MREPOS:
                         # force an update on the PR data
@@ -564,12 +559,28 @@ class AnsibleTriage(DefaultTriager):
 
                     pprint(self.actions)
 
+                    # a lease that expired mid triage may be taken already
+                    if self.shard and \
+                            not self.shard.renew(repopath, number):
+                        logging.warning(
+                            'lost the lease on %s, not applying actions'
+                            % number
+                        )
+                        break
+
                     # do the actions
                     action_meta = self.apply_actions(self.issue, self.actions)
                     if action_meta['REDO']:
                         redo = True
 
                 logging.info('finished triage for %s' % str(iw))
+                # with journaled actions the executor releases it later
+                if self.shard and not (
+                        self.executor and
+                        self.executor.journal.pending(repopath, number)):
+                    self.shard.release(repopath, number)
+                if self.repos[repopath].get('scheduler'):
+                    self.repos[repopath]['scheduler'].record_triaged(number)
 
     def update_issue_summaries(self, repopath=None):
 
@@ -589,6 +600,25 @@ class AnsibleTriage(DefaultTriager):
             if self.args.module_repos_only and 'module' not in repopath:
                 continue
 
+            if self.webhook_targets is not None:
+                # refresh only what the webhooks touched, the rest is
+                # kept from the last full run
+                summaries = self.issue_summaries.setdefault(rp, {})
+                for number in self.webhook_targets.get(rp, []):
+                    if self.gqlc:
+                        node = self.gqlc.get_summary(rp, 'pullRequest', number)
+                        if node is None:
+                            node = self.gqlc.get_summary(rp, 'issue', number)
+                    else:
+                        node = self.gws.get_single_issue_summary(
+                            rp,
+                            number,
+                            force=True
+                        )
+                    if node is not None:
+                        summaries[str(number)] = node
+                continue
+
             if self.gqlc:
                 if self.pr:
                     self.issue_summaries[repopath] = {}
@@ -634,6 +664,9 @@ class AnsibleTriage(DefaultTriager):
     def save_meta(self, issuewrapper, meta):
         # save the meta+actions
         dmeta = meta.copy()
+        # facts nothing read for this issue are left out
+        if isinstance(meta, LazyMeta):
+            dmeta['skipped_facts'] = meta.get_skipped()
         dmeta['submitter'] = issuewrapper.submitter
         dmeta['title'] = issuewrapper.title
         dmeta['html_url'] = issuewrapper.html_url
@@ -668,6 +701,89 @@ class AnsibleTriage(DefaultTriager):
             dmeta
         )
 
+    def run_targets(self, targets, commands=None):
+        '''Triage only the given {repo: [numbers]}
+
+        Returns the {repo: set(numbers)} that were skipped because their
+        last triage was still being written out.
+        '''
+        self.webhook_targets = targets
+        self.webhook_commands = commands or {}
+        self.webhook_skipped = {}
+        try:
+            self.run()
+            return self.webhook_skipped
+        finally:
+            self.webhook_targets = None
+            self.webhook_commands = {}
+            self.webhook_skipped = {}
+
+    def report_run_metrics(self):
+        super(AnsibleTriage, self).report_run_metrics()
+        for klass,histogram in sorted(self.triage_latency.items()):
+            logging.info(
+                'time to triage [%s]: %s' % (klass, histogram.get_stats())
+            )
+
+    def consume(self):
+        '''Triage issues from the webhook queue as they arrive
+
+        Polling stays as a full run every daemonize_interval to catch
+        anything the webhooks missed.
+        '''
+        queue = WebhookQueue(C.DEFAULT_WEBHOOK_QUEUE)
+        last_sweep = None
+        while True:
+            now = time.time()
+            if last_sweep is None or \
+                    now - last_sweep >= self.args.daemonize_interval:
+                logging.info('starting reconciliation run')
+                self.run()
+                self.report_run_metrics()
+                last_sweep = now
+
+            items = queue.claim()
+            if not items:
+                time.sleep(C.DEFAULT_WEBHOOK_POLL_INTERVAL)
+                continue
+
+            # many deliveries for one issue make one triage
+            targets = {}
+            commands = {}
+            for (itemid, repo, number, event) in items:
+                if repo not in REPOS:
+                    continue
+                targets.setdefault(repo, set()).add(number)
+                if event == 'command':
+                    commands.setdefault(repo, set()).add(number)
+            logging.info(
+                'webhooks: %s deliveries, %s issues' % (
+                    len(items),
+                    sum([len(x) for x in targets.values()])
+                )
+            )
+
+            skipped = {}
+            try:
+                if targets:
+                    skipped = self.run_targets(targets, commands=commands)
+            except Exception:
+                # the items become claimable again, let the error out
+                queue.release([x[0] for x in items])
+                raise
+
+            # issues with journaled actions get triaged in a later batch
+            retry = [
+                x[0] for x in items if x[2] in skipped.get(x[1], set())
+            ]
+            queue.ack([x[0] for x in items if x[0] not in retry])
+            if retry:
+                logging.info('webhooks: %s deliveries released' % len(retry))
+                queue.release(retry)
+                if len(retry) == len(items):
+                    # give the executor time to write them out
+                    time.sleep(C.DEFAULT_WEBHOOK_POLL_INTERVAL)
+
     def run_module_repo_issue(self, iw, hcache=None):
         ''' Module Repos are dead!!! '''
 
@@ -742,9 +858,41 @@ class AnsibleTriage(DefaultTriager):
             'meta.json'
         )
         meta['time'] = datetime.datetime.now().isoformat()
+
+        rfn = issuewrapper.repo_full_name
+        previous = self.meta_index.get(rfn, issuewrapper.number)
+        entry = self.meta_index.update(rfn, issuewrapper.number, meta)
+
+        # the index carries the new time, only rewrite changed metas
+        if previous and previous.hash == entry.hash and \
+                os.path.isfile(mfile):
+            logging.info('meta unchanged for %s' % issuewrapper.number)
+            return
+
         logging.info('dump meta to %s' % mfile)
-        with open(mfile, 'wb') as f:
-            json.dump(meta, f, sort_keys=True, indent=2)
+        mdir = os.path.dirname(mfile)
+        if not os.path.isdir(mdir):
+            os.makedirs(mdir)
+        write_atomic(mfile, json.dumps(meta, sort_keys=True, indent=2))
+
+    def get_meta_entry(self, reponame, number):
+        '''The meta index entry for an issue, indexing old meta.json files'''
+        entry = self.meta_index.get(reponame, number)
+        if entry is None:
+            mfile = os.path.join(
+                self.cachedir_base,
+                reponame,
+                'issues',
+                str(number),
+                'meta.json'
+            )
+            if os.path.isfile(mfile):
+                # written before the index existed
+                with open(mfile, 'rb') as f:
+                    meta = json.load(f)
+                if meta.get('time'):
+                    entry = self.meta_index.update(reponame, number, meta)
+        return entry
 
     def create_actions(self):
         '''Parse facts and make actions from them'''
@@ -1455,6 +1603,7 @@ class AnsibleTriage(DefaultTriager):
 
         stale = []
         reasons = {}
+        now = datetime.datetime.now()
 
         for number,summary in self.issue_summaries[reponame].items():
 
@@ -1465,26 +1614,14 @@ class AnsibleTriage(DefaultTriager):
                 continue
 
             number = int(number)
-            mfile = os.path.join(
-                self.cachedir_base,
-                reponame,
-                'issues',
-                str(number),
-                'meta.json'
-            )
+            entry = self.get_meta_entry(reponame, number)
 
-            if not os.path.isfile(mfile):
-                reasons[number] = '%s missing' % mfile
+            if entry is None:
+                reasons[number] = 'meta missing'
                 stale.append(number)
                 continue
 
-            with open(mfile, 'rb') as f:
-                meta = json.load(f)
-
-            ts = meta['time']
-            ts = datetime.datetime.strptime(ts, '%Y-%m-%dT%H:%M:%S.%f')
-            now = datetime.datetime.now()
-            delta = (now - ts).days
+            delta = (now - entry.time).days
 
             if delta > C.DEFAULT_STALE_WINDOW:
                 reasons[number] = '%s delta' % delta
@@ -1508,6 +1645,9 @@ class AnsibleTriage(DefaultTriager):
         self.ghw = GithubWrapper(self.gh)
 
         for repo in REPOS:
+            if self.webhook_targets is not None and \
+                    repo not in self.webhook_targets:
+                continue
             # skip repos based on args
             if self.skiprepo:
                 if repo in self.skiprepo:
@@ -1532,8 +1672,14 @@ class AnsibleTriage(DefaultTriager):
                 'processed': [],
                 'since': None,
                 'stale': [],
+                'deferred': [],
+                'scheduler': None,
                 'loopcount': 0
             }
+        elif self.webhook_targets is not None:
+            # a webhook batch is not a daemon loop, keep the repo object
+            # of the last full run
+            self.repos[repo]['issues'] = {}
         else:
             # force a clean repo object to limit caching problems
             self.repos[repo]['repo'] = \
@@ -1573,7 +1719,11 @@ class AnsibleTriage(DefaultTriager):
                     numbers = [int(self.pr)]
             logging.info('%s numbers from --id/--pr' % len(numbers))
 
-        if self.args.daemonize:
+        if self.webhook_targets is not None:
+            numbers = sorted(self.webhook_targets.get(repo, []))
+            logging.info('%s numbers from webhooks' % len(numbers))
+
+        elif self.args.daemonize:
 
             if not self.repos[repo]['since']:
                 ts = [
@@ -1624,7 +1774,7 @@ class AnsibleTriage(DefaultTriager):
             logging.info('%s numbers after start-at' % len(numbers))
 
         # Get stale numbers if not targeting
-        if repo not in MREPOS:
+        if repo not in MREPOS and self.webhook_targets is None:
             if self.args.daemonize and self.repos[repo]['loopcount'] > 0:
                 stale = self.get_stale_numbers(repo)
                 self.repos[repo]['stale'] = [int(x) for x in stale]
@@ -1632,10 +1782,23 @@ class AnsibleTriage(DefaultTriager):
                 numbers = sorted(set(numbers))
                 logging.info('%s numbers after stale check' % len(numbers))
 
+        # numbers over the scheduler's budget in the last loop
+        if self.repos[repo]['deferred'] and self.webhook_targets is None:
+            numbers = sorted(set(numbers + self.repos[repo]['deferred']))
+            logging.info('%s numbers after deferred' % len(numbers))
+
         ################################################################
         # PRE-FILTERING TO PREVENT EXCESSIVE API CALLS
         ################################################################
 
+        # the other workers triage the rest
+        if self.shard and self.webhook_targets is None:
+            numbers = [x for x in numbers if self.shard.owns(repo, x)]
+            logging.info(
+                '%s numbers in the shard of %s' %
+                (len(numbers), self.shard.worker_id)
+            )
+
         # filter just the open numbers
         if not self.args.only_closed and not self.args.ignore_state:
             numbers = [
@@ -1660,17 +1823,150 @@ class AnsibleTriage(DefaultTriager):
             ]
             logging.info('%s numbers after checking type' % len(numbers))
 
-        # Use iterator to avoid requesting all issues upfront
+        # skip anything that hasn't changed since it was last processed
+        if self.args.skip_no_update:
+            numbers = [
+                x for x in numbers
+                if not self.is_unchanged(repo, int(x))
+            ]
+            logging.info('%s numbers after checking for updates' %
+                         len(numbers))
+
         numbers = sorted([int(x) for x in numbers])
         numbers = [x for x in reversed(numbers)]
-        self.repos[repo]['issues'] = RepoIssuesIterator(
-            self.repos[repo]['repo'],
-            numbers,
-            issuecache=issuecache
-        )
+
+        # the daemon triages the most urgent numbers first
+        self.repos[repo]['scheduler'] = None
+        if self.args.daemonize or self.webhook_targets is not None:
+            numbers = self.schedule_numbers(repo, numbers)
+
+        # Use iterator to avoid requesting all issues upfront
+        if C.DEFAULT_PREFETCH_ISSUES and len(numbers) > 1:
+            self.repos[repo]['issues'] = PrefetchingRepoIssuesIterator(
+                self.repos[repo]['repo'],
+                numbers,
+                issuecache=issuecache,
+                readahead=C.DEFAULT_PREFETCH_ISSUES
+            )
+        else:
+            self.repos[repo]['issues'] = RepoIssuesIterator(
+                self.repos[repo]['repo'],
+                numbers,
+                issuecache=issuecache
+            )
 
         logging.info('getting repo objs for %s complete' % repo)
 
+    def schedule_numbers(self, repo, numbers):
+        '''Order numbers by priority, deferring those over budget'''
+
+        ps = PriorityScheduler(
+            budgets=parse_class_values(C.DEFAULT_SCHEDULER_BUDGETS, cast=int),
+            weights=parse_class_values(C.DEFAULT_SCHEDULER_WEIGHTS),
+            stale_window=C.DEFAULT_STALE_WINDOW,
+            histograms=self.triage_latency
+        )
+
+        # meta times are local, everything else is utc
+        utc_offset = datetime.datetime.utcnow() - datetime.datetime.now()
+        stale = self.repos[repo]['stale']
+        commands = self.webhook_commands.get(repo, [])
+
+        for number in numbers:
+            summary = self.issue_summaries[repo].get(str(number)) or {}
+            updated_at = None
+            if summary.get('updated_at'):
+                updated_at = datetime.datetime.strptime(
+                    summary['updated_at'][:19],
+                    '%Y-%m-%dT%H:%M:%S'
+                )
+
+            last_triaged = None
+            entry = self.get_meta_entry(repo, number)
+            if entry:
+                last_triaged = entry.time + utc_offset
+
+            ci_completed = None
+            if repo not in MREPOS and \
+                    'pull' in (summary.get('type') or '').lower():
+                ci_completed = self.SR.get_last_completion(number)
+
+            ps.add(
+                number,
+                updated_at=updated_at,
+                ci_completed=ci_completed,
+                last_triaged=last_triaged,
+                command=number in commands,
+                stale=number in stale
+            )
+
+        numbers = ps.get_numbers()
+        if self.webhook_targets is None:
+            self.repos[repo]['deferred'] = ps.deferred
+        else:
+            # a batch keeps the daemon's deferred numbers it didn't triage
+            deferred = set(self.repos[repo]['deferred']) - set(numbers)
+            self.repos[repo]['deferred'] = \
+                sorted(deferred | set(ps.deferred))
+        self.repos[repo]['scheduler'] = ps
+        logging.info(
+            '%s numbers scheduled, %s deferred' % (len(numbers), len(ps.deferred))
+        )
+        return numbers
+
+    def is_unchanged(self, repo, number):
+        '''Decide from the summaries and the meta index if a run would
+        be a no-op, without touching the api'''
+
+        summary = self.issue_summaries[repo].get(str(number))
+        if not summary or not summary.get('updated_at'):
+            return False
+
+        lmeta = self.get_meta_entry(repo, number)
+        if not lmeta or not lmeta.updated_at:
+            return False
+
+        # summaries are zulu timestamps, meta has the naive isoformat
+        updated_at = summary['updated_at'].replace('Z', '')
+        updated_at = updated_at.replace('+00:00', '')
+
+        # for pullrequests this is the pr's updated_at, which
+        # also moves on new commits
+        if updated_at > lmeta.updated_at:
+            return False
+
+        if repo in MREPOS:
+            return True
+
+        # re-check ansible/ansible after
+        # a window of time since the last check.
+        delta = (datetime.datetime.now() - lmeta.time).days
+        if delta > C.DEFAULT_STALE_WINDOW:
+            logging.info(
+                '%s !skipping: %s days since last check' % (number, delta)
+            )
+            return False
+
+        # was this in the stale list?
+        if number in self.repos[repo]['stale']:
+            return False
+
+        # if last process time is older than
+        # last completion time on shippable, we need
+        # to reprocess because the ci status has
+        # probabaly changed.
+        if 'pull' in (summary.get('type') or '').lower():
+            mua = datetime.datetime.strptime(
+                lmeta.updated_at[:19],
+                '%Y-%m-%dT%H:%M:%S'
+            )
+            lsr = self.SR.get_last_completion(number)
+            if lsr and lsr > mua:
+                return False
+
+        logging.debug('%s skipping: no changes since last run' % number)
+        return True
+
     def get_updated_issues(self, since=None):
         '''Get issues to work on'''
         # this should return a list of issueids that changed since the last run
@@ -1688,7 +1984,7 @@ class AnsibleTriage(DefaultTriager):
 
         # clear the actions+meta
         self.actions = copy.deepcopy(self.EMPTY_ACTIONS)
-        self.meta = copy.deepcopy(self.EMPTY_META)
+        self.meta = LazyMeta(copy.deepcopy(self.EMPTY_META))
 
         self.meta['submitter'] = iw.submitter
 
@@ -1886,77 +2182,62 @@ class AnsibleTriage(DefaultTriager):
         # python3 ?
         self.meta['is_py3'] = self.is_python3()
 
-        # backports
-        self.meta.update(get_backport_facts(iw, self.meta))
-
-        # shipit?
-        self.meta.update(
-            get_needs_revision_facts(
-                self,
-                iw,
-                self.meta,
-                #shippable=self.SR
-            )
-        )
-        self.meta.update(self.get_notification_facts(iw, self.meta))
-
-        # ci_verified and test results
-        self.meta.update(
-            get_shippable_run_facts(iw, self.meta, shippable=self.SR)
-        )
-
-        # needsinfo?
-        #self.meta['is_needs_info'] = self.is_needsinfo()
-        self.meta['is_needs_info'] = is_needsinfo(self)
-        self.meta.update(self.process_comment_commands(iw, self.meta))
-        self.meta.update(needs_info_template_facts(iw, self.meta))
-        #self.meta.update(self.needs_info_timeout_facts(iw, self.meta))
-        self.meta.update(needs_info_timeout_facts(iw, self.meta))
-
-        # shipit?
-        self.meta.update(
-            get_shipit_facts(
-                iw, self.meta, self.module_indexer,
-                core_team=self.ansible_core_team, botnames=self.BOTNAMES
-            )
-        )
-        self.meta.update(self.get_review_facts(iw, self.meta))
-
-        # bot_status needed?
-        self.meta.update(self.needs_bot_status(iw))
-
-        # who is this waiting on?
-        self.meta.update(self.waiting_on(iw, self.meta))
-
-        # community label manipulation
-        #self.meta.update(self.get_label_commands(iw, self.meta))
-        self.meta.update(
-            get_label_command_facts(
-                iw,
-                self.meta,
-                self.module_indexer,
-                core_team=self.ansible_core_team,
-                valid_labels=self.valid_labels
-            )
-        )
-
-        # triage from everyone else? ...
-        self.meta.update(self.get_triage_facts(iw, self.meta))
-
-        # filament
-        self.meta.update(get_filament_facts(iw, self.meta))
-
-        # ci rebuilds
-        self.meta.update(get_rebuild_facts(iw, self.meta, self.SR))
-
-        # ci rebuild + merge
-        self.meta.update(
-            get_rebuild_merge_facts(
-                iw,
-                self.meta,
-                self.ansible_core_team
-            )
-        )
+        # the remaining facts are computed when something reads them, in
+        # the order they used to be gathered in
+        plugins = [
+            ('backports', get_backport_facts,
+                lambda meta: get_backport_facts(iw, meta)),
+            ('needs_revision', get_needs_revision_facts,
+                lambda meta: get_needs_revision_facts(self, iw, meta)),
+            ('notifications', self.get_notification_facts,
+                lambda meta: self.get_notification_facts(iw, meta)),
+            # ci_verified and test results
+            ('shippable', get_shippable_run_facts,
+                lambda meta: get_shippable_run_facts(
+                    iw, meta, shippable=self.SR
+                )),
+            ('needs_info', is_needsinfo,
+                lambda meta: {'is_needs_info': is_needsinfo(self)}),
+            ('comment_commands', self.process_comment_commands,
+                lambda meta: self.process_comment_commands(iw, meta)),
+            ('needs_info_template', needs_info_template_facts,
+                lambda meta: needs_info_template_facts(iw, meta)),
+            ('needs_info_timeout', needs_info_timeout_facts,
+                lambda meta: needs_info_timeout_facts(iw, meta)),
+            ('shipit', get_shipit_facts,
+                lambda meta: get_shipit_facts(
+                    iw, meta, self.module_indexer,
+                    core_team=self.ansible_core_team, botnames=self.BOTNAMES
+                )),
+            ('review', self.get_review_facts,
+                lambda meta: self.get_review_facts(iw, meta)),
+            ('bot_status', self.needs_bot_status,
+                lambda meta: self.needs_bot_status(iw)),
+            # who is this waiting on?
+            ('waiting_on', self.waiting_on,
+                lambda meta: self.waiting_on(iw, meta)),
+            # community label manipulation
+            ('label_commands', get_label_command_facts,
+                lambda meta: get_label_command_facts(
+                    iw, meta, self.module_indexer,
+                    core_team=self.ansible_core_team,
+                    valid_labels=self.valid_labels
+                )),
+            # triage from everyone else? ...
+            ('triage', self.get_triage_facts,
+                lambda meta: self.get_triage_facts(iw, meta)),
+            ('filament', get_filament_facts,
+                lambda meta: get_filament_facts(iw, meta)),
+            ('rebuild', get_rebuild_facts,
+                lambda meta: get_rebuild_facts(iw, meta, self.SR)),
+            # ci rebuild + merge
+            ('rebuild_merge', get_rebuild_merge_facts,
+                lambda meta: get_rebuild_merge_facts(
+                    iw, meta, self.ansible_core_team
+                )),
+        ]
+        for (name, func, run) in plugins:
+            self.meta.add_plugin(name, func, run)
 
         if iw.migrated:
             miw = iw._migrated_issue
@@ -2147,6 +2428,13 @@ class AnsibleTriage(DefaultTriager):
             supported_by = 'community'
         return supported_by
 
+    @declare_facts(
+        ['core_review', 'community_review', 'committer_review'],
+        inputs=[
+            'shipit', 'is_needs_info', 'is_needs_revision', 'is_needs_rebase',
+            'is_module', 'module_match', 'is_new_module'
+        ]
+    )
     def get_review_facts(self, issuewrapper, meta):
         # Thanks @jpeck-resilient for this new module. When this module
         # receives 'shipit' comments from two community members and any
@@ -2193,6 +2481,7 @@ class AnsibleTriage(DefaultTriager):
 
         return rfacts
 
+    @declare_facts(['to_notify', 'to_assign'], inputs=['module_match'])
     def get_notification_facts(self, issuewrapper, meta):
         '''Build facts about mentions/pings'''
         iw = issuewrapper
@@ -2215,7 +2504,7 @@ class AnsibleTriage(DefaultTriager):
         current_assignees = iw.assignees
 
         # who can be assigned?
-        valid_assignees = [x.login for x in iw.repo.assignees]
+        valid_assignees = iw.repo.assignee_logins
 
         # add people from filemap matches
         if iw.is_pullrequest():
@@ -2271,6 +2560,10 @@ class AnsibleTriage(DefaultTriager):
 
         return nfacts
 
+    @declare_facts(
+        ['maintainer_commands', 'submitter_commands', 'resolved_by_pr'],
+        inputs=['module_match']
+    )
     def process_comment_commands(self, issuewrapper, meta):
 
         vcommands = [x for x in self.VALID_COMMANDS]
@@ -2290,7 +2583,7 @@ class AnsibleTriage(DefaultTriager):
         if meta['module_match']:
             maintainers += meta.get('module_match', {}).get('maintainers', [])
             maintainers += meta.get('module_match', {}).get('authors', [])
-        maintainers += [x.login for x in iw.repo.assignees]
+        maintainers += iw.repo.assignee_logins
         maintainers = sorted(set(maintainers))
 
         meta['maintainer_commands'] = iw.history.get_commands(
@@ -2366,6 +2659,7 @@ class AnsibleTriage(DefaultTriager):
         return clabels
     '''
 
+    @declare_facts(['needs_bot_status'])
     def needs_bot_status(self, issuewrapper):
         iw = issuewrapper
         bs = False
@@ -2387,6 +2681,13 @@ class AnsibleTriage(DefaultTriager):
                         continue
         return {'needs_bot_status': bs}
 
+    @declare_facts(
+        ['waiting_on'],
+        inputs=[
+            'is_issue', 'is_needs_info', 'maintainer_commands',
+            'is_needs_revision', 'is_needs_rebase', 'is_core'
+        ]
+    )
     def waiting_on(self, issuewrapper, meta):
         iw = issuewrapper
         wo = None
@@ -2412,6 +2713,7 @@ class AnsibleTriage(DefaultTriager):
 
         return {'waiting_on': wo}
 
+    @declare_facts(['maintainer_triaged'], inputs=['module_match'])
     def get_triage_facts(self, issuewrapper, meta):
         tfacts = {
             'maintainer_triaged': False
@@ -2428,7 +2730,7 @@ class AnsibleTriage(DefaultTriager):
 
         iw = issuewrapper
         maintainers = [x for x in meta['module_match']['maintainers']]
-        maintainers += [x for x in self.ansible_core_team]
+        maintainers += self.ansible_core_team
         maintainers = [x for x in maintainers if x != iw.submitter]
         maintainers = sorted(set(maintainers))
         if iw.history.has_commented(maintainers):
@@ -35,7 +35,19 @@ from jinja2 import Environment, FileSystemLoader
 from ansibullbot.decorators.github import RateLimited
 from ansibullbot.wrappers.ghapiwrapper import GithubWrapper
 from ansibullbot.wrappers.issuewrapper import IssueWrapper
+from ansibullbot.utils.action_journal import ActionExecutor
+from ansibullbot.utils.action_journal import ActionJournal
 from ansibullbot.utils.descriptionfixer import DescriptionFixer
+from ansibullbot.utils.conditional_requests import get_conditional_requests
+from ansibullbot.utils.conditional_requests import install_conditional_requests
+from ansibullbot.utils.iterators import install_thread_local_connections
+from ansibullbot.utils.receiver_client import get_receiver_metrics
+from ansibullbot.utils.systemtools import write_atomic
+from ansibullbot.utils.token_pool import get_token_pool
+from ansibullbot.utils.token_pool import install_token_pool
+from ansibullbot.utils.write_pacer import get_write_pacer
+from ansibullbot.utils.write_pacer import install_write_pacer
+from ansibullbot.utils.write_pacer import parse_limits
 
 import ansibullbot.constants as C
 
@@ -250,10 +262,7 @@ class DefaultTriager(object):
         if not self.args.resume:
             return None
 
-        if hasattr(self, 'cachedir_base'):
-            resume_file = os.path.join(self.cachedir_base, 'resume.json')
-        else:
-            resume_file = os.path.join(self.cachedir, 'resume.json')
+        resume_file = self.get_resume_file()
         if not os.path.isfile(resume_file):
             return None
 
@@ -275,12 +284,16 @@ class DefaultTriager(object):
             'repo': repo,
             'number': number
         }
+        write_atomic(self.get_resume_file(), json.dumps(data, indent=2))
+
+    def get_resume_file(self):
+        # each shard worker resumes from its own position
+        fn = 'resume.json'
+        if getattr(self.args, 'worker_id', None):
+            fn = 'resume.%s.json' % self.args.worker_id
         if hasattr(self, 'cachedir_base'):
-            resume_file = os.path.join(self.cachedir_base, 'resume.json')
-        else:
-            resume_file = os.path.join(self.cachedir, 'resume.json')
-        with open(resume_file, 'wb') as f:
-            f.write(json.dumps(data, indent=2))
+            return os.path.join(self.cachedir_base, fn)
+        return os.path.join(self.cachedir, fn)
 
     def set_logger(self):
         if hasattr(self.args, 'debug') and self.args.debug:
@@ -319,12 +332,16 @@ class DefaultTriager(object):
             self.trigger_rate_limit()
             return
 
-        if hasattr(self.args, 'daemonize') and self.args.daemonize:
+        if hasattr(self.args, 'webhooks') and self.args.webhooks:
+            logging.info('starting webhook consumer')
+            self.consume()
+        elif hasattr(self.args, 'daemonize') and self.args.daemonize:
             logging.info('starting daemonize loop')
             self.loop()
         else:
             logging.info('starting single run')
             self.run()
+            self.report_run_metrics()
         logging.info('stopping bot')
 
     def _process(self, usecache=True):
@@ -479,12 +496,45 @@ class DefaultTriager(object):
     def _connect(self):
         """Connects to GitHub's API"""
         if self.github_token:
-            return Github(login_or_token=self.github_token)
+            gh = Github(login_or_token=self.github_token)
         else:
-            return Github(
+            gh = Github(
                 login_or_token=self.github_user,
                 password=self.github_pass
             )
+        self.install_connection_hooks(gh)
+        return gh
+
+    def install_connection_hooks(self, gh):
+        """Caching, token pool, pacing and per thread connections"""
+        if C.DEFAULT_CONDITIONAL_REQUESTS:
+            install_conditional_requests(
+                gh,
+                self.cachedir_base,
+                maxsize=C.DEFAULT_CONDITIONAL_CACHE_SIZE
+            )
+        install_token_pool(gh, C.DEFAULT_GITHUB_READ_TOKENS)
+        install_write_pacer(
+            gh,
+            interval=C.DEFAULT_WRITE_INTERVAL,
+            limits=parse_limits(C.DEFAULT_WRITE_LIMITS)
+        )
+        # the prefetch and executor threads need their own connections
+        if C.DEFAULT_PREFETCH_ISSUES or self.use_write_behind():
+            install_thread_local_connections(gh)
+
+    def use_write_behind(self):
+        """Forced daemon and webhook runs write from a background thread"""
+        args = getattr(self, 'args', None)
+        if args is None or not C.DEFAULT_WRITE_BEHIND:
+            return False
+        if not getattr(args, 'force', False) or \
+                getattr(args, 'dry_run', False):
+            return False
+        return bool(
+            getattr(args, 'daemonize', False) or
+            getattr(args, 'webhooks', False)
+        )
 
     def _get_repo_path(self):
         if self.github_repo in ['core', 'extras']:
@@ -535,8 +585,7 @@ class DefaultTriager(object):
         # save the data
         if write_cache:
             mdata = [now, ansible_members]
-            with open(cachefile, 'wb') as f:
-                pickle.dump(mdata, f)
+            write_atomic(cachefile, pickle.dumps(mdata))
 
         #import epdb; epdb.st()
         return ansible_members
@@ -807,13 +856,37 @@ class DefaultTriager(object):
         '''Call the run method in a defined interval'''
         while True:
             self.run()
+            self.report_run_metrics()
             interval = self.args.daemonize_interval
             logging.info('sleep %ss (%sm)' % (interval, interval / 60))
             time.sleep(interval)
 
+    def report_run_metrics(self):
+        '''Log the api cache and receiver numbers for the last run'''
+        if C.DEFAULT_CONDITIONAL_REQUESTS:
+            cr = get_conditional_requests(self.cachedir_base)
+            cr.log_stats()
+            cr.reset_stats()
+        pool = get_token_pool()
+        if pool:
+            logging.info('token quota: %s' % pool.get_stats())
+        pacer = get_write_pacer()
+        if pacer:
+            logging.info('api writes: %s' % pacer.get_stats())
+        if getattr(self, 'executor', None):
+            logging.info(
+                'action journal: %s' % self.executor.journal.get_stats()
+            )
+        metrics = get_receiver_metrics()
+        if metrics:
+            logging.info('receiver metrics: %s' % metrics)
+
     def run(self):
         pass
 
+    def consume(self):
+        pass
+
     def create_actions(self):
         pass
 
@@ -1264,6 +1337,10 @@ class DefaultTriager(object):
             if self.dry_run:
                 print("Dry-run specified, skipping execution of actions")
             else:
+                if self.force and getattr(self, 'executor', None):
+                    # the executor thread writes them, triage moves on
+                    self.journal_actions(issue, actions)
+                    return action_meta
                 if self.force:
                     print("Running actions non-interactive as you forced.")
                     self.execute_actions(issue, actions)
@@ -1360,49 +1437,181 @@ class DefaultTriager(object):
 
     def execute_actions(self, issue, actions):
         """Turns the actions into API calls"""
+        for (action, payload) in self.get_action_calls(issue, actions):
+            self.execute_action(issue, action, payload)
+
+    def get_action_calls(self, issue, actions):
+        """The [(action, payload), ...] to apply in order"""
 
-        for comment in actions['comments']:
+        calls = []
+
+        # one comment per issue, the history still finds every boilerplate
+        if actions['comments']:
+            comment = '\n\n'.join(actions['comments'])
             logging.info("acton: comment - " + comment)
-            issue.add_comment(comment=comment)
+            calls.append(('comment', comment))
         if actions['close']:
-            # https://github.com/PyGithub/PyGithub/blob/master/github/Issue.py#L263
             logging.info('action: close')
-            issue.instance.edit(state='closed')
-            return
+            calls.append(('close', None))
+            return calls
 
         if actions['close_migrated']:
-            mi = self.get_issue_by_repopath_and_number(
-                self.meta['migrated_issue_repo_path'],
-                self.meta['migrated_issue_number']
-            )
-            logging.info('close migrated: %s' % mi.html_url)
-            mi.instance.edit(state='closed')
-
-        for unlabel in actions['unlabel']:
-            logging.info('action: unlabel - ' + unlabel)
-            issue.remove_label(label=unlabel)
-        for newlabel in actions['newlabel']:
-            logging.info('action: label - ' + newlabel)
-            issue.add_label(label=newlabel)
-
-        if 'assign' in actions:
-            for user in actions['assign']:
+            calls.append((
+                'close_migrated',
+                [
+                    self.meta['migrated_issue_repo_path'],
+                    self.meta['migrated_issue_number']
+                ]
+            ))
+
+        # the label and assignee changes, execute_action turns them into
+        # a single replace call each from the issue's set at that time
+        delta = {
+            'unlabel': actions['unlabel'],
+            'newlabel': actions['newlabel']
+        }
+        current = issue.get_labels()
+        if self.apply_delta(current, delta, 'unlabel', 'newlabel') != current:
+            for unlabel in actions['unlabel']:
+                logging.info('action: unlabel - ' + unlabel)
+            for newlabel in actions['newlabel']:
+                logging.info('action: label - ' + newlabel)
+            calls.append(('labels', delta))
+
+        delta = {
+            'unassign': actions.get('unassign', []),
+            'assign': actions.get('assign', [])
+        }
+        current = issue.assignees
+        if self.apply_delta(current, delta, 'unassign', 'assign') != current:
+            for user in delta['assign']:
                 logging.info('action: assign - ' + user)
-                issue.assign_user(user)
-        if 'unassign' in actions:
-            for user in actions['unassign']:
+            for user in delta['unassign']:
                 logging.info('action: unassign - ' + user)
-                issue.unassign_user(user)
+            calls.append(('assignees', delta))
 
         if 'merge' in actions:
             if actions['merge']:
-                issue.merge()
+                calls.append(('merge', None))
 
         if 'rebuild' in actions:
             if actions['rebuild']:
                 runid = self.meta.get('rebuild_run_number')
                 if runid:
-                    self.SR.rebuild(runid)
+                    calls.append(('rebuild', runid))
+
+        return calls
+
+    def execute_action(self, issue, action, payload):
+        """One API call from get_action_calls"""
+        if action == 'comment':
+            issue.add_comment(comment=payload)
+        elif action == 'close':
+            # https://github.com/PyGithub/PyGithub/blob/master/github/Issue.py#L263
+            issue.instance.edit(state='closed')
+        elif action == 'close_migrated':
+            mi = self.fetch_issue(payload[0], payload[1])
+            logging.info('close migrated: %s' % mi.html_url)
+            mi.instance.edit(state='closed')
+        elif action == 'labels':
+            # the issue may be several triages old, the replace call must
+            # not revert what someone changed meanwhile (a 304 if nothing)
+            issue.instance.update()
+            # an unknown label would fail the whole replace call
+            unknown = [
+                x for x in payload['newlabel'] if x not in self.valid_labels
+            ]
+            if unknown:
+                logging.warning('skipping unknown labels: %s' % unknown)
+                payload = dict(
+                    payload,
+                    newlabel=[x for x in payload['newlabel']
+                              if x not in unknown]
+                )
+            current = issue.get_labels()
+            labels = self.apply_delta(current, payload, 'unlabel', 'newlabel')
+            if labels != current:
+                issue.set_labels(labels)
+        elif action == 'assignees':
+            issue.instance.update()
+            current = issue.get_assignees()
+            assignees = \
+                self.apply_delta(current, payload, 'unassign', 'assign')
+            if assignees != current:
+                issue.set_assignees(assignees)
+        elif action == 'merge':
+            issue.merge()
+        elif action == 'rebuild':
+            self.SR.rebuild(payload)
+
+    @staticmethod
+    def apply_delta(current, delta, remove, add):
+        '''current without delta[remove] and with delta[add]'''
+        result = [x for x in current if x not in delta[remove]]
+        result += [x for x in delta[add] if x not in result]
+        return result
+
+    def start_action_executor(self):
+        """Write the forced actions from a background thread"""
+        fn = C.DEFAULT_ACTION_JOURNAL
+        # each shard worker drains its own journal
+        if getattr(self.args, 'worker_id', None):
+            (base, ext) = os.path.splitext(fn)
+            fn = '%s.%s%s' % (base, self.args.worker_id, ext)
+        journal = ActionJournal(fn, max_attempts=C.DEFAULT_ACTION_RETRIES)
+        logging.info('journaling actions to %s' % journal.dbfile)
+
+        # never share the triage thread's connection
+        install_thread_local_connections(self.gh)
+
+        # the wrappers of the triaged issues, until their actions are out
+        self.journaled_issues = {}
+        self.executor = ActionExecutor(
+            journal,
+            self.apply_journal_entry,
+            before=self.before_journal_entry,
+            after=self.after_journal_entry
+        )
+        self.executor.start()
+
+    def journal_actions(self, issue, actions):
+        calls = self.get_action_calls(issue, actions)
+        if calls:
+            key = (issue.repo_full_name, issue.number)
+            self.journaled_issues[key] = issue
+            self.executor.submit(key[0], key[1], calls)
+
+    def apply_journal_entry(self, repo, number, action, payload):
+        issue = self.journaled_issues.get((repo, number))
+        if issue is None:
+            # journaled before a restart
+            issue = self.fetch_issue(repo, number)
+            self.journaled_issues[(repo, number)] = issue
+        logging.info('action: %s for %s' % (action, issue.html_url))
+        self.execute_action(issue, action, payload)
+
+    def fetch_issue(self, repo_path, number):
+        '''An IssueWrapper for the executor thread, self.repos is left alone'''
+        repo = self.ghw.get_repo(repo_path, verbose=False)
+        return IssueWrapper(
+            github=self.ghw,
+            repo=repo,
+            issue=repo.get_issue(number),
+            cachedir=os.path.join(self.cachedir_base, repo_path)
+        )
+
+    def before_journal_entry(self, repo, number):
+        # the issue may have moved to another shard worker meanwhile
+        shard = getattr(self, 'shard', None)
+        if shard and not shard.renew(repo, number):
+            return False
+        return True
+
+    def after_journal_entry(self, repo, number):
+        self.journaled_issues.pop((repo, number), None)
+        shard = getattr(self, 'shard', None)
+        if shard:
+            shard.release(repo, number)
 
     def smart_match_module(self):
         '''Fuzzy matching for modules'''
@@ -1460,8 +1669,7 @@ class DefaultTriager(object):
         if not os.path.isdir(fpath):
             os.makedirs(fpath)
         fpath = os.path.join(fpath, 'iwrapper.pickle')
-        with open(fpath, 'wb') as f:
-            pickle.dump(issue, f)
+        write_atomic(fpath, pickle.dumps(issue))
         #import epdb; epdb.st()
 
     def load_cached_issues(self, state='open'):
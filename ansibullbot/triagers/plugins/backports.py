@@ -1,5 +1,9 @@
 #!/usr/bin/env python
 
+from ansibullbot.utils.fact_pipeline import declare_facts
+
+
+@declare_facts(['is_backport'])
 def get_backport_facts(issuewrapper, meta):
     # https://github.com/ansible/ansibullbot/issues/367
 
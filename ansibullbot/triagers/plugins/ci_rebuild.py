@@ -3,6 +3,8 @@
 import datetime
 import pytz
 
+from ansibullbot.utils.fact_pipeline import declare_facts
+
 
 def status_to_date_and_runid(status, keepstate=False):
     """convert pr status to a tuple of date and runid"""
@@ -33,6 +35,13 @@ def status_to_date_and_runid(status, keepstate=False):
         return (ts, target)
 
 
+@declare_facts(
+    ['needs_rebuild', 'rebuild_run_number', 'rebuild_run_id'],
+    inputs=[
+        'is_pullrequest', 'ci_stale', 'is_needs_revision', 'is_needs_rebase',
+        'has_travis', 'has_shippable', 'shipit'
+    ]
+)
 def get_rebuild_facts(iw, meta, shippable):
 
     rbmeta = {
@@ -74,6 +83,10 @@ def get_rebuild_facts(iw, meta, shippable):
 
 
 # https://github.com/ansible/ansibullbot/issues/640
+@declare_facts(
+    ['needs_rebuild', 'admin_merge'],
+    inputs=['needs_rebuild', 'is_needs_revision', 'is_needs_rebase']
+)
 def get_rebuild_merge_facts(iw, meta, core_team):
 
     rbcommand = 'rebuild_merge'
@@ -1,6 +1,9 @@
 #!/usr/bin/env python
 
+from ansibullbot.utils.fact_pipeline import declare_facts
 
+
+@declare_facts(['is_filament'])
 def get_filament_facts(issuewrapper, meta):
     # https://github.com/ansible/ansible/pull/26921
 
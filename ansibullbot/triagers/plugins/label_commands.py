@@ -1,6 +1,9 @@
 #!/usr/bin/env python
 
+from ansibullbot.utils.fact_pipeline import declare_facts
 
+
+@declare_facts(['label_cmds'])
 def get_label_command_facts(issuewrapper, meta, module_indexer, core_team=[], valid_labels=[]):
 
     iw = issuewrapper
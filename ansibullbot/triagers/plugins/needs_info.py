@@ -4,13 +4,15 @@ import datetime
 import pytz
 import ansibullbot.constants as C
 
+from ansibullbot.utils.fact_pipeline import declare_facts
 
+
+@declare_facts(['is_needs_info'], inputs=['module_match'])
 def is_needsinfo(triager):
 
     needs_info = False
 
-    maintainers = [x for x in triager.ansible_members]
-    maintainers += [x for x in triager.ansible_core_team]
+    maintainers = list(triager.ansible_members | triager.ansible_core_team)
     if triager.meta.get('module_match'):
         maintainers += triager.meta['module_match'].get('maintainers', [])
         ns = triager.meta['module_match'].get('namespace')
@@ -71,6 +73,13 @@ def is_needsinfo(triager):
     return needs_info
 
 
+@declare_facts(
+    [
+        'template_missing', 'template_missing_sections',
+        'template_warning_required', 'is_needs_info'
+    ],
+    inputs=['is_needs_info']
+)
 def needs_info_template_facts(iw, meta):
 
     nifacts = {
@@ -115,6 +124,7 @@ def needs_info_template_facts(iw, meta):
     return nifacts
 
 
+@declare_facts(['needs_info_action'], inputs=['is_needs_info'])
 def needs_info_timeout_facts(iw, meta):
 
     # warn at 30 days
@@ -7,11 +7,26 @@ import os
 import pytz
 from pprint import pprint
 
+from ansibullbot.utils.fact_pipeline import declare_facts
 from ansibullbot.utils.shippable_api import has_commentable_data
 from ansibullbot.utils.shippable_api import ShippableRuns
 from ansibullbot.wrappers.historywrapper import ShippableHistory
 
 
+@declare_facts(
+    [
+        'committer_count', 'is_needs_revision', 'is_needs_revision_msgs',
+        'is_needs_rebase', 'is_needs_rebase_msgs', 'has_commit_mention',
+        'has_commit_mention_notification', 'has_shippable', 'has_landscape',
+        'has_travis', 'has_travis_notification', 'merge_commits',
+        'has_merge_commit_notification', 'mergeable', 'mergeable_state',
+        'change_requested', 'ci_state', 'ci_stale', 'reviews',
+        'ready_for_review', 'has_shippable_yaml',
+        'has_shippable_yaml_notification', 'has_remote_repo', 'stale_reviews',
+        'has_multiple_modules', 'needs_multiple_new_modules_notification'
+    ],
+    inputs=['module_match']
+)
 def get_needs_revision_facts(triager, issuewrapper, meta, shippable=None):
     # Thanks @adityacs for this PR. This PR requires revisions, either
     # because it fails to build or by reviewer request. Please make the
@@ -495,6 +510,10 @@ def get_review_state(reviews, submitter, number=None, www_validate=None,
 
 
 #def get_shippable_run_facts(shippable, ci_status, iw):
+@declare_facts(
+    ['shippable_test_results', 'ci_verified', 'needs_testresult_notification'],
+    inputs=['has_shippable', 'ci_state']
+)
 def get_shippable_run_facts(iw, meta, shippable=None):
     '''Does an issue need the test result comment?'''
 
@@ -2,6 +2,7 @@
 
 import logging
 from fnmatch import fnmatch
+from ansibullbot.utils.fact_pipeline import declare_facts
 from ansibullbot.utils.moduletools import ModuleIndexer
 
 
@@ -137,6 +138,15 @@ def needs_community_review(meta, issue):
     return True
 
 
+@declare_facts(
+    [
+        'shipit', 'owner_pr', 'shipit_ansible', 'shipit_community',
+        'shipit_count_other', 'shipit_count_community',
+        'shipit_count_maintainer', 'shipit_count_ansible', 'shipit_actors',
+        'shipit_actors_other', 'community_usernames', 'notify_community_shipit'
+    ],
+    inputs=['module_match', 'is_new_module']
+)
 def get_shipit_facts(issuewrapper, meta, module_indexer, core_team=[], botnames=[]):
     """ Count shipits by maintainers/community/other """
 
@@ -0,0 +1,276 @@
+#!/usr/bin/env python
+
+# action_journal.py
+#
+#   ActionJournal - durable log of the writes computed for each issue
+#   ActionExecutor - thread that drains the journal into the api
+#
+#   With --force in the daemon or webhook loop the triager no longer
+#   waits on its own writes. The comment, close, label, assignee, merge
+#   and rebuild calls for an issue go into the journal, a sqlite file,
+#   and the executor thread applies them in order while the next issue
+#   is being triaged. A failed call is retried with a growing delay and
+#   holds back the later entries of the same issue. Entries left behind
+#   by a restart are applied on the next start.
+#
+#   Every entry has a key made from (repo, number, action, payload) and
+#   the same key is not queued again while it is pending, so triaging an
+#   issue again before its writes went out doesn't post a comment twice.
+#   Applied and failed entries are kept for keep seconds.
+#
+#   Usage:
+#       journal = ActionJournal('~/.ansibullbot/cache/actions.sqlite')
+#       executor = ActionExecutor(journal, apply_entry)
+#       executor.start()
+#       executor.submit('ansible/ansible', 1, [('comment', 'hi')])
+
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS actions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    key TEXT NOT NULL,
+    repo TEXT NOT NULL,
+    number INTEGER NOT NULL,
+    action TEXT NOT NULL,
+    payload TEXT,
+    state TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_try REAL,
+    created REAL,
+    finished REAL,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS actions_key ON actions (key, state);
+CREATE INDEX IF NOT EXISTS actions_issue ON actions (repo, number, state);
+'''
+
+
+def get_action_key(repo, number, action, payload):
+    '''The idempotency key of an (issue, action)'''
+    data = json.dumps([repo, int(number), action, payload], sort_keys=True)
+    return hashlib.sha1(data).hexdigest()
+
+
+class ActionJournal(object):
+    '''Pending and recently applied actions in a sqlite file'''
+
+    def __init__(self, dbfile, retry_interval=60, max_attempts=5,
+                 keep=86400):
+        self.dbfile = os.path.expanduser(dbfile)
+        self.retry_interval = retry_interval
+        self.max_attempts = max_attempts
+        self.keep = keep
+        dbdir = os.path.dirname(self.dbfile)
+        if dbdir and not os.path.isdir(dbdir):
+            os.makedirs(dbdir)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            self.dbfile,
+            timeout=60,
+            isolation_level=None,
+            check_same_thread=False
+        )
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.executescript(SCHEMA)
+        # replaced in the tests
+        self._time = time.time
+
+    def put(self, repo, number, action, payload=None):
+        '''Queue an action, False if the same one is still pending'''
+        now = self._time()
+        key = get_action_key(repo, number, action, payload)
+        with self._lock:
+            if self._conn.execute(
+                "SELECT 1 FROM actions WHERE key=? AND state='pending'",
+                (key,)
+            ).fetchone():
+                return False
+            self._conn.execute(
+                'INSERT INTO actions '
+                '(key, repo, number, action, payload, next_try, created) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (key, repo, int(number), action, json.dumps(payload),
+                 now, now)
+            )
+        return True
+
+    def next(self):
+        '''The next due (id, repo, number, action, payload) or None
+
+        Entries of an issue are handed out in the order they were put,
+        one waiting for a retry blocks the ones behind it.
+        '''
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT id, repo, number, action, payload FROM actions a '
+                "WHERE state='pending' AND next_try <= ? "
+                'AND NOT EXISTS ('
+                '    SELECT 1 FROM actions b '
+                "    WHERE b.state='pending' AND b.repo=a.repo "
+                '    AND b.number=a.number AND b.id < a.id'
+                ') ORDER BY id LIMIT 1',
+                (self._time(),)
+            ).fetchone()
+        if row is None:
+            return None
+        return (row[0], row[1], row[2], row[3], json.loads(row[4]))
+
+    def done(self, id):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE actions SET state='done', finished=? WHERE id=?",
+                (self._time(), id)
+            )
+
+    def retry(self, id, error):
+        '''Try again later, False once the attempts are used up'''
+        now = self._time()
+        with self._lock:
+            attempts = self._conn.execute(
+                'SELECT attempts FROM actions WHERE id=?', (id,)
+            ).fetchone()[0] + 1
+            if attempts >= self.max_attempts:
+                self._conn.execute(
+                    "UPDATE actions SET state='failed', attempts=?, "
+                    'finished=?, error=? WHERE id=?',
+                    (attempts, now, error, id)
+                )
+                return False
+            self._conn.execute(
+                'UPDATE actions SET attempts=?, next_try=?, error=? '
+                'WHERE id=?',
+                (attempts, now + self.retry_interval * 2 ** (attempts - 1),
+                 error, id)
+            )
+        return True
+
+    def drop(self, repo, number, error):
+        '''Give up on the pending actions of an issue'''
+        with self._lock:
+            self._conn.execute(
+                "UPDATE actions SET state='failed', finished=?, error=? "
+                "WHERE repo=? AND number=? AND state='pending'",
+                (self._time(), error, repo, int(number))
+            )
+
+    def pending(self, repo, number):
+        with self._lock:
+            return self._conn.execute(
+                'SELECT COUNT(*) FROM actions '
+                "WHERE repo=? AND number=? AND state='pending'",
+                (repo, int(number))
+            ).fetchone()[0]
+
+    def purge(self):
+        '''Forget the actions finished more than keep seconds ago'''
+        with self._lock:
+            self._conn.execute(
+                "DELETE FROM actions WHERE state != 'pending' AND finished < ?",
+                (self._time() - self.keep,)
+            )
+
+    def get_stats(self):
+        '''{state: count}'''
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT state, COUNT(*) FROM actions GROUP BY state'
+            ).fetchall()
+        stats = {'pending': 0, 'done': 0, 'failed': 0}
+        stats.update(dict(rows))
+        return stats
+
+
+class ActionExecutor(object):
+    '''Applies the journal entries in a background thread
+
+    apply(repo, number, action, payload) makes the api call. The
+    optional before(repo, number) is asked first and the issue's
+    pending actions are dropped when it returns False, after(repo,
+    number) is called once nothing is pending for the issue anymore.
+    '''
+
+    def __init__(self, journal, apply, before=None, after=None,
+                 poll_interval=1.0, purge_interval=3600):
+        self.journal = journal
+        self.apply = apply
+        self.before = before
+        self.after = after
+        self.poll_interval = poll_interval
+        self.purge_interval = purge_interval
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run)
+            self._thread.daemon = True
+            self._thread.start()
+
+    def stop(self, timeout=None):
+        '''Stop after the current entry, the rest stays in the journal'''
+        self._stopped.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def submit(self, repo, number, actions):
+        '''Journal [(action, payload), ...] for an issue'''
+        queued = 0
+        for (action, payload) in actions:
+            if self.journal.put(repo, number, action, payload):
+                queued += 1
+            else:
+                logging.info(
+                    'action: %s for %s#%s is already journaled'
+                    % (action, repo, number)
+                )
+        self._wake.set()
+        return queued
+
+    def _run(self):
+        last_purge = 0
+        while not self._stopped.is_set():
+            if time.time() - last_purge > self.purge_interval:
+                self.journal.purge()
+                last_purge = time.time()
+
+            entry = self.journal.next()
+            if entry is None:
+                self._wake.wait(self.poll_interval)
+                self._wake.clear()
+                continue
+            self.run_entry(entry)
+
+    def run_entry(self, entry):
+        (id, repo, number, action, payload) = entry
+        if self.before and not self.before(repo, number):
+            logging.warning(
+                'dropping the journaled actions for %s#%s' % (repo, number)
+            )
+            self.journal.drop(repo, number, 'refused before apply')
+        else:
+            try:
+                self.apply(repo, number, action, payload)
+            except Exception as e:
+                logging.exception(e)
+                if not self.journal.retry(id, str(e)):
+                    logging.error(
+                        'giving up on %s for %s#%s' % (action, repo, number)
+                    )
+                    # the later writes assume this one happened
+                    self.journal.drop(repo, number, 'earlier action failed')
+            else:
+                self.journal.done(id)
+        if self.after and not self.journal.pending(repo, number):
+            self.after(repo, number)
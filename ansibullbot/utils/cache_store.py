@@ -0,0 +1,221 @@
+#!/usr/bin/env python
+
+# cache_store.py
+#
+#   CacheStore - one sqlite file for the per issue caches
+#
+#   Records are keyed by (repo, number, kind), where kind is the name the
+#   old pickle file had (issue, comments, events, history, pr_status ...).
+#   Repo level records use number 0. The payload is zlib compressed json
+#   (datetimes are tagged so they round trip), so callers store api
+#   raw_data rather than pygithub objects. Each record can carry the
+#   updated_at timestamp it was fetched for.
+#
+#   Usage:
+#       store = get_cache_store('~/.ansibullbot/cache/ansible/ansible',
+#                               repo_path='ansible/ansible')
+#       store.put('ansible/ansible', 1, 'comments', data, updated_at=ts)
+#       (updated_at, data) = store.get('ansible/ansible', 1, 'comments')
+
+import datetime
+import json
+import logging
+import os
+import pytz
+import sqlite3
+import threading
+import zlib
+
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS records (
+    repo TEXT NOT NULL,
+    number INTEGER NOT NULL,
+    kind TEXT NOT NULL,
+    updated_at TEXT,
+    data BLOB,
+    PRIMARY KEY (repo, number, kind)
+);
+'''
+
+TIMESTAMP_FORMAT = '%Y-%m-%dT%H:%M:%S.%f'
+
+# one store per sqlite file for the whole process
+STORES = {}
+STORES_LOCK = threading.Lock()
+
+
+def get_cache_store(cachedir, repo_path=None):
+    '''Return the shared store for a (repo or issue) cachedir'''
+
+    # the wrappers get handed the base cachedir, the repo cachedir or the
+    # repo's issues dir, all of them share the store in the base dir
+    basedir = os.path.expanduser(cachedir).rstrip('/')
+    if basedir.endswith('/issues'):
+        basedir = basedir[:-len('/issues')]
+    if repo_path and basedir.endswith('/' + repo_path):
+        basedir = basedir[:-(len(repo_path) + 1)]
+    dbfile = os.path.join(basedir, 'cache.sqlite')
+
+    with STORES_LOCK:
+        if dbfile not in STORES:
+            STORES[dbfile] = CacheStore(dbfile)
+    return STORES[dbfile]
+
+
+def _encode_datetime(obj):
+    if isinstance(obj, datetime.datetime):
+        return {
+            '__datetime__': obj.strftime(TIMESTAMP_FORMAT),
+            'utc': obj.tzinfo is not None
+        }
+    raise TypeError('%r is not JSON serializable' % obj)
+
+
+def _decode_datetime(obj):
+    if '__datetime__' in obj:
+        ts = datetime.datetime.strptime(obj['__datetime__'], TIMESTAMP_FORMAT)
+        if obj.get('utc'):
+            ts = pytz.utc.localize(ts)
+        return ts
+    return obj
+
+
+def encode_record(data):
+    return 'j' + zlib.compress(
+        json.dumps(data, separators=(',', ':'), default=_encode_datetime)
+    )
+
+
+def decode_record(blob):
+    blob = str(blob)
+    if blob[0] != 'j':
+        raise ValueError('unknown record encoding %r' % blob[0])
+    return json.loads(zlib.decompress(blob[1:]), object_hook=_decode_datetime)
+
+
+class CacheStore(object):
+    '''Compressed (repo, number, kind) records in a single sqlite file'''
+
+    def __init__(self, dbfile):
+        self.dbfile = dbfile
+        dbdir = os.path.dirname(self.dbfile)
+        if dbdir and not os.path.isdir(dbdir):
+            os.makedirs(dbdir)
+
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(
+            self.dbfile,
+            timeout=60,
+            check_same_thread=False
+        )
+        self._conn.text_factory = str
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.executescript(SCHEMA)
+        self._conn.commit()
+
+    def execute(self, sql, args=(), many=False):
+        '''Run a write statement and commit it'''
+        with self._lock:
+            if many:
+                self._conn.executemany(sql, args)
+            else:
+                self._conn.execute(sql, args)
+            self._conn.commit()
+
+    def query(self, sql, args=()):
+        '''Run a read statement and return all rows'''
+        with self._lock:
+            return self._conn.execute(sql, args).fetchall()
+
+    def get(self, repo, number, kind):
+        '''Return (updated_at, data) or (None, None) if missing'''
+        rows = self.query(
+            'SELECT updated_at, data FROM records '
+            'WHERE repo=? AND number=? AND kind=?',
+            (repo, int(number), kind)
+        )
+        if not rows:
+            return (None, None)
+
+        (updated_at, blob) = rows[0]
+        try:
+            data = decode_record(blob)
+        except Exception as e:
+            # treat unreadable records as missing so they get refetched
+            logging.error(
+                'failed to decode %s %s %s: %s' % (repo, number, kind, e)
+            )
+            return (None, None)
+
+        if updated_at:
+            updated_at = datetime.datetime.strptime(
+                updated_at,
+                TIMESTAMP_FORMAT
+            )
+        return (updated_at, data)
+
+    def put(self, repo, number, kind, data, updated_at=None):
+        if updated_at:
+            updated_at = updated_at.strftime(TIMESTAMP_FORMAT)
+        self.execute(
+            'INSERT OR REPLACE INTO records '
+            '(repo, number, kind, updated_at, data) VALUES (?, ?, ?, ?, ?)',
+            (repo, int(number), kind, updated_at,
+             sqlite3.Binary(encode_record(data)))
+        )
+
+    def put_many(self, repo, kind, records):
+        '''Upsert [(number, data), ...] in a single transaction'''
+        self.execute(
+            'INSERT OR REPLACE INTO records '
+            '(repo, number, kind, updated_at, data) VALUES (?, ?, ?, ?, ?)',
+            [(repo, int(number), kind, None,
+              sqlite3.Binary(encode_record(data)))
+             for (number, data) in records],
+            many=True
+        )
+
+    def get_all(self, repo, kind):
+        '''Return {number: data} for every record of this kind'''
+        rows = self.query(
+            'SELECT number, data FROM records WHERE repo=? AND kind=?',
+            (repo, kind)
+        )
+        records = {}
+        for (number, blob) in rows:
+            try:
+                records[number] = decode_record(blob)
+            except Exception as e:
+                logging.error(
+                    'failed to decode %s %s %s: %s' % (repo, number, kind, e)
+                )
+        return records
+
+    def delete(self, repo, number, kind=None):
+        if kind:
+            self.execute(
+                'DELETE FROM records WHERE repo=? AND number=? AND kind=?',
+                (repo, int(number), kind)
+            )
+        else:
+            self.execute(
+                'DELETE FROM records WHERE repo=? AND number=?',
+                (repo, int(number))
+            )
+
+    def exists(self, repo, number, kind):
+        rows = self.query(
+            'SELECT 1 FROM records WHERE repo=? AND number=? AND kind=?',
+            (repo, int(number), kind)
+        )
+        return bool(rows)
+
+    def numbers(self, repo, kind):
+        '''All numbers with a record of this kind'''
+        rows = self.query(
+            'SELECT number FROM records WHERE repo=? AND kind=? '
+            'ORDER BY number',
+            (repo, kind)
+        )
+        return [x[0] for x in rows]
@@ -0,0 +1,274 @@
+#!/usr/bin/env python
+
+# conditional_requests.py
+#
+#   Conditional GET requests for every pygithub call
+#
+#   The validators (ETag and Last-Modified) and the body of each GET
+#   response are kept per url in the cache store. Later requests for the
+#   same url send If-None-Match/If-Modified-Since, and when github
+#   answers 304 the stored response is handed back to pygithub as if it
+#   had been fetched. 304s are not counted against the rate limit, so
+#   issue.update(), refetching a pullrequest or walking the pages of an
+#   unchanged comment list no longer cost quota.
+#
+#   When the stored bodies pass maxsize bytes the least recently used
+#   urls are dropped, they just cost a full fetch the next time.
+#
+#   Usage:
+#       gh = Github(token)
+#       install_conditional_requests(gh, cachedir, maxsize=256 * 1024 ** 2)
+#       ...
+#       get_conditional_requests(cachedir).get_stats()
+
+import json
+import logging
+import sqlite3
+import threading
+import time
+import zlib
+
+from ansibullbot.utils.cache_store import get_cache_store
+
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS http_cache (
+    key TEXT PRIMARY KEY,
+    etag TEXT,
+    last_modified TEXT,
+    headers TEXT,
+    data BLOB,
+    fetched REAL
+);
+'''
+
+# added after the first release, ALTERed into older tables
+COLUMNS = [
+    ('size', 'INTEGER DEFAULT 0'),
+    ('accessed', 'REAL'),
+]
+
+# headers the caller sets to make its own request conditional
+CONDITIONAL_HEADERS = ['If-None-Match', 'If-Modified-Since']
+
+# one instance per cache store so the stats cover every connection
+INSTANCES = {}
+INSTANCES_LOCK = threading.Lock()
+
+
+def get_conditional_requests(cachedir, maxsize=None):
+    store = get_cache_store(cachedir)
+    with INSTANCES_LOCK:
+        if store.dbfile not in INSTANCES:
+            INSTANCES[store.dbfile] = ConditionalRequests(store, maxsize)
+    return INSTANCES[store.dbfile]
+
+
+def install_conditional_requests(gh, cachedir, maxsize=None):
+    '''Make every GET sent through this Github connection conditional'''
+    cr = get_conditional_requests(cachedir, maxsize=maxsize)
+    cr.install(gh._Github__requester)
+    return cr
+
+
+class ConditionalRequests(object):
+    '''Url -> (validators, headers, body) for the github api'''
+
+    def __init__(self, store, maxsize=None):
+        self.store = store
+        self.maxsize = maxsize
+        self.store.execute(SCHEMA)
+        columns = [
+            x[1] for x in self.store.query('PRAGMA table_info(http_cache)')
+        ]
+        for (name, decl) in COLUMNS:
+            if name not in columns:
+                self.store.execute(
+                    'ALTER TABLE http_cache ADD COLUMN %s %s' % (name, decl)
+                )
+        if 'size' not in columns:
+            self.store.execute(
+                'UPDATE http_cache SET size=LENGTH(data), accessed=fetched'
+            )
+        self.store.execute(
+            'CREATE INDEX IF NOT EXISTS http_cache_lru '
+            'ON http_cache (accessed)'
+        )
+
+        self._lock = threading.Lock()
+        self._size = self.store.query(
+            'SELECT SUM(size) FROM http_cache'
+        )[0][0] or 0
+        self.reset_stats()
+
+    @staticmethod
+    def get_key(url, headers):
+        # the same url answers differently for each preview media type
+        return '%s %s' % (headers.get('Accept', ''), url)
+
+    def install(self, requester):
+        if getattr(requester, '_conditional_requests', None) is self:
+            return
+
+        # the name mangled method is looked up on the instance, so this
+        # also covers the requester's own retries and redirects
+        original = requester._Requester__requestRaw
+
+        def request_raw(cnx, verb, url, requestHeaders, input):
+            return self.request(
+                original, cnx, verb, url, requestHeaders, input
+            )
+
+        requester._Requester__requestRaw = request_raw
+        requester._conditional_requests = self
+
+    def load(self, key):
+        rows = self.store.query(
+            'SELECT etag, last_modified, headers, data FROM http_cache '
+            'WHERE key=?',
+            (key,)
+        )
+        if not rows:
+            return None
+        self.store.execute(
+            'UPDATE http_cache SET accessed=? WHERE key=?',
+            (time.time(), key)
+        )
+        (etag, last_modified, headers, data) = rows[0]
+        return {
+            'etag': etag,
+            'last_modified': last_modified,
+            'headers': json.loads(headers),
+            'data': zlib.decompress(data),
+        }
+
+    def save(self, key, headers, data):
+        blob = zlib.compress(data)
+        now = time.time()
+        with self._lock:
+            rows = self.store.query(
+                'SELECT size FROM http_cache WHERE key=?', (key,)
+            )
+            self.store.execute(
+                'INSERT OR REPLACE INTO http_cache '
+                '(key, etag, last_modified, headers, data, fetched, size, '
+                'accessed) VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                (key, headers.get('etag'), headers.get('last-modified'),
+                 json.dumps(headers), sqlite3.Binary(blob), now, len(blob),
+                 now)
+            )
+            if rows:
+                self._size -= rows[0][0] or 0
+            self._size += len(blob)
+
+        if self.maxsize and self._size > self.maxsize:
+            self.evict()
+
+    def evict(self):
+        '''Drop least recently used urls until under maxsize'''
+        if not self.maxsize:
+            return
+        with self._lock:
+            rows = self.store.query(
+                'SELECT key, size FROM http_cache ORDER BY accessed'
+            )
+            # leave some headroom so eviction doesn't run on every write
+            target = int(self.maxsize * 0.9)
+            delete = []
+            for (key, size) in rows:
+                if self._size <= target:
+                    break
+                delete.append((key,))
+                self._size -= size or 0
+            if delete:
+                logging.info('http cache: evicting %s entries' % len(delete))
+                self.store.execute(
+                    'DELETE FROM http_cache WHERE key=?',
+                    delete,
+                    many=True
+                )
+
+    def request(self, send, cnx, verb, url, headers, input):
+        if verb != 'GET':
+            return send(cnx, verb, url, headers, input)
+
+        key = self.get_key(url, headers)
+
+        # pygithub's update() sends its own etag and expects the 304
+        cached = None
+        conditional = bool([x for x in CONDITIONAL_HEADERS if x in headers])
+        if not conditional:
+            cached = self.load(key)
+            if cached:
+                headers = headers.copy()
+                if cached['etag']:
+                    headers['If-None-Match'] = cached['etag']
+                if cached['last_modified']:
+                    headers['If-Modified-Since'] = cached['last_modified']
+                conditional = True
+
+        (status, rheaders, output) = send(cnx, verb, url, headers, input)
+
+        if status == 304:
+            self._count('hits', conditional)
+            if cached:
+                # keep the stored pagination links, take the new rate
+                # limit numbers
+                merged = cached['headers'].copy()
+                merged.update(rheaders)
+                return (200, merged, cached['data'])
+        elif status == 200:
+            self._count('misses', conditional)
+            if rheaders.get('etag') or rheaders.get('last-modified'):
+                self.save(key, rheaders, output)
+        else:
+            self._count('errors', conditional)
+
+        return (status, rheaders, output)
+
+    def _count(self, name, conditional=False):
+        with self._lock:
+            self.stats['requests'] += 1
+            self.stats[name] += 1
+            if conditional:
+                self.stats['conditional'] += 1
+
+    def reset_stats(self):
+        with self._lock:
+            self.stats = {
+                'requests': 0,
+                'conditional': 0,
+                'hits': 0,
+                'misses': 0,
+                'errors': 0,
+            }
+
+    def get_stats(self):
+        '''Counts for the current run plus the hit and 304 ratios'''
+        with self._lock:
+            stats = self.stats.copy()
+        stats['hit_ratio'] = 0.0
+        stats['not_modified_ratio'] = 0.0
+        if stats['requests']:
+            stats['hit_ratio'] = \
+                round(float(stats['hits']) / stats['requests'], 3)
+        if stats['conditional']:
+            stats['not_modified_ratio'] = \
+                round(float(stats['hits']) / stats['conditional'], 3)
+        return stats
+
+    def log_stats(self):
+        stats = self.get_stats()
+        logging.info(
+            'API: %s GETs, %s conditional, %s not modified, %s fetched, '
+            '%s errors, hit ratio %s, 304 ratio %s' % (
+                stats['requests'],
+                stats['conditional'],
+                stats['hits'],
+                stats['misses'],
+                stats['errors'],
+                stats['hit_ratio'],
+                stats['not_modified_ratio']
+            )
+        )
+        return stats
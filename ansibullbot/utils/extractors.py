@@ -1,5 +1,6 @@
 #!/usr/bin/env python
 
+import hashlib
 import logging
 import operator
 import re
@@ -37,8 +38,87 @@ def extract_template_sections(body, header='#####'):
     return sections
 
 
+# compiled section scanners and prefix maps keyed by the sections tuple
+SECTION_SCANNERS = {}
+
+# extract_template_data results keyed by body hash, class and sections
+TEMPLATE_DATA_CACHE = {}
+TEMPLATE_DATA_CACHE_SIZE = 5000
+
+
+def _get_section_scanner(sections):
+    if sections not in SECTION_SCANNERS:
+        # longest first so the alternation prefers the longest section
+        # starting at any given position, the shorter sections that also
+        # match there are all prefixes of it
+        ordered = sorted(set(sections), key=len, reverse=True)
+        pattern = '(?=(%s))' % '|'.join([re.escape(x) for x in ordered])
+        prefixes = {}
+        for section in ordered:
+            prefixes[section] = [x for x in ordered if section.startswith(x)]
+        SECTION_SCANNERS[sections] = (re.compile(pattern), prefixes)
+    return SECTION_SCANNERS[sections]
+
+
+def find_template_sections(upper_body, SECTIONS=SECTIONS):
+    '''Map each section to every index it occurs at in a single scan'''
+    scanner, prefixes = _get_section_scanner(tuple(SECTIONS))
+    occurrences = {}
+    for match in scanner.finditer(upper_body):
+        for section in prefixes[match.group(1)]:
+            if section not in occurrences:
+                occurrences[section] = []
+            occurrences[section].append(match.start())
+    return occurrences
+
+
+def _find_section_with_header(upper_body, occurrences, section, before, after):
+    '''Index of the first occurrence of section between before and after'''
+    if before == '$' or after == '$':
+        # not a plain string once it goes through Template
+        tofind = Template(before + '${section}' + after)
+        tofind = tofind.substitute(section=section)
+        match = upper_body.find(tofind)
+        if match == -1:
+            return None
+        return match + 1
+
+    slen = len(section)
+    blen = len(upper_body)
+    for idx in occurrences.get(section, []):
+        if idx < 1 or (idx + slen) >= blen:
+            continue
+        if upper_body[idx - 1] == before and upper_body[idx + slen] == after:
+            return idx
+    return None
+
+
 def extract_template_data(body, issue_number=None, issue_class='issue', SECTIONS=SECTIONS):
 
+    if not body:
+        return {}
+
+    # triage, the description fixer and the template wizard all parse
+    # the same bodies
+    if isinstance(body, unicode):
+        bkey = body.encode('utf-8')
+    else:
+        bkey = body
+    ckey = (hashlib.sha1(bkey).hexdigest(), issue_class, tuple(SECTIONS))
+    if ckey not in TEMPLATE_DATA_CACHE:
+        if len(TEMPLATE_DATA_CACHE) >= TEMPLATE_DATA_CACHE_SIZE:
+            TEMPLATE_DATA_CACHE.clear()
+        TEMPLATE_DATA_CACHE[ckey] = _extract_template_data(
+            body,
+            issue_number=issue_number,
+            issue_class=issue_class,
+            SECTIONS=SECTIONS
+        )
+    return TEMPLATE_DATA_CACHE[ckey].copy()
+
+
+def _extract_template_data(body, issue_number=None, issue_class='issue', SECTIONS=SECTIONS):
+
     # this is the final result to return
     tdict = {}
 
@@ -47,26 +127,26 @@ def extract_template_data(body, issue_number=None, issue_class='issue', SECTIONS
 
     upper_body = body.upper()
 
+    # find every section occurrence in one pass
+    occurrences = find_template_sections(upper_body, SECTIONS=SECTIONS)
+
     # make a map of locations where each section starts
     match_map = {}
     for section in SECTIONS:
-        # http://www.tutorialspoint.com/python/string_find.htm
-        # str.find(str, beg=0 end=len(string))
-        match = upper_body.find(section)
-        if match != -1:
-            match_map[section] = match
+        if section in occurrences:
+            match_map[section] = occurrences[section][0]
 
     if not match_map:
         return {}
 
     # what are the header(s) being used?
+    #   (char before the section, char after the section)
     headers = []
     for k,v in match_map.items():
         try:
             before = upper_body[v-1]
             after = upper_body[v + len(k)]
-            header = before + '${section}' + after
-            headers.append(header)
+            headers.append((before, after))
         except:
             pass
 
@@ -81,31 +161,30 @@ def extract_template_data(body, issue_number=None, issue_class='issue', SECTIONS
         sheader = choice_totals[-1][1]
 
         match_map = {}
-        t = Template(sheader)
         for section in SECTIONS:
             try:
-                tofind = t.substitute(section=section)
+                match = _find_section_with_header(
+                    upper_body, occurrences, section, sheader[0], sheader[1]
+                )
             except Exception as e:
                 if C.DEFAULT_BREAKPOINTS:
                     logging.error('breakpoint!')
                     import epdb; epdb.st()
                 else:
                     raise Exception('substitution failed: %s' % str(e))
-            match = upper_body.find(tofind)
-            if match != -1:
-                match_map[section] = match + 1
+            if match is not None:
+                match_map[section] = match
 
         # re-do for missing sections with less common header(s)
         for section in SECTIONS:
             if section in match_map:
                 continue
             for choice in choices:
-                t = Template(choice)
-                tofind = t.substitute(section=section)
-                match = upper_body.find(tofind)
-                if match != -1:
-                    match_map[section] = match + 1
-                    #import epdb; epdb.st()
+                match = _find_section_with_header(
+                    upper_body, occurrences, section, choice[0], choice[1]
+                )
+                if match is not None:
+                    match_map[section] = match
                     break
 
         if not match_map:
@@ -0,0 +1,143 @@
+#!/usr/bin/env python
+
+# fact_pipeline.py
+#
+#   LazyMeta - a meta dict that computes the plugin facts on first access
+#
+#   The fact plugins (ansibullbot/triagers/plugins and a few triager
+#   methods) declare the meta keys they read and the ones they return
+#   with @declare_facts. AnsibleTriage.process sets the cheap facts it
+#   needs for every issue and registers the plugins in their historic
+#   order instead of running them. Reading a key then runs the plugins
+#   that return it, once, and whatever create_actions never reads is
+#   never fetched.
+#
+#   A running plugin only sees the facts of the plugins registered
+#   before it, just like in the old fixed order, so a plugin refining
+#   an earlier fact (rebuild_merge and needs_rebuild) still starts from
+#   the earlier value.
+#
+#   Usage:
+#       @declare_facts(['is_backport'])
+#       def get_backport_facts(iw, meta):
+#           ...
+#
+#       meta = LazyMeta({'is_pullrequest': True})
+#       meta.add_plugin(
+#           'backports',
+#           get_backport_facts,
+#           lambda meta: get_backport_facts(iw, meta)
+#       )
+#       meta['is_backport']
+
+import logging
+
+
+def declare_facts(outputs, inputs=()):
+    '''Mark the meta keys a fact function returns and reads'''
+    def decorator(func):
+        func.fact_outputs = tuple(outputs)
+        func.fact_inputs = tuple(inputs)
+        return func
+    return decorator
+
+
+class LazyMeta(dict):
+    '''dict of issue facts, the plugin facts are computed when read'''
+
+    def __init__(self, *args, **kwargs):
+        super(LazyMeta, self).__init__(*args, **kwargs)
+        # [(name, run, outputs)] in registration order
+        self._plugins = []
+        # key -> [plugin index]
+        self._producers = {}
+        self._done = set()
+        # the plugins being run, innermost last
+        self._running = []
+
+    def add_plugin(self, name, func, run=None):
+        '''Register func, run(meta) computes its facts (func(meta))'''
+        outputs = getattr(func, 'fact_outputs', None)
+        if outputs is None:
+            raise Exception('%s does not declare its facts' % name)
+        for key in getattr(func, 'fact_inputs', ()):
+            if key not in self._producers and not dict.__contains__(self, key):
+                raise Exception(
+                    '%s reads %s which no earlier fact provides' % (name, key)
+                )
+
+        idx = len(self._plugins)
+        self._plugins.append((name, run or func, outputs))
+        for key in outputs:
+            self._producers.setdefault(key, []).append(idx)
+
+    def _run(self, idx):
+        if idx in self._done:
+            return
+        self._done.add(idx)
+        (name, run, outputs) = self._plugins[idx]
+        logging.debug('computing %s facts' % name)
+        self._running.append(idx)
+        try:
+            facts = run(self)
+        finally:
+            self._running.pop()
+
+        # some plugins fill in the meta they were given and return it
+        if facts is not None and facts is not self:
+            undeclared = [x for x in facts if x not in outputs]
+            if undeclared:
+                logging.warning(
+                    '%s returned undeclared facts: %s'
+                    % (name, ', '.join(sorted(undeclared)))
+                )
+            dict.update(self, facts)
+
+    def _resolve(self, key):
+        # a running plugin reads the facts registered before it
+        if self._running:
+            limit = self._running[-1]
+        else:
+            limit = len(self._plugins)
+
+        producers = self._producers.get(key)
+        if producers is None:
+            if not dict.__contains__(self, key):
+                # not declared by any plugin, so run all that could set it
+                for idx in range(limit):
+                    self._run(idx)
+            return
+        for idx in producers:
+            if idx >= limit:
+                break
+            self._run(idx)
+
+    def __getitem__(self, key):
+        self._resolve(key)
+        return dict.__getitem__(self, key)
+
+    def __contains__(self, key):
+        self._resolve(key)
+        return dict.__contains__(self, key)
+
+    def has_key(self, key):
+        return key in self
+
+    def get(self, key, default=None):
+        self._resolve(key)
+        return dict.get(self, key, default)
+
+    def copy(self):
+        '''A plain dict of the facts computed so far'''
+        return dict(self)
+
+    def compute_all(self):
+        for idx in range(len(self._plugins)):
+            self._run(idx)
+
+    def get_skipped(self):
+        '''Names of the plugins nothing has read yet'''
+        return [
+            x[0] for idx,x in enumerate(self._plugins)
+            if idx not in self._done
+        ]
@@ -9,6 +9,8 @@ import logging
 import requests
 from operator import itemgetter
 
+from ansibullbot.utils.token_pool import get_token_pool
+
 
 QUERY_FIELDS = """
 id
@@ -63,6 +65,18 @@ class GithubGraphQLClient(object):
         }
         self.environment = jinja2.Environment()
 
+    def _post(self, payload):
+        '''Send a query, with a pooled read token if there is a pool'''
+        headers = self.headers
+        pool = get_token_pool()
+        if pool:
+            auth = pool.acquire_read(resource='graphql')
+            headers = dict(self.headers, Authorization=auth)
+        rr = requests.post(self.baseurl, headers=headers, data=json.dumps(payload))
+        if pool:
+            pool.update(auth, rr.headers, resource='graphql')
+        return rr
+
     def get_issue_summaries(self, repo_url, baseurl=None, cachefile=None):
         """Return a dict of all issue summaries with numbers as keys
 
@@ -178,7 +192,7 @@ class GithubGraphQLClient(object):
                 'variables': '{}',
                 'operationName': None
             }
-            rr = requests.post(self.baseurl, headers=self.headers, data=json.dumps(payload))
+            rr = self._post(payload)
             if not rr.ok:
                 break
             data = rr.json()
@@ -226,7 +240,7 @@ class GithubGraphQLClient(object):
             'variables': '{}',
             'operationName': None
         }
-        rr = requests.post(self.baseurl, headers=self.headers, data=json.dumps(payload))
+        rr = self._post(payload)
         data = rr.json()
 
         node = data['data']['repository'][otype]
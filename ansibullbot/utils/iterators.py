@@ -1,12 +1,49 @@
 #!/usr/bin/env python
 
+import Queue
+import sys
+import threading
+
+
+def install_thread_local_connections(gh):
+    '''Give every thread its own http connection to the api
+
+    pygithub keeps one persistent connection per requester and splits
+    each call into cnx.request() and cnx.getresponse(), so two threads
+    sharing it can send each other's requests.
+    '''
+    requester = gh._Github__requester
+    if getattr(requester, '_thread_connections', None) is not None:
+        return
+    local = threading.local()
+
+    def create_connection():
+        if getattr(local, 'cnx', None) is None:
+            local.cnx = requester._Requester__connectionClass(
+                requester._Requester__hostname,
+                requester._Requester__port,
+                retry=requester._Requester__retry,
+                timeout=requester._Requester__timeout,
+                verify=requester._Requester__verify
+            )
+        return local.cnx
+
+    # looked up on the instance like the requestRaw hooks
+    requester._Requester__createConnection = create_connection
+    requester._thread_connections = local
+
 
 class RepoIssuesIterator(object):
 
     def __init__(self, repo, numbers, issuecache={}):
         self.repo = repo
-        self.numbers = sorted(set([int(x) for x in numbers]))
-        self.numbers = [x for x in reversed(self.numbers)]
+        # numbers are walked in the given order, the scheduler decides it
+        self.numbers = []
+        seen = set()
+        for x in numbers:
+            if int(x) not in seen:
+                seen.add(int(x))
+                self.numbers.append(int(x))
         self.issuecache = issuecache
         self.i = 0
 
@@ -26,3 +63,105 @@ class RepoIssuesIterator(object):
             issue = self.repo.get_issue(thisnum)
 
         return issue
+
+
+class PrefetchingRepoIssuesIterator(RepoIssuesIterator):
+    '''Fetches the next readahead issues while the current one is triaged
+
+    At most readahead issues are fetched or in flight beyond the one
+    being returned. Leaving the for loop early (break, exception) closes
+    the iterator, queued fetches are dropped and the threads exit once
+    their current fetch is done.
+    '''
+
+    def __init__(self, repo, numbers, issuecache={}, readahead=4):
+        super(PrefetchingRepoIssuesIterator, self).__init__(
+            repo,
+            numbers,
+            issuecache=issuecache
+        )
+        self.readahead = readahead
+        self.closed = False
+        self._pending = Queue.Queue()
+        # index -> (issue, exc_info)
+        self._results = {}
+        self._submitted = 0
+        self._cond = threading.Condition()
+        self._threads = []
+
+    def __iter__(self):
+        # a generator so the for loop closes it when it stops early
+        try:
+            while True:
+                yield self.next()
+        finally:
+            self.close()
+
+    def _start(self):
+        for x in range(self.readahead):
+            t = threading.Thread(target=self._fetch_loop)
+            t.daemon = True
+            t.start()
+            self._threads.append(t)
+
+    def _fetch_loop(self):
+        while True:
+            idx = self._pending.get()
+            if idx is None or self.closed:
+                return
+            try:
+                result = (self.repo.get_issue(self.numbers[idx]), None)
+            except Exception:
+                result = (None, sys.exc_info())
+            with self._cond:
+                if self.closed:
+                    return
+                self._results[idx] = result
+                self._cond.notify_all()
+
+    def _fill(self):
+        '''Queue fetches up to readahead past the current index'''
+        if not self._threads:
+            self._start()
+        end = min(self.i + 1 + self.readahead, len(self.numbers))
+        while self._submitted < end:
+            if self.numbers[self._submitted] not in self.issuecache:
+                self._pending.put(self._submitted)
+            self._submitted += 1
+
+    def next(self):
+
+        if self.closed or self.i > (len(self.numbers) - 1):
+            self.close()
+            raise StopIteration()
+
+        idx = self.i
+        thisnum = self.numbers[idx]
+        self._fill()
+        self.i += 1
+        if thisnum in self.issuecache:
+            return self.issuecache[thisnum]
+
+        with self._cond:
+            while idx not in self._results:
+                # a timeout keeps ctrl-c working on python2
+                self._cond.wait(1)
+            (issue, exc_info) = self._results.pop(idx)
+        if exc_info:
+            raise exc_info[0], exc_info[1], exc_info[2]
+        return issue
+
+    def close(self):
+        '''Drop queued fetches and stop the threads'''
+        with self._cond:
+            if self.closed:
+                return
+            self.closed = True
+            self._results.clear()
+        while True:
+            try:
+                self._pending.get_nowait()
+            except Queue.Empty:
+                break
+        for x in self._threads:
+            self._pending.put(None)
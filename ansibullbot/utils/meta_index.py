@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+
+# meta_index.py
+#
+#   MetaIndex - the small part of every meta.json the triager queries
+#
+#   The meta.json files hold the full history, template data and ci
+#   status for an issue. Deciding whether an issue is stale or has
+#   changed since the last run only needs when it was last processed,
+#   the issue's updated_at at that time and a hash of the meta. Those
+#   are kept in a table next to the cache store records and loaded into
+#   memory once per repo.
+#
+#   Usage:
+#       mi = MetaIndex(get_cache_store(cachedir))
+#       mi.update('ansible/ansible', 1, meta)
+#       entry = mi.get('ansible/ansible', 1)
+#       entry.time, entry.updated_at, entry.hash
+
+import datetime
+import hashlib
+import json
+
+from collections import namedtuple
+
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS meta_index (
+    repo TEXT NOT NULL,
+    number INTEGER NOT NULL,
+    time TEXT,
+    updated_at TEXT,
+    hash TEXT,
+    PRIMARY KEY (repo, number)
+);
+'''
+
+# meta['time'] is written with datetime.isoformat()
+TIME_FORMAT = '%Y-%m-%dT%H:%M:%S.%f'
+
+MetaEntry = namedtuple('MetaEntry', ['time', 'updated_at', 'hash'])
+
+
+def get_meta_hash(meta):
+    '''Hash of the meta content, ignoring when it was dumped'''
+    meta = dict((k, v) for k, v in meta.items() if k != 'time')
+    return hashlib.sha1(json.dumps(meta, sort_keys=True)).hexdigest()
+
+
+def parse_time(ts):
+    try:
+        return datetime.datetime.strptime(ts, TIME_FORMAT)
+    except ValueError:
+        # isoformat() drops the fraction when it is zero
+        return datetime.datetime.strptime(ts, '%Y-%m-%dT%H:%M:%S')
+
+
+class MetaIndex(object):
+    '''Per repo (number -> time, updated_at, hash) of the dumped metas'''
+
+    def __init__(self, store):
+        self.store = store
+        self.store.execute(SCHEMA)
+        self._repos = {}
+
+    def _load(self, repo):
+        if repo not in self._repos:
+            rows = self.store.query(
+                'SELECT number, time, updated_at, hash FROM meta_index '
+                'WHERE repo=?',
+                (repo,)
+            )
+            self._repos[repo] = dict(
+                (number, MetaEntry(parse_time(ts), updated_at, chash))
+                for (number, ts, updated_at, chash) in rows
+            )
+        return self._repos[repo]
+
+    def get(self, repo, number):
+        return self._load(repo).get(int(number))
+
+    def numbers(self, repo):
+        return sorted(self._load(repo).keys())
+
+    def update(self, repo, number, meta):
+        '''Index a meta that carries time and updated_at'''
+        entry = MetaEntry(
+            parse_time(meta['time']),
+            meta.get('updated_at'),
+            get_meta_hash(meta)
+        )
+        self.store.execute(
+            'INSERT OR REPLACE INTO meta_index '
+            '(repo, number, time, updated_at, hash) VALUES (?, ?, ?, ?, ?)',
+            (repo, int(number), meta['time'], entry.updated_at, entry.hash)
+        )
+        self._load(repo)[int(number)] = entry
+        return entry
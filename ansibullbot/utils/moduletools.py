@@ -10,7 +10,9 @@ import shutil
 import yaml
 
 from ansibullbot.parsers.botmetadata import BotMetadataParser
+from ansibullbot.utils.systemtools import file_lock
 from ansibullbot.utils.systemtools import run_command
+from ansibullbot.utils.systemtools import write_atomic
 from ansibullbot.utils.webscraper import GithubWebScraper
 
 
@@ -69,11 +71,13 @@ class ModuleIndexer(object):
     def manage_checkout(self):
         '''Check if there are any changes to the repo'''
         changed = False
-        if not os.path.isdir(self.checkoutdir):
-            self.create_checkout()
-            changed = True
-        else:
-            changed = self.update_checkout()
+        # other triage workers on this host share the checkout
+        with file_lock(self.checkoutdir + '.lock'):
+            if not os.path.isdir(self.checkoutdir):
+                self.create_checkout()
+                changed = True
+            else:
+                changed = self.update_checkout()
         return changed
 
     def parse_metadata(self):
@@ -414,8 +418,7 @@ class ModuleIndexer(object):
                         commit['date'] = ds
                         self.commits[k].append(commit)
 
-                with open(pfile, 'wb') as f:
-                    pickle.dump((mtime, self.commits[k]), f)
+                write_atomic(pfile, pickle.dumps((mtime, self.commits[k])))
 
     def last_commit_for_file(self, filepath):
         # git log --pretty=format:'%H' -1
@@ -462,8 +465,7 @@ class ModuleIndexer(object):
             if refresh:
                 uns = self.gws.get_usernames_from_filename_blame(*sargs)
                 self.committers[k] = uns
-                with open(pfile, 'wb') as f:
-                    pickle.dump((ghash, uns), f)
+                write_atomic(pfile, pickle.dumps((ghash, uns)))
 
         # add scraped logins to the map
         #for k,v in self.modules.iteritems():
@@ -0,0 +1,112 @@
+#!/usr/bin/env python
+
+# raw_objects.py
+#
+#   RawObject - a read-only view of github api json
+#
+#   The caches only keep the api's raw_data dicts. RawObject gives those
+#   dicts back the attribute access the triagers expect from pygithub
+#   objects (comment.user.login, event.label.name, f.filename ...)
+#   without a requester or any of the per attribute bookkeeping.
+#   Attributes are converted on first access: nested dicts become
+#   RawObjects and *_at timestamps become naive utc datetimes, the same
+#   as pygithub returns them.
+#
+#   Usage:
+#       comments = [RawObject(x) for x in raw_comments]
+#       comments[0].created_at
+
+import datetime
+
+from github.GithubObject import GithubObject
+
+
+TIMESTAMP_FORMAT = '%Y-%m-%dT%H:%M:%SZ'
+
+
+def parse_timestamp(value):
+    try:
+        return datetime.datetime.strptime(value, TIMESTAMP_FORMAT)
+    except (TypeError, ValueError):
+        return value
+
+
+def convert_value(key, value):
+    if isinstance(value, dict):
+        return RawObject(value)
+    if isinstance(value, list):
+        return [convert_value(None, x) for x in value]
+    if key and isinstance(value, basestring) and \
+            (key.endswith('_at') or key == 'date'):
+        return parse_timestamp(value)
+    return value
+
+
+def get_raw_data(obj):
+    '''The api data behind a pygithub or raw object'''
+    if isinstance(obj, RawObject):
+        return obj.raw_data
+    if isinstance(obj, GithubObject):
+        # raw_data would complete (refetch) paginated items
+        return obj._rawData
+    return obj
+
+
+def to_raw_objects(objs):
+    '''Swap a list of pygithub objects or raw dicts for RawObjects'''
+    return [RawObject(get_raw_data(x)) for x in objs]
+
+
+class RawObject(object):
+    '''Read-only attribute access to an api dict'''
+
+    __slots__ = ('_raw', '_values')
+
+    def __init__(self, raw_data):
+        object.__setattr__(self, '_raw', raw_data)
+        object.__setattr__(self, '_values', None)
+
+    def __getattr__(self, name):
+        if name.startswith('__'):
+            raise AttributeError(name)
+        values = self._values
+        if values is None:
+            values = {}
+            object.__setattr__(self, '_values', values)
+        elif name in values:
+            return values[name]
+        try:
+            value = self._raw[name]
+        except KeyError:
+            raise AttributeError(name)
+        value = convert_value(name, value)
+        values[name] = value
+        return value
+
+    def __setattr__(self, name, value):
+        raise AttributeError('%s is read-only' % self.__class__.__name__)
+
+    def __eq__(self, other):
+        return isinstance(other, RawObject) and self._raw == other._raw
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    def __hash__(self):
+        return hash(self._raw.get('url') or self._raw.get('id'))
+
+    def __repr__(self):
+        return 'RawObject(%s)' % (
+            self._raw.get('url') or self._raw.get('id')
+        )
+
+    def __getstate__(self):
+        return self._raw
+
+    def __setstate__(self, state):
+        object.__setattr__(self, '_raw', state)
+        object.__setattr__(self, '_values', None)
+
+    @property
+    def raw_data(self):
+        return self._raw
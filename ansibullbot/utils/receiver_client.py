@@ -1,32 +1,324 @@
 #!/usr/bin/env python
 
+# receiver_client.py
+#
+#   post_to_receiver() hands metadata and summaries to a background
+#   sender and returns right away, the triage loop never waits on the
+#   receiver.
+#
+#   * records are merged into one bulk payload per (path, user, repo)
+#     and sent when batch_size records are waiting or flush_interval
+#     seconds have passed
+#   * batches that can't be delivered are written to a spool directory
+#     and resent, oldest first, once the receiver answers again. Each
+#     --worker_id process spools to its own directory.
+#   * failures back off exponentially up to max_backoff seconds
+#   * get_receiver_metrics() reports queue depth, spool depth and
+#     delivery latency
+
+import Queue
+import atexit
+import json
 import logging
+import os
+import threading
+import time
+
 import ansibullbot.constants as C
 import requests
 
+from ansibullbot.utils.systemtools import write_atomic
+
+
+# seconds to wait on the receiver for a single post
+POST_TIMEOUT = 30
+
+CLIENT = None
+CLIENT_LOCK = threading.Lock()
+
+# set by the triager before the first post
+WORKER_ID = None
+
+
+def get_receiver_url():
+    if not C.DEFAULT_RECEIVER_HOST or \
+            'none' in C.DEFAULT_RECEIVER_HOST.lower():
+        return None
+    receiverurl = 'http://'
+    receiverurl += C.DEFAULT_RECEIVER_HOST
+    receiverurl += ':'
+    receiverurl += str(C.DEFAULT_RECEIVER_PORT)
+    return receiverurl
+
+
+def set_receiver_worker(worker_id):
+    '''Spool to a directory of this shard worker's own'''
+    global WORKER_ID
+    WORKER_ID = worker_id
+
+
+def get_receiver_spool():
+    spooldir = C.DEFAULT_RECEIVER_SPOOL.rstrip('/')
+    if WORKER_ID:
+        spooldir = '%s.%s' % (spooldir, WORKER_ID)
+    return spooldir
+
+
+def get_receiver_client():
+    '''The process wide client, None if no receiver is configured'''
+    global CLIENT
+    with CLIENT_LOCK:
+        if CLIENT is None:
+            baseurl = get_receiver_url()
+            if not baseurl:
+                return None
+            CLIENT = ReceiverClient(
+                baseurl,
+                get_receiver_spool(),
+                batch_size=C.DEFAULT_RECEIVER_BATCH_SIZE,
+                flush_interval=C.DEFAULT_RECEIVER_FLUSH_INTERVAL,
+                max_backoff=C.DEFAULT_RECEIVER_MAX_BACKOFF
+            )
+            atexit.register(CLIENT.close)
+    return CLIENT
+
 
 def post_to_receiver(path, params, data):
 
     if not data:
         return
 
-    if not C.DEFAULT_RECEIVER_HOST or 'none' in C.DEFAULT_RECEIVER_HOST.lower():
-        return
+    client = get_receiver_client()
+    if client:
+        client.post(path, params, data)
+
+
+def get_receiver_metrics():
+    client = get_receiver_client()
+    if client:
+        return client.get_metrics()
+    return {}
+
+
+class ReceiverClient(object):
+    '''Batches posts to the receiver from a background thread'''
+
+    def __init__(self, baseurl, spooldir, batch_size=100, flush_interval=5,
+                 max_backoff=300):
+        self.baseurl = baseurl
+        self.spooldir = os.path.expanduser(spooldir)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_backoff = max_backoff
 
-    rr = None
-    if C.DEFAULT_RECEIVER_HOST and data:
-        receiverurl = 'http://'
-        receiverurl += C.DEFAULT_RECEIVER_HOST
-        receiverurl += ':'
-        receiverurl += str(C.DEFAULT_RECEIVER_PORT)
-        receiverurl += '/'
-        receiverurl += path
-        logging.info('RECEIVER: POST to %s' % receiverurl)
+        if not os.path.isdir(self.spooldir):
+            os.makedirs(self.spooldir)
+
+        self.queue = Queue.Queue()
+        self.metrics = {
+            'queued': 0,
+            'sent': 0,
+            'batches': 0,
+            'failures': 0,
+            'spooled': 0,
+            'send_seconds': 0.0,
+            'latency_last': None,
+            'latency_max': 0.0,
+        }
+
+        # (path, user, repo) -> batch, only touched by the sender thread
+        self._pending = {}
+        self._pending_count = 0
+        self._backoff = 0
+        self._retry_at = 0
+        self._spool_seq = 0
+        self._spooled = bool(self._get_spool_files())
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+        self._thread = threading.Thread(
+            target=self._run,
+            name='receiver-client'
+        )
+        self._thread.daemon = True
+        self._thread.start()
+
+    def post(self, path, params, data):
+        '''Queue records for the receiver, never blocks'''
+        params = params.copy()
+        number = params.pop('number', None)
+        if number is not None:
+            # single documents are batched by number
+            data = {str(number): data}
+        else:
+            data = dict((str(k), v) for k,v in data.items())
+        self.queue.put((time.time(), path, params, data))
+        with self._lock:
+            self.metrics['queued'] += len(data)
+
+    def get_metrics(self):
+        with self._lock:
+            metrics = self.metrics.copy()
+        metrics['queue_depth'] = self.queue.qsize() + self._pending_count
+        metrics['spool_depth'] = len(self._get_spool_files())
+        return metrics
+
+    def close(self, timeout=POST_TIMEOUT):
+        '''Send or spool everything that is queued'''
+        self._stop.set()
+        self._thread.join(timeout)
+
+    def _run(self):
+        last_flush = time.time()
+        while not self._stop.is_set():
+            # an error must not end the thread, post() would queue forever
+            try:
+                last_flush = self._step(last_flush)
+            except Exception:
+                logging.exception('RECEIVER: sender error')
+                self._stop.wait(1)
+
+        # drain whatever was queued before the stop
+        while True:
+            try:
+                self._add(self.queue.get_nowait())
+            except Queue.Empty:
+                break
         try:
-            rr = requests.post(receiverurl, params=params, json=data)
+            self._flush()
+        except Exception:
+            logging.exception('RECEIVER: sender error')
+
+    def _step(self, last_flush):
+        '''One pass of the sender loop, returns the last flush time'''
+        try:
+            self._add(self.queue.get(timeout=0.5))
+        except Queue.Empty:
+            pass
+
+        now = time.time()
+        if self._pending_count >= self.batch_size or \
+                (self._pending and now - last_flush >= self.flush_interval):
+            self._flush()
+            return now
+        elif self._spooled and now >= self._retry_at and \
+                not self._pending:
+            self._send_spool()
+        return last_flush
+
+    def _add(self, item):
+        (queued, path, params, data) = item
+        key = (path, params.get('user'), params.get('repo'))
+        if key not in self._pending:
+            self._pending[key] = {
+                'path': path,
+                'params': params,
+                'queued': queued,
+                'data': {}
+            }
+        batch = self._pending[key]
+        for k,v in data.items():
+            if k not in batch['data']:
+                self._pending_count += 1
+            batch['data'][k] = v
+
+    def _flush(self):
+        batches = self._pending.values()
+        self._pending = {}
+        self._pending_count = 0
+        for batch in batches:
+            # anything spooled goes out first so older data never
+            # overwrites newer data on the receiver
+            if self._spooled or time.time() < self._retry_at or \
+                    not self._deliver(batch):
+                self._spool(batch)
+        if self._spooled and time.time() >= self._retry_at:
+            self._send_spool()
+        if batches:
+            metrics = self.get_metrics()
+            logging.info(
+                'RECEIVER: %s sent in %s batches, %s queued, %s spooled, '
+                'latency %ss' % (
+                    metrics['sent'],
+                    metrics['batches'],
+                    metrics['queue_depth'],
+                    metrics['spool_depth'],
+                    metrics['latency_last']
+                )
+            )
+
+    def _deliver(self, batch):
+        '''Post a batch, adjusting backoff on the outcome'''
+        start = time.time()
+        try:
+            self._send(batch['path'], batch['params'], batch['data'])
         except Exception as e:
-            logging.warning(e)
+            logging.warning('RECEIVER: %s' % e)
+            with self._lock:
+                self.metrics['failures'] += 1
+            if self._backoff:
+                self._backoff = min(self._backoff * 2, self.max_backoff)
+            else:
+                self._backoff = 1
+            self._retry_at = time.time() + self._backoff
+            return False
+
+        done = time.time()
+        latency = round(done - batch['queued'], 3)
+        with self._lock:
+            self.metrics['sent'] += len(batch['data'])
+            self.metrics['batches'] += 1
+            self.metrics['send_seconds'] += done - start
+            self.metrics['latency_last'] = latency
+            self.metrics['latency_max'] = \
+                max(self.metrics['latency_max'], latency)
+        self._backoff = 0
+        self._retry_at = 0
+        return True
 
-    if rr is not None:
-        for k,v in rr.json().items():
-            logging.info('RECEIVER: %s %s' % (v, k))
+    def _send(self, path, params, data):
+        url = self.baseurl + '/' + path
+        logging.debug('RECEIVER: POST %s records to %s' % (len(data), url))
+        rr = requests.post(url, params=params, json=data, timeout=POST_TIMEOUT)
+        rr.raise_for_status()
+
+    def _get_spool_files(self):
+        return sorted(
+            x for x in os.listdir(self.spooldir) if x.endswith('.json')
+        )
+
+    def _spool(self, batch):
+        self._spool_seq += 1
+        sfile = os.path.join(
+            self.spooldir,
+            '%.6f-%s-%s.json' % (time.time(), os.getpid(), self._spool_seq)
+        )
+        # a partial file is never picked up
+        write_atomic(sfile, json.dumps(batch))
+        self._spooled = True
+        with self._lock:
+            self.metrics['spooled'] += len(batch['data'])
+
+    def _send_spool(self):
+        for sf in self._get_spool_files():
+            sfile = os.path.join(self.spooldir, sf)
+            try:
+                with open(sfile, 'rb') as f:
+                    batch = json.loads(f.read())
+            except (IOError, OSError):
+                # resent by someone else meanwhile
+                continue
+            except ValueError as e:
+                logging.error('RECEIVER: dropping %s: %s' % (sfile, e))
+                self._remove(sfile)
+                continue
+            if not self._deliver(batch):
+                return
+            self._remove(sfile)
+        self._spooled = False
+
+    def _remove(self, sfile):
+        try:
+            os.remove(sfile)
+        except OSError as e:
+            logging.warning('RECEIVER: %s' % e)
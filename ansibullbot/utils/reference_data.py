@@ -0,0 +1,110 @@
+#!/usr/bin/env python
+
+# reference_data.py
+#
+#   ReferenceData - repo and org level sets with a time to live
+#
+#   Assignable users, labels, org members and the core team change a
+#   few times a week but are checked for every issue. Each set is kept
+#   as a frozenset, in memory and in the cache store so restarts and
+#   other shard workers reuse it. After ttl seconds the next access
+#   fetches it again, through the conditional requests every unchanged
+#   page comes back as a free 304. A failed refresh keeps serving the
+#   old set and tries again later.
+#
+#   Usage:
+#       rd = get_reference_data(cachedir)
+#       assignees = rd.get(
+#           'ansible/ansible', 'assignees',
+#           lambda: [x.login for x in repo.get_assignees()]
+#       )
+#       if login in assignees:
+#           ...
+
+import logging
+import threading
+import time
+
+from ansibullbot.utils.cache_store import get_cache_store
+
+
+DEFAULT_TTL = 3600
+
+# seconds before retrying a refresh that failed
+RETRY_INTERVAL = 300
+
+# one instance per cache store, shared by the wrappers and the triager
+INSTANCES = {}
+INSTANCES_LOCK = threading.Lock()
+
+
+def get_reference_data(cachedir, ttl=DEFAULT_TTL):
+    store = get_cache_store(cachedir)
+    with INSTANCES_LOCK:
+        if store.dbfile not in INSTANCES:
+            INSTANCES[store.dbfile] = ReferenceData(store, ttl=ttl)
+    return INSTANCES[store.dbfile]
+
+
+class ReferenceData(object):
+    '''(owner, name) -> frozenset, refreshed after the ttl'''
+
+    def __init__(self, store, ttl=DEFAULT_TTL):
+        self.store = store
+        self.ttl = ttl
+        # (owner, name) -> (fetched, frozenset)
+        self._entries = {}
+        self._lock = threading.RLock()
+
+    def _load(self, owner, name):
+        '''The stored (fetched, frozenset) or None'''
+        (updated_at, data) = self.store.get(owner, 0, 'reference:' + name)
+        if not data:
+            return None
+        return (data['fetched'], frozenset(data['values']))
+
+    def _save(self, owner, name, fetched, values):
+        self.store.put(
+            owner,
+            0,
+            'reference:' + name,
+            {'fetched': fetched, 'values': sorted(values)}
+        )
+
+    def get(self, owner, name, fetch):
+        '''The set for (owner, name), fetch() returns its members'''
+        key = (owner, name)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = self._load(owner, name)
+            if entry and now - entry[0] < self.ttl:
+                self._entries[key] = entry
+                return entry[1]
+
+            try:
+                values = frozenset(fetch())
+            except Exception as e:
+                if entry is None:
+                    raise
+                logging.error(
+                    'refreshing %s %s failed, keeping the old set: %s'
+                    % (owner, name, e)
+                )
+                # try again after the retry interval
+                fetched = now - self.ttl + min(RETRY_INTERVAL, self.ttl)
+                self._entries[key] = (fetched, entry[1])
+                return entry[1]
+
+            # hand out the same object while nothing changed
+            if entry and entry[1] == values:
+                values = entry[1]
+            else:
+                logging.info(
+                    'reference data %s %s: %s entries'
+                    % (owner, name, len(values))
+                )
+            self._save(owner, name, now, values)
+            self._entries[key] = (now, values)
+            return values
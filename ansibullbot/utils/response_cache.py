@@ -0,0 +1,166 @@
+#!/usr/bin/env python
+
+# A size bounded url -> json response cache kept in a single sqlite file.
+#
+#   * entries are addressed by the sha1 of the url
+#   * each entry remembers when it was fetched and last read, callers
+#     decide freshness by passing a ttl
+#   * pinned entries are never considered stale and are evicted last
+#   * entries fetched before a caller's newer_than count as missing
+#   * when the total size passes maxsize the least recently read
+#     entries are dropped, unpinned ones before pinned ones
+
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import zlib
+
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    url TEXT,
+    status INTEGER,
+    data BLOB,
+    size INTEGER,
+    fetched REAL,
+    accessed REAL,
+    pinned INTEGER DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS responses_lru ON responses (pinned, accessed);
+'''
+
+
+class ResponseCache(object):
+    '''Persistent url response cache with ttl, pinning and lru eviction'''
+
+    def __init__(self, dbfile, maxsize=None):
+        self.dbfile = dbfile
+        self.maxsize = maxsize
+
+        dbdir = os.path.dirname(self.dbfile)
+        if dbdir and not os.path.isdir(dbdir):
+            os.makedirs(dbdir)
+
+        # the shippable api fetches job reports from a thread pool
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            self.dbfile,
+            timeout=60,
+            check_same_thread=False
+        )
+        self._conn.text_factory = str
+        self._conn.executescript(SCHEMA)
+        self._conn.commit()
+
+        cur = self._conn.execute('SELECT SUM(size) FROM responses')
+        self._size = cur.fetchone()[0] or 0
+
+    @staticmethod
+    def get_key(url):
+        return hashlib.sha1(url.encode('utf-8')).hexdigest()
+
+    def get(self, url, ttl=None, newer_than=None):
+        '''Return (status, data, fresh) for a url or None if not cached'''
+        key = self.get_key(url)
+        with self._lock:
+            cur = self._conn.execute(
+                'SELECT status, data, fetched, pinned FROM responses '
+                'WHERE key=?',
+                (key,)
+            )
+            row = cur.fetchone()
+            if row is None:
+                return None
+            if newer_than is not None and row[2] < newer_than:
+                return None
+            now = time.time()
+            self._conn.execute(
+                'UPDATE responses SET accessed=? WHERE key=?',
+                (now, key)
+            )
+            self._conn.commit()
+
+        (status, data, fetched, pinned) = row
+        try:
+            data = json.loads(zlib.decompress(data))
+        except (ValueError, zlib.error) as e:
+            logging.error('response cache: unreadable entry for %s' % url)
+            logging.error(e)
+            return None
+
+        if pinned or ttl is None:
+            fresh = True
+        else:
+            fresh = (now - fetched) < ttl
+
+        return (status, data, fresh)
+
+    def set(self, url, status, data, pin=False):
+        '''Store the response for a url'''
+        key = self.get_key(url)
+        blob = zlib.compress(json.dumps(data))
+        now = time.time()
+        with self._lock:
+            cur = self._conn.execute(
+                'SELECT size, pinned FROM responses WHERE key=?',
+                (key,)
+            )
+            row = cur.fetchone()
+            if row:
+                self._size -= row[0]
+                pin = pin or bool(row[1])
+            self._conn.execute(
+                'INSERT OR REPLACE INTO responses '
+                '(key, url, status, data, size, fetched, accessed, pinned) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                (key, url, status, sqlite3.Binary(blob), len(blob),
+                 now, now, int(pin))
+            )
+            self._conn.commit()
+            self._size += len(blob)
+
+        if self.maxsize and self._size > self.maxsize:
+            self.evict()
+
+    def pin(self, urls):
+        '''Never consider these urls stale'''
+        keys = [(self.get_key(x),) for x in urls]
+        with self._lock:
+            self._conn.executemany(
+                'UPDATE responses SET pinned=1 WHERE key=?',
+                keys
+            )
+            self._conn.commit()
+
+    def evict(self):
+        '''Drop least recently used entries until under maxsize
+
+        Pinned entries go only when the unpinned ones were not enough,
+        they just get fetched again the next time.
+        '''
+        if not self.maxsize:
+            return
+        with self._lock:
+            cur = self._conn.execute(
+                'SELECT key, size FROM responses ORDER BY pinned, accessed'
+            )
+            # leave some headroom so eviction doesn't run on every write
+            target = int(self.maxsize * 0.9)
+            delete = []
+            for (key, size) in cur:
+                if self._size <= target:
+                    break
+                delete.append((key,))
+                self._size -= size
+            if delete:
+                logging.info('response cache: evicting %s entries' % len(delete))
+                self._conn.executemany(
+                    'DELETE FROM responses WHERE key=?',
+                    delete
+                )
+                self._conn.commit()
@@ -0,0 +1,203 @@
+#!/usr/bin/env python
+
+# scheduler.py
+#
+#   PriorityScheduler - the order the daemon triages a repo's issues in
+#
+#   Every number collected for a loop is put in a class and scored:
+#
+#     command  a new comment carries a bot command (from the webhooks)
+#     ci       a shippable run finished after the issue was last triaged
+#     updated  anything else that changed since the last loop
+#     stale    not triaged for longer than the stale window
+#
+#   The score adds the weight of the command and ci signals, the
+#   recency of the last update and the age of stale issues, so a fresh
+#   comment isn't stuck behind hundreds of old stale issues. Each class
+#   has a budget per loop, numbers over budget are deferred to the next
+#   loop instead of being dropped.
+#
+#   Time to triage (from the update, ci completion or going stale until
+#   the triage finished) is kept per class in a LatencyHistogram so the
+#   weights and budgets can be tuned.
+#
+#   Usage:
+#       ps = PriorityScheduler(budgets={'stale': 100})
+#       ps.add(1, updated_at=ts, last_triaged=meta_ts, stale=True)
+#       for number in ps.get_numbers():
+#           ...
+#           ps.record_triaged(number)
+
+import bisect
+import datetime
+import heapq
+
+
+CLASSES = ['command', 'ci', 'updated', 'stale']
+
+DEFAULT_WEIGHTS = {
+    'command': 4.0,
+    'ci': 2.0,
+    'recency': 1.0,
+    'stale': 0.5,
+}
+
+# upper bounds in seconds, the last bucket takes everything above
+LATENCY_BUCKETS = [
+    60, 5 * 60, 15 * 60, 30 * 60, 60 * 60, 4 * 3600, 12 * 3600, 24 * 3600,
+    7 * 24 * 3600
+]
+
+
+def parse_class_values(values, cast=float):
+    '''['stale:100', 'ci:0'] (from a config list) -> {'stale': 100, ...}'''
+    parsed = {}
+    for value in values or []:
+        if ':' not in value:
+            continue
+        (key, val) = value.split(':', 1)
+        parsed[key.strip()] = cast(val.strip())
+    return parsed
+
+
+class LatencyHistogram(object):
+    '''Bucketed counts of seconds'''
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, seconds):
+        seconds = max(seconds, 0)
+        self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+
+    def percentile(self, pct):
+        '''Upper bound of the bucket holding the pct percentile'''
+        if not self.count:
+            return None
+        rank = self.count * pct / 100.0
+        seen = 0
+        for idx,count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                if idx < len(self.buckets):
+                    return self.buckets[idx]
+                return float('inf')
+
+    def get_stats(self):
+        return {
+            'count': self.count,
+            'mean': round(self.total / self.count, 1) if self.count else None,
+            'p50': self.percentile(50),
+            'p90': self.percentile(90),
+            'buckets': dict(
+                zip([str(x) for x in self.buckets] + ['inf'], self.counts)
+            ),
+        }
+
+
+class PriorityScheduler(object):
+    '''Scores and orders one loop's numbers within per class budgets'''
+
+    def __init__(self, budgets=None, weights=None, stale_window=7,
+                 histograms=None, now=None):
+        # a budget of 0 or None means no limit
+        self.budgets = budgets or {}
+        self.weights = DEFAULT_WEIGHTS.copy()
+        self.weights.update(weights or {})
+        self.stale_window = stale_window
+        # shared across loops by the caller
+        self.histograms = histograms if histograms is not None else {}
+        self.now = now or datetime.datetime.utcnow()
+        self.entries = {}
+        self.deferred = []
+
+    def classify(self, command=False, ci_completed=None, last_triaged=None,
+                 stale=False):
+        if command:
+            return 'command'
+        if ci_completed and (not last_triaged or ci_completed > last_triaged):
+            return 'ci'
+        if stale:
+            return 'stale'
+        return 'updated'
+
+    def add(self, number, updated_at=None, ci_completed=None,
+            last_triaged=None, command=False, stale=False):
+        '''Queue a number, all timestamps are naive utc datetimes'''
+        klass = self.classify(
+            command=command,
+            ci_completed=ci_completed,
+            last_triaged=last_triaged,
+            stale=stale
+        )
+
+        score = 0.0
+        if command:
+            score += self.weights['command']
+        if klass == 'ci':
+            score += self.weights['ci']
+        if updated_at:
+            hours = (self.now - updated_at).total_seconds() / 3600.0
+            score += self.weights['recency'] / (1.0 + max(hours, 0))
+        if stale and last_triaged:
+            days = (self.now - last_triaged).days - self.stale_window
+            score += self.weights['stale'] * max(days, 0) / self.stale_window
+
+        # when the reason to triage appeared, for the latency histograms
+        if klass == 'ci':
+            since = ci_completed
+        elif klass == 'stale' and last_triaged:
+            since = last_triaged + datetime.timedelta(days=self.stale_window)
+        else:
+            since = updated_at
+
+        self.entries[int(number)] = {
+            'class': klass,
+            'score': score,
+            'since': since,
+        }
+
+    def get_numbers(self):
+        '''The numbers to triage this loop, best first, within budget'''
+        heap = [
+            (-x[1]['score'], -x[0], x[0]) for x in self.entries.items()
+        ]
+        heapq.heapify(heap)
+
+        used = dict((x, 0) for x in CLASSES)
+        numbers = []
+        self.deferred = []
+        while heap:
+            number = heapq.heappop(heap)[2]
+            klass = self.entries[number]['class']
+            budget = self.budgets.get(klass)
+            if budget and used[klass] >= budget:
+                self.deferred.append(number)
+                continue
+            used[klass] += 1
+            numbers.append(number)
+        return numbers
+
+    def get_class(self, number):
+        entry = self.entries.get(int(number))
+        if entry:
+            return entry['class']
+        return None
+
+    def record_triaged(self, number, finished=None):
+        '''Add the number's time to triage to its class histogram'''
+        entry = self.entries.get(int(number))
+        if not entry or not entry['since']:
+            return None
+        finished = finished or datetime.datetime.utcnow()
+        seconds = (finished - entry['since']).total_seconds()
+        klass = entry['class']
+        if klass not in self.histograms:
+            self.histograms[klass] = LatencyHistogram()
+        self.histograms[klass].observe(seconds)
+        return seconds
@@ -0,0 +1,242 @@
+#!/usr/bin/env python
+
+# sharding.py
+#
+#   ShardWorker - split triage between several worker processes
+#
+#   Every worker heartbeats into a shared lease store. The live workers
+#   form a HashRing of (repo, number) keys and each worker only collects
+#   the issues the ring hands it, so a worker joining or dying moves
+#   about 1/N of the issues. Two workers can briefly disagree about the
+#   ring while one of them joins or drops out, so each issue is also
+#   leased for its triage and the lease is renewed right before the
+#   actions are applied. A worker that lost its lease (it took longer
+#   than lease_ttl and another worker took over) applies nothing, so
+#   two workers never write to the same issue.
+#
+#   The sqlite backend covers workers on one host. Other backends
+#   provide the acquire, renew, release and holders methods of
+#   SQLiteLeaseStore and are loaded with a 'package.module:Class' url,
+#   clocks of the hosts sharing a store need to be in sync.
+#
+#   Usage:
+#       store = get_lease_store('sqlite:///~/.ansibullbot/cache/leases.sqlite')
+#       shard = ShardWorker('host1-0', store)
+#       shard.start()
+#       numbers = [x for x in numbers if shard.owns(repo, x)]
+#       if shard.acquire(repo, number):
+#           ...
+#           if shard.renew(repo, number):
+#               apply the actions
+#           shard.release(repo, number)
+
+import bisect
+import hashlib
+import importlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+
+WORKER_PREFIX = 'worker:'
+ISSUE_PREFIX = 'issue:'
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS leases (
+    key TEXT PRIMARY KEY,
+    owner TEXT NOT NULL,
+    expires REAL NOT NULL
+);
+'''
+
+
+def get_shard_key(repo, number):
+    return '%s#%s' % (repo, int(number))
+
+
+def get_hash(key):
+    return int(hashlib.md5(key).hexdigest()[:16], 16)
+
+
+class HashRing(object):
+    '''Consistent hashing of keys onto nodes'''
+
+    def __init__(self, nodes, replicas=64):
+        self.nodes = sorted(set(nodes))
+        self.ring = sorted(
+            (get_hash('%s-%s' % (node, idx)), node)
+            for node in self.nodes
+            for idx in range(replicas)
+        )
+        self.hashes = [x[0] for x in self.ring]
+
+    def get_node(self, key):
+        if not self.ring:
+            return None
+        idx = bisect.bisect(self.hashes, get_hash(key)) % len(self.ring)
+        return self.ring[idx][1]
+
+
+class SQLiteLeaseStore(object):
+    '''Leases in a sqlite file the workers on a host share'''
+
+    def __init__(self, dbfile):
+        self.dbfile = os.path.expanduser(dbfile)
+        dbdir = os.path.dirname(self.dbfile)
+        if dbdir and not os.path.isdir(dbdir):
+            os.makedirs(dbdir)
+
+        self._lock = threading.Lock()
+        # autocommit, acquire() opens its own transaction
+        self._conn = sqlite3.connect(
+            self.dbfile,
+            timeout=60,
+            isolation_level=None,
+            check_same_thread=False
+        )
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.executescript(SCHEMA)
+
+    def acquire(self, key, owner, ttl):
+        '''Take or extend a free, expired or already owned key'''
+        now = time.time()
+        with self._lock:
+            # BEGIN IMMEDIATE so two workers can't both see a free key
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                row = self._conn.execute(
+                    'SELECT owner, expires FROM leases WHERE key=?',
+                    (key,)
+                ).fetchone()
+                if row and row[0] != owner and row[1] > now:
+                    return False
+                self._conn.execute(
+                    'INSERT OR REPLACE INTO leases (key, owner, expires) '
+                    'VALUES (?, ?, ?)',
+                    (key, owner, now + ttl)
+                )
+            finally:
+                self._conn.execute('COMMIT')
+        return True
+
+    def renew(self, key, owner, ttl):
+        '''Extend a key only if nobody else took it'''
+        with self._lock:
+            cursor = self._conn.execute(
+                'UPDATE leases SET expires=? WHERE key=? AND owner=?',
+                (time.time() + ttl, key, owner)
+            )
+        return cursor.rowcount == 1
+
+    def release(self, key, owner):
+        with self._lock:
+            self._conn.execute(
+                'DELETE FROM leases WHERE key=? AND owner=?',
+                (key, owner)
+            )
+
+    def holders(self, prefix=''):
+        '''{key: owner} of the unexpired keys starting with prefix'''
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT key, owner FROM leases '
+                'WHERE key LIKE ? AND expires > ?',
+                (prefix + '%', time.time())
+            ).fetchall()
+        return dict(rows)
+
+
+LEASE_BACKENDS = {
+    'sqlite': SQLiteLeaseStore,
+}
+
+
+def get_lease_store(url):
+    '''sqlite:///path/to/file or package.module:Class[:argument]'''
+    if '://' in url:
+        (scheme, location) = url.split('://', 1)
+        if scheme not in LEASE_BACKENDS:
+            raise Exception('unknown lease store %s' % scheme)
+        # sqlite:///~/file is relative to the home directory
+        if location.startswith('/~'):
+            location = location[1:]
+        return LEASE_BACKENDS[scheme](location)
+
+    parts = url.split(':', 2)
+    klass = getattr(importlib.import_module(parts[0]), parts[1])
+    if len(parts) > 2:
+        return klass(parts[2])
+    return klass()
+
+
+class ShardWorker(object):
+    '''One worker's view of the ring and its issue leases'''
+
+    def __init__(self, worker_id, store, lease_ttl=900, heartbeat_ttl=120):
+        self.worker_id = worker_id
+        self.store = store
+        self.lease_ttl = lease_ttl
+        self.heartbeat_ttl = heartbeat_ttl
+        self.ring = None
+        self._thread = None
+        self._stop = threading.Event()
+
+    def heartbeat(self):
+        '''Stay registered and rebuild the ring from the live workers'''
+        self.store.acquire(
+            WORKER_PREFIX + self.worker_id,
+            self.worker_id,
+            self.heartbeat_ttl
+        )
+        workers = self.store.holders(WORKER_PREFIX).values()
+        if not self.ring or sorted(set(workers)) != self.ring.nodes:
+            logging.info('shard workers: %s' % ', '.join(sorted(workers)))
+        self.ring = HashRing(workers)
+        return workers
+
+    def _heartbeat_loop(self):
+        while not self._stop.wait(self.heartbeat_ttl / 3.0):
+            try:
+                self.heartbeat()
+            except Exception as e:
+                logging.error('shard heartbeat failed: %s' % e)
+
+    def start(self):
+        '''Heartbeat in the background, also through long sleeps'''
+        self.heartbeat()
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._heartbeat_loop)
+            self._thread.daemon = True
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self.store.release(WORKER_PREFIX + self.worker_id, self.worker_id)
+
+    def owns(self, repo, number):
+        if self.ring is None:
+            self.heartbeat()
+        node = self.ring.get_node(get_shard_key(repo, number))
+        return node == self.worker_id
+
+    def acquire(self, repo, number):
+        return self.store.acquire(
+            ISSUE_PREFIX + get_shard_key(repo, number),
+            self.worker_id,
+            self.lease_ttl
+        )
+
+    def renew(self, repo, number):
+        return self.store.renew(
+            ISSUE_PREFIX + get_shard_key(repo, number),
+            self.worker_id,
+            self.lease_ttl
+        )
+
+    def release(self, repo, number):
+        self.store.release(
+            ISSUE_PREFIX + get_shard_key(repo, number),
+            self.worker_id
+        )
@@ -3,6 +3,8 @@
 # curl -H "Content-Type: application/json" -H "Authorization: apiToken XXXX"
 # https://api.shippable.com/projects/573f79d02a8192902e20e34b | jq .
 
+import bisect
+import calendar
 import datetime
 import json
 import logging
@@ -12,7 +14,11 @@ import requests
 import requests_cache
 import time
 
+from collections import OrderedDict
+from multiprocessing.pool import ThreadPool
+
 import ansibullbot.constants as C
+from ansibullbot.utils.response_cache import ResponseCache
 
 ANSIBLE_PROJECT_ID = '573f79d02a8192902e20e34b'
 SHIPPABLE_URL = 'https://api.shippable.com'
@@ -21,6 +27,34 @@ ANSIBLE_RUNS_URL = '%s/runs?projectIds=%s&isPullRequest=True' % (
     ANSIBLE_PROJECT_ID
 )
 
+# max concurrent jobTestReports fetches per run
+JOB_FETCH_WORKERS = 8
+
+# run statusCodes after which the run data no longer changes
+TERMINAL_STATUS_CODES = [30, 80]
+
+# finished runs whose test results are kept in memory, the response
+# cache has the rest
+TEST_RESULTS_CACHE_SIZE = 50
+
+
+def parse_timestamp(ts):
+    '''Fast parser for shippable's 2017-02-07T00:27:06.482Z timestamps'''
+    try:
+        return datetime.datetime(
+            int(ts[0:4]), int(ts[5:7]), int(ts[8:10]),
+            int(ts[11:13]), int(ts[14:16]), int(ts[17:19]),
+            int(ts[20:-1].ljust(6, '0')[:6])
+        )
+    except ValueError:
+        return datetime.datetime.strptime(ts, '%Y-%m-%dT%H:%M:%S.%fZ')
+
+
+def get_epoch(ts):
+    '''Seconds since the epoch for a shippable timestamp'''
+    dt = parse_timestamp(ts)
+    return calendar.timegm(dt.utctimetuple()) + dt.microsecond / 1e6
+
 
 def has_commentable_data(test_results):
     # https://github.com/ansible/ansibullbot/issues/421
@@ -57,6 +91,20 @@ class ShippableRuns(object):
         self.project_name = 'ansible'
         self.run_meta = []
 
+        # lookup indexes built by _process_raw_data
+        self.runs = []
+        self._raw_runs = {}
+        self._pr_runs = {}
+        self._pr_last_completion = {}
+        self._updated_times = []
+        self._updated_numbers = []
+
+        # get_test_results for runs that reached a terminal state, lru
+        self._test_results = OrderedDict()
+        self._pool = None
+
+        self._response_cache = None
+
     def update(self):
         '''Fetch the latest data then send for processing'''
         success = False
@@ -72,74 +120,118 @@ class ShippableRuns(object):
 
     def _process_raw_data(self):
         '''Iterate through and fix data'''
-        self.runs = [x for x in self._rawdata]
-        for idx,x in enumerate(self.runs):
-            for k,v in x.iteritems():
+
+        # most runs in the listing are unchanged since the last update, so
+        # only convert the ones that are new or differ from the previous
+        # listing and reuse the already converted copies of the rest
+        runs = []
+        raw_runs = {}
+        for x in self._rawdata:
+            rid = x.get('id')
+            if rid in self._raw_runs and self._raw_runs[rid][0] == x:
+                raw_runs[rid] = self._raw_runs[rid]
+                runs.append(raw_runs[rid][1])
+                continue
+
+            run = x.copy()
+            for k,v in run.iteritems():
                 if k.endswith('At'):
                     # 2017-02-07T00:27:06.482Z
                     if v:
-                        ds = datetime.datetime.strptime(
-                            v,
-                            '%Y-%m-%dT%H:%M:%S.%fZ'
-                        )
-                        self.runs[idx][k] = ds
+                        run[k] = parse_timestamp(v)
+            raw_runs[rid] = (x, run)
+            runs.append(run)
+
+        self.runs = runs
+        self._raw_runs = raw_runs
+        self._build_indexes()
+
+    def _build_indexes(self):
+        '''Index the runs by PR number and by last update time'''
+
+        # the triager asks for runs of each PR it visits, so a linear
+        # scan of the full runs list per lookup adds up quickly
+        self._pr_runs = {}
+        self._pr_last_completion = {}
+        updated = []
+
+        for x in self.runs:
+            # https://github.com/ansible/ansible/pull/1234
+            number = x['commitUrl'].rsplit('/', 1)[-1]
+            if number not in self._pr_runs:
+                self._pr_runs[number] = []
+            self._pr_runs[number].append(x)
+
+            if x['endedAt']:
+                last = self._pr_last_completion.get(number)
+                if last is None or x['endedAt'] > last:
+                    self._pr_last_completion[number] = x['endedAt']
+
+            if 'pullRequestNumber' not in x:
+                continue
+            ts = [x.get(k) for k in ['createdAt', 'startedAt', 'endedAt']]
+            ts = [t for t in ts if t]
+            if ts:
+                updated.append((max(ts), x['pullRequestNumber']))
+
+        updated.sort(key=lambda x: x[0])
+        self._updated_times = [x[0] for x in updated]
+        self._updated_numbers = [x[1] for x in updated]
 
     def get_pullrequest_runs(self, number):
         '''All runs for the given PR number'''
-        nruns = []
-        for x in self.runs:
-            if x['commitUrl'].endswith('/' + str(number)):
-                nruns.append(x)
-        return nruns
+        return self._pr_runs.get(str(number), [])[:]
 
     def get_last_completion(self, number):
         '''Timestamp of last job completion for given PR number'''
-        nruns = self.get_pullrequest_runs(number)
-        if not nruns:
-            return None
-        ts = sorted([x['endedAt'] for x in nruns if x['endedAt']])
-        if ts:
-            return ts[-1]
-        else:
-            return None
+        return self._pr_last_completion.get(str(number))
 
     def get_updated_since(self, since):
-        updated = []
-        for x in self.runs:
-            try:
-                if x['createdAt'] > since or \
-                        x['startedAt'] > since or \
-                        x['endedAt'] > since:
-                    updated.append(x['pullRequestNumber'])
-            except Exception:
-                pass
-        updated = sorted(set(updated))
+        '''PR numbers with any run created, started or ended after since'''
+        idx = bisect.bisect_right(self._updated_times, since)
+        updated = sorted(set(self._updated_numbers[idx:]))
         return updated
 
-    def _get_url(self, url, usecache=False):
-        cdir = os.path.join(self.cachedir, '.raw')
-        if not os.path.isdir(cdir):
-            os.makedirs(cdir)
-        cfile = url.replace('https://api.shippable.com/', '')
-        cfile = cfile.replace('/', '_')
-        cfile = os.path.join(cdir, cfile + '.json')
-
+    @property
+    def response_cache(self):
+        if self._response_cache is None:
+            self._response_cache = ResponseCache(
+                os.path.join(self.cachedir, 'responses.sqlite'),
+                maxsize=C.DEFAULT_SHIPPABLE_CACHE_SIZE
+            )
+        return self._response_cache
+
+    def _get_url_ttl(self, url):
+        '''How long a cached response for this url stays fresh'''
+        path = url.replace(SHIPPABLE_URL + '/', '')
+        if path.startswith('jobs/') and path.endswith('/jobTestReports'):
+            return C.DEFAULT_SHIPPABLE_TTL_REPORTS
+        elif path.startswith('jobs'):
+            return C.DEFAULT_SHIPPABLE_TTL_JOBS
+        elif path.startswith('runs/') or 'runNumbers=' in path:
+            return C.DEFAULT_SHIPPABLE_TTL_RUN
+        return C.DEFAULT_SHIPPABLE_TTL_RUNS
+
+    def _get_url(self, url, usecache=False, newer_than=None):
+
+        # usecache=True takes whatever is cached, otherwise the entry
+        # has to be within the ttl for its endpoint (or pinned). Entries
+        # fetched before newer_than are never used.
         rc = None
         jdata = None
-        if os.path.isfile(cfile):
-            try:
-                with open(cfile, 'rb') as f:
-                    fdata = json.load(f)
-                rc = fdata[0]
-                jdata = fdata[1]
-            except ValueError:
-                pass
-
+        fresh = False
+        cached = self.response_cache.get(
+            url,
+            ttl=self._get_url_ttl(url),
+            newer_than=newer_than
+        )
+        if cached:
+            (rc, jdata, fresh) = cached
             if rc == 400:
                 return None
 
         resp = None
-        if not os.path.isfile(cfile) or not jdata or not usecache:
+        if not jdata or not (usecache or fresh):
 
             resp = self.fetch(url)
             if not resp:
@@ -147,11 +239,9 @@ class ShippableRuns(object):
 
             if resp.status_code != 400:
                 jdata = resp.json()
-                with open(cfile, 'wb') as f:
-                    json.dump([resp.status_code, jdata], f)
+                self.response_cache.set(url, resp.status_code, jdata)
             else:
-                with open(cfile, 'wb') as f:
-                    json.dump([resp.status_code, {}], f)
+                self.response_cache.set(url, resp.status_code, {})
                 return None
 
         self.check_response(resp)
@@ -165,13 +255,10 @@ class ShippableRuns(object):
 
         return jdata
 
-    def get_run_data(self, run_id, usecache=False):
-
+    def _get_run_url(self, run_id):
         if len(run_id) == 24:
             # https://api.shippable.com/runs/58caf30337380a0800e31219
             run_url = 'https://api.shippable.com/runs/' + run_id
-            logging.info('shippable: %s' % run_url)
-            run_data = self._get_url(run_url, usecache=usecache)
         else:
             # https://github.com/ansible/ansibullbot/issues/513
             run_url = 'https://api.shippable.com/runs'
@@ -183,11 +270,15 @@ class ShippableRuns(object):
             run_url += 'projectNames=%s' % self.project_name
             run_url += '&'
             run_url += 'runNumbers=%s' % run_id
+        return run_url
+
+    def get_run_data(self, run_id, usecache=False):
 
-            logging.info('shippable: %s' % run_url)
-            run_data = self._get_url(run_url, usecache=usecache)
-            if run_data:
-                run_data = run_data[0]
+        run_url = self._get_run_url(run_id)
+        logging.info('shippable: %s' % run_url)
+        run_data = self._get_url(run_url, usecache=usecache)
+        if run_data and len(run_id) != 24:
+            run_data = run_data[0]
 
         return run_data
 
@@ -215,6 +306,22 @@ class ShippableRuns(object):
 
         return None
 
+    def _get_urls(self, urls, usecache=False, newer_than=None):
+        '''Fetch a list of urls concurrently, preserving order'''
+        if len(urls) < 2:
+            return [
+                self._get_url(x, usecache=usecache, newer_than=newer_than)
+                for x in urls
+            ]
+        if self._pool is None:
+            self._pool = ThreadPool(JOB_FETCH_WORKERS)
+        return self._pool.map(
+            lambda x: self._get_url(
+                x, usecache=usecache, newer_than=newer_than
+            ),
+            urls
+        )
+
     def get_test_results(self, run_id, usecache=False, filter_paths=[]):
 
         '''Fetch and munge the test results into proper json'''
@@ -225,6 +332,17 @@ class ShippableRuns(object):
         #   30: success
         #   20: processing
 
+        # finished runs never change, so the results of the recent ones
+        # are kept and the api is not hit again
+        ckey = (run_id, tuple(filter_paths))
+        if ckey in self._test_results:
+            (run_data, commitSha, results, ci_verified) = \
+                self._test_results.pop(ckey)
+            self._test_results[ckey] = \
+                (run_data, commitSha, results, ci_verified)
+            return (run_data, commitSha, results[:], ci_verified)
+        run_url = self._get_run_url(run_id)
+
         if filter_paths:
             fps = [re.compile(x) for x in filter_paths]
 
@@ -246,9 +364,24 @@ class ShippableRuns(object):
         # need this for ci_verified association
         commitSha = run_data['commitSha']
 
+        # the jobs and reports of a finished run are only final when
+        # they were fetched after it ended, older cache entries may
+        # still be from while it was running
+        ended = None
+        if run_data['statusCode'] in TERMINAL_STATUS_CODES \
+                and run_data.get('endedAt'):
+            ended = get_epoch(run_data['endedAt'])
+
         results = []
         url = 'https://api.shippable.com/jobs?runIds=%s' % run_id
-        rdata = self._get_url(url, usecache=usecache)
+        rdata = self._get_url(url, usecache=usecache, newer_than=ended)
+
+        # fetch all of the job reports at once instead of serially
+        jurls = [
+            'https://api.shippable.com/jobs/%s/jobTestReports' % rd.get('id')
+            for rd in rdata
+        ]
+        jdatas = self._get_urls(jurls, usecache=usecache, newer_than=ended)
 
         for rix,rd in enumerate(rdata):
 
@@ -265,8 +398,7 @@ class ShippableRuns(object):
 
             CVMAP[dkey]['statusCode'] = rd['statusCode']
 
-            jurl = 'https://api.shippable.com/jobs/%s/jobTestReports' % job_id
-            jdata = self._get_url(jurl, usecache=usecache)
+            jdata = jdatas[rix]
 
             # 400 return codes ...
             if not jdata:
@@ -274,6 +406,8 @@ class ShippableRuns(object):
 
             for jid,td in enumerate(jdata):
 
+                # only decode the contents of reports that survive the
+                # path filter
                 if filter_paths:
                     matches = [x.match(td['path']) for x in fps]
                     matches = [x for x in matches if x]
@@ -282,22 +416,22 @@ class ShippableRuns(object):
 
                 if not matches:
                     CVMAP[dkey]['files_filtered'].append(td['path'])
+                    continue
 
-                if matches:
-                    CVMAP[dkey]['files_matched'].append(td['path'])
+                CVMAP[dkey]['files_matched'].append(td['path'])
 
-                    td['run_id'] = run_id
-                    td['job_id'] = job_id
+                td['run_id'] = run_id
+                td['job_id'] = job_id
 
-                    try:
-                        td['contents'] = json.loads(td['contents'])
-                    except ValueError as e:
-                        print(e)
-                        #import epdb; epdb.st()
-                        pass
+                try:
+                    td['contents'] = json.loads(td['contents'])
+                except ValueError as e:
+                    print(e)
+                    #import epdb; epdb.st()
+                    pass
 
-                    CVMAP[dkey]['test_data'].append(td)
-                    results.append(td)
+                CVMAP[dkey]['test_data'].append(td)
+                results.append(td)
 
         ci_verified = False
         if run_data['statusCode'] == 80:
@@ -322,6 +456,14 @@ class ShippableRuns(object):
                         ci_verified = False
                         break
 
+        if ended is not None:
+            self._test_results[ckey] = \
+                (run_data, commitSha, results[:], ci_verified)
+            while len(self._test_results) > TEST_RESULTS_CACHE_SIZE:
+                self._test_results.popitem(last=False)
+            # completed runs never go stale in the response cache
+            self.response_cache.pin([run_url, url] + jurls)
+
         return (run_data, commitSha, results, ci_verified)
 
     def get_run_id(self, run_number):
@@ -1,8 +1,11 @@
 #!/usr/bin/env python
 
+import contextlib
+import fcntl
 import os
 import subprocess
 import sys
+import tempfile
 
 
 def run_command(cmd):
@@ -18,3 +21,28 @@ def fglob(directory, pattern, depth=1):
     #import epdb; epdb.st()
     return filepaths
 
+
+@contextlib.contextmanager
+def file_lock(path):
+    '''Hold an exclusive lock on path, shared by every process on the host'''
+    ldir = os.path.dirname(path)
+    if ldir and not os.path.isdir(ldir):
+        os.makedirs(ldir)
+    with open(path, 'a') as f:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+def write_atomic(path, data):
+    '''Replace path with data, concurrent readers never see half a file'''
+    tfh, tfn = tempfile.mkstemp(dir=os.path.dirname(path))
+    # mkstemp makes the file 0600, give it the mode open() would
+    umask = os.umask(0)
+    os.umask(umask)
+    os.fchmod(tfh, 0o666 & ~umask)
+    with os.fdopen(tfh, 'wb') as f:
+        f.write(data)
+    os.rename(tfn, path)
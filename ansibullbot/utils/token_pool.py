@@ -0,0 +1,198 @@
+#!/usr/bin/env python
+
+# token_pool.py
+#
+#   TokenPool - spread api reads over several github tokens
+#
+#   The bot's own credentials (the write identity) make every comment,
+#   label and merge. Read requests go to whichever credential has the
+#   most quota left, which can be the bot's as long as it stays above
+#   a reserve kept for writes. The quota of each credential is tracked
+#   from the X-RateLimit-* headers of its responses, per resource
+#   (core, graphql), so no /rate_limit calls are needed. Reads only
+#   wait when every read credential is exhausted, and then only until
+#   the first of them resets.
+#
+#   Org, team, assignee and collaborator reads stay on the bot's
+#   credentials, a token from outside the org only sees the public
+#   members and gets 404s for secret teams.
+#
+#   Usage:
+#       gh = Github(token)
+#       install_token_pool(gh, ['token1', 'token2'])
+#       ...
+#       get_token_pool().get_quota()
+#       get_token_pool().get_stats()
+
+import logging
+import re
+import threading
+import time
+
+
+# quota a credential is assumed to have before its first response
+DEFAULT_LIMIT = 5000
+
+# calls left on the bot identity that reads won't touch
+WRITE_RESERVE = 500
+
+READ_VERBS = ['GET', 'HEAD']
+
+# reads whose answer depends on who asks
+MEMBERSHIP_URLS = re.compile(
+    r'/(orgs|teams)(/|\?|$)|/(assignees|collaborators)(/|\?|$)'
+)
+
+POOL = None
+POOL_LOCK = threading.Lock()
+
+
+def get_token_pool():
+    '''The process wide pool, None until a connection is made'''
+    return POOL
+
+
+def install_token_pool(gh, read_tokens=None):
+    '''Route the reads of this Github connection through the pool'''
+    global POOL
+    requester = gh._Github__requester
+    write_auth = requester._Requester__authorizationHeader
+    read_auths = ['token %s' % x for x in read_tokens or [] if x]
+    with POOL_LOCK:
+        if POOL is None or POOL.write_auth != write_auth:
+            POOL = TokenPool(write_auth, read_auths)
+    POOL.install(requester)
+    return POOL
+
+
+class TokenPool(object):
+    '''Authorization headers and their remaining quota'''
+
+    def __init__(self, write_auth, read_auths=None, reserve=WRITE_RESERVE):
+        self.write_auth = write_auth
+        self.reserve = reserve
+        self.read_auths = []
+        for auth in [write_auth] + (read_auths or []):
+            if auth and auth not in self.read_auths:
+                self.read_auths.append(auth)
+        # (auth, resource) -> {'remaining': int, 'limit': int, 'reset': int}
+        self.quota = {}
+        self._lock = threading.Lock()
+
+    def install(self, requester):
+        if getattr(requester, '_token_pool', None) is self:
+            return
+
+        # same hook as the conditional requests, the requester looks the
+        # name mangled method up on the instance
+        original = requester._Requester__requestRaw
+
+        def request_raw(cnx, verb, url, requestHeaders, input):
+            if verb in READ_VERBS and not MEMBERSHIP_URLS.search(url):
+                auth = self.acquire_read()
+                requestHeaders = requestHeaders.copy()
+                requestHeaders['Authorization'] = auth
+            else:
+                auth = requestHeaders.get('Authorization')
+            (status, headers, output) = \
+                original(cnx, verb, url, requestHeaders, input)
+            self.update(auth, headers)
+            return (status, headers, output)
+
+        requester._Requester__requestRaw = request_raw
+        requester._token_pool = self
+
+    def _get_quota(self, auth, resource, now):
+        quota = self.quota.get((auth, resource))
+        if not quota or quota['reset'] <= now:
+            # unknown or reset since the last response
+            return {'remaining': DEFAULT_LIMIT, 'limit': DEFAULT_LIMIT,
+                    'reset': 0}
+        return quota
+
+    def _available(self, auth, quota):
+        # with no other tokens the bot reads with all of its quota
+        if auth == self.write_auth and len(self.read_auths) > 1:
+            return quota['remaining'] - self.reserve
+        return quota['remaining']
+
+    def _select(self, resource, now):
+        '''Return (auth with the most quota or None, seconds to wait)'''
+        best = None
+        best_available = 0
+        resets = []
+        for auth in self.read_auths:
+            quota = self._get_quota(auth, resource, now)
+            available = self._available(auth, quota)
+            if available > best_available:
+                best = auth
+                best_available = available
+            elif available <= 0:
+                resets.append(quota['reset'])
+        if best:
+            return (best, 0)
+        # pad like the rate limit decorator does
+        return (None, max(min(resets or [now]) - now, 0) + 5)
+
+    def get_read_auth(self, resource='core'):
+        '''Return (auth, 0) or (None, seconds until a credential resets)'''
+        now = time.time()
+        with self._lock:
+            (auth, wait) = self._select(resource, now)
+            if auth:
+                # count the call now so concurrent readers spread out
+                quota = self._get_quota(auth, resource, now)
+                self.quota[(auth, resource)] = dict(
+                    quota,
+                    remaining=quota['remaining'] - 1
+                )
+            return (auth, wait)
+
+    def acquire_read(self, resource='core'):
+        '''An authorization header for a read, waits if all are spent'''
+        while True:
+            (auth, wait) = self.get_read_auth(resource=resource)
+            if auth:
+                return auth
+            logging.warning(
+                'all %s read tokens exhausted, sleeping %ss'
+                % (len(self.read_auths), int(wait))
+            )
+            time.sleep(wait)
+
+    def update(self, auth, headers, resource=None):
+        '''Record the quota reported in a response's headers'''
+        if not auth or 'x-ratelimit-remaining' not in headers:
+            return
+        resource = headers.get('x-ratelimit-resource', resource or 'core')
+        with self._lock:
+            self.quota[(auth, resource)] = {
+                'remaining': int(headers['x-ratelimit-remaining']),
+                'limit': int(headers.get('x-ratelimit-limit', DEFAULT_LIMIT)),
+                'reset': int(headers.get('x-ratelimit-reset', 0)),
+            }
+
+    def get_quota(self, auth=None, resource='core'):
+        '''The quota a credential last reported, the bot's by default'''
+        with self._lock:
+            quota = self.quota.get((auth or self.write_auth, resource))
+            if quota and quota['reset'] > time.time():
+                return quota.copy()
+        return None
+
+    def get_reset_time(self, resource='core'):
+        '''Seconds until a read credential has quota again'''
+        with self._lock:
+            return int(self._select(resource, time.time())[1])
+
+    def get_stats(self):
+        '''Known remaining quota per read credential'''
+        stats = []
+        for idx,auth in enumerate(self.read_auths):
+            quota = self.get_quota(auth=auth)
+            stats.append({
+                'token': 'bot' if auth == self.write_auth else idx,
+                'remaining': quota['remaining'] if quota else None,
+                'reset': quota['reset'] if quota else None,
+            })
+        return stats
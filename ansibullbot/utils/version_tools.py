@@ -1,6 +1,9 @@
 #!/usr/bin/env python
 
+import bisect
 import datetime
+import hashlib
+import json
 import logging
 import os
 import re
@@ -12,6 +15,19 @@ from distutils.version import LooseVersion
 import ansibullbot.constants as C
 
 
+# version strings that all mean "devel"
+DEVEL_VERSIONS = frozenset([
+    'devel', 'master', 'head', 'latest', 'all', 'all?', 'all ?', 'any',
+    'n/a', 'na', 'not applicable', 'latest devel', 'latest devel branch',
+    'ansible devel', '', 'future', 'git version', 'ansible@devel',
+    'all recent releases'
+])
+
+# 1.x/2.x globs
+MAJOR_GLOB_RE = re.compile('^-?[1-9].x')
+MINOR_GLOB_RE = re.compile('^-?[1-9].[1-9].x')
+
+
 def list_to_version(inlist, cast_string=True, reverse=True, binary=False):
     # [1,2,3] => "3.2.1"
 
@@ -37,14 +53,25 @@ class AnsibleVersionIndexer(object):
         self.modules = {}
         self.checkoutdir = '~/.ansibullbot/cache/ansible.version.checkout'
         self.checkoutdir = os.path.expanduser(self.checkoutdir)
+        self.cachedir = os.path.dirname(self.checkoutdir)
         self.VALIDVERSIONS = None
         self.COMMITVERSIONS = None
         self.DATEVERSIONS = None
-
-        if not os.path.isdir(self.checkoutdir):
-            self.create_checkout()
-        else:
-            self.update_checkout()
+        self._commit_index = None
+        self._versions_desc = []
+        self._version_trie = {}
+        self._strip_cache = {}
+        self._date_keys = []
+        self._date_commits = []
+        self._month_commits = {}
+        self.devel_version = None
+
+        # other triage workers on this host share the checkout
+        with file_lock(self.checkoutdir + '.lock'):
+            if not os.path.isdir(self.checkoutdir):
+                self.create_checkout()
+            else:
+                self.update_checkout()
         self._get_versions()
 
     def create_checkout(self):
@@ -63,15 +90,33 @@ class AnsibleVersionIndexer(object):
         (rc, so, se) = run_command(cmd)
         print str(so) + str(se)
 
-    def _get_versions(self):
-        self.VALIDVERSIONS = {}
-        # get devel's version
+    def _load_json(self, filename):
+        filename = os.path.join(self.cachedir, filename)
+        if not os.path.isfile(filename):
+            return None
+        try:
+            with open(filename, 'rb') as f:
+                return json.load(f)
+        except ValueError as e:
+            logging.error('unable to load %s: %s' % (filename, e))
+            return None
+
+    def _dump_json(self, filename, data):
+        filename = os.path.join(self.cachedir, filename)
+        write_atomic(filename, json.dumps(data))
+
+    def _get_devel_version(self):
         vpath = os.path.join(self.checkoutdir, 'VERSION')
         vpath = os.path.expanduser(vpath)
-        devel_version = None
         with open(vpath, 'rb') as f:
             devel_version = f.read().strip().split()[0]
-            self.VALIDVERSIONS[devel_version] = 'devel'
+        return devel_version
+
+    def _get_versions(self):
+        self.VALIDVERSIONS = {}
+        # get devel's version
+        self.devel_version = self._get_devel_version()
+        self.VALIDVERSIONS[self.devel_version] = 'devel'
 
         # branches
         cmd = 'cd %s;' % self.checkoutdir
@@ -105,6 +150,25 @@ class AnsibleVersionIndexer(object):
             if rline not in self.VALIDVERSIONS:
                 self.VALIDVERSIONS[rline] = 'tag'
 
+        self._index_versions()
+
+    def _index_versions(self):
+        '''Build the lookup structures for VALIDVERSIONS'''
+
+        self._versions_desc = sorted(self.VALIDVERSIONS.keys(), reverse=True)
+
+        # character trie of every known version, a None key marks the
+        # end of a version string
+        self._version_trie = {}
+        for version in self._versions_desc:
+            node = self._version_trie
+            for char in version:
+                node = node.setdefault(char, {})
+            node[None] = True
+
+        # results depend on the known versions
+        self._strip_cache = {}
+
     def is_valid_version(self, version):
 
         if not version:
@@ -113,19 +177,39 @@ class AnsibleVersionIndexer(object):
         if not self.VALIDVERSIONS:
             self._get_versions()
 
-        if version in self.VALIDVERSIONS:
+        # valid if it is a prefix of a known version or a known version
+        # is a prefix of it
+        node = self._version_trie
+        if None in node:
             return True
-        else:
-            keys = [x for x in self.VALIDVERSIONS.keys()]
-            keys = sorted(set(keys))
-            for k in keys:
-                if k.startswith(version) or version.startswith(k):
-                    return True
+        for char in version:
+            node = node.get(char)
+            if node is None:
+                return False
+            if None in node:
+                return True
 
-        return False
+        return True
 
     def strip_ansible_version(self, rawtext, logprefix=''):
 
+        if not self.VALIDVERSIONS:
+            self._get_versions()
+
+        rawtext = rawtext.replace('`', '')
+        rawtext = rawtext.strip()
+        rawtext = rawtext.lower()
+
+        # the same few version strings show up over and over
+        if rawtext not in self._strip_cache:
+            if len(self._strip_cache) > 10000:
+                self._strip_cache = {}
+            self._strip_cache[rawtext] = \
+                self._strip_ansible_version(rawtext, logprefix=logprefix)
+        return self._strip_cache[rawtext]
+
+    def _strip_ansible_version(self, rawtext, logprefix=''):
+
         # any
         # all
         # all?
@@ -149,50 +233,35 @@ class AnsibleVersionIndexer(object):
         # 1.x
         # 2.x
 
-        devel = ['devel', 'master', 'head', 'latest', 'all', 'all?', 'all ?', 'any',
-                 'n/a', 'na', 'not applicable', 'latest devel',
-                 'latest devel branch', 'ansible devel', '', 'future',
-                 'git version', 'ansible@devel', 'all recent releases']
-
-        if not self.VALIDVERSIONS:
-            self._get_versions()
-
         aversion = False
 
-        rawtext = rawtext.replace('`', '')
-        rawtext = rawtext.strip()
-        rawtext = rawtext.lower()
         rawlines = rawtext.split('\n')
         rawlines = [x.strip() for x in rawlines]
 
         # exit early for "devel" variations ...
-        if rawtext in devel:
+        if rawtext in DEVEL_VERSIONS:
             return 'devel'
 
         # handle 1.x/2.x globs
-        xver = re.compile('^-?[1-9].x')
         if len(rawlines) == 1:
-            if xver.match(rawlines[0]):
+            if MAJOR_GLOB_RE.match(rawlines[0]):
                 major_ver = rawlines[0].split('.')[0]
 
                 # Get the highest minor version for this major
-                cversions = reversed(sorted(self.VALIDVERSIONS.keys()))
-                for cver in cversions:
+                for cver in self._versions_desc:
                     if cver[0] == major_ver:
                         aversion = cver
                         break
                 if aversion:
                     return aversion
 
-        xver = re.compile('^-?[1-9].[1-9].x')
         if len(rawlines) == 1:
-            if xver.match(rawlines[0]):
+            if MINOR_GLOB_RE.match(rawlines[0]):
                 major_ver = rawlines[0].split('.')[0]
                 minor_ver = rawlines[0].split('.')[1]
 
                 # Get the highest minor version for this major
-                cversions = reversed(sorted(self.VALIDVERSIONS.keys()))
-                for cver in cversions:
+                for cver in self._versions_desc:
                     if cver[0:3] == (major_ver + '.' + minor_ver):
                         aversion = cver
                         break
@@ -356,6 +425,84 @@ class AnsibleVersionIndexer(object):
 
         return aversion
 
+    def _get_branch_heads(self):
+        '''Map of release, stable and devel branch names to their heads'''
+        cmd = 'cd %s;' % self.checkoutdir
+        cmd += 'git for-each-ref --format="%(refname:short) %(objectname)"'
+        cmd += ' refs/remotes/origin/'
+        (rc, so, se) = run_command(cmd)
+        heads = {}
+        for line in so.split('\n'):
+            parts = line.strip().split()
+            if len(parts) != 2 or not parts[0].startswith('origin/'):
+                continue
+            branch = parts[0].split('/', 1)[1]
+            if branch.startswith('release') or \
+                    branch.startswith('stable') or branch == 'devel':
+                heads[branch] = parts[1]
+        return heads
+
+    @property
+    def commit_index(self):
+        '''Map of every commit to the first branch that contains it'''
+
+        # This is what "git branch -r --contains" would say, precomputed
+        # with one rev-list per branch. Release and stable branches are
+        # ranked the way git lists them and devel is always last, so a
+        # commit maps to the first release branch containing it or to
+        # devel if it has not been released yet.
+
+        if self._commit_index is not None:
+            return self._commit_index
+
+        heads = self._get_branch_heads()
+        heads_key = hashlib.sha1(
+            json.dumps(sorted(heads.items()))
+        ).hexdigest()
+
+        cached = self._load_json('ansible.version.commits.json')
+        if cached and cached.get('heads_key') == heads_key:
+            self._commit_index = cached['commits']
+            return self._commit_index
+
+        commits = {}
+        old_heads = {}
+        if cached and set(cached['heads'].keys()).issubset(heads.keys()):
+            # only walk what each branch gained since the last build
+            commits = cached['commits']
+            old_heads = cached['heads']
+
+        order = sorted([x for x in heads.keys() if x != 'devel'])
+        if 'devel' in heads:
+            order.append('devel')
+        rank = dict([(x, idx) for idx, x in enumerate(order)])
+
+        for branch in order:
+            old_head = old_heads.get(branch)
+            if old_head == heads[branch]:
+                continue
+            logging.info('indexing commits in %s' % branch)
+            cmd = 'cd %s;' % self.checkoutdir
+            cmd += 'git rev-list %s' % heads[branch]
+            if old_head:
+                cmd += ' ^%s' % old_head
+            (rc, so, se) = run_command(cmd)
+            if rc != 0:
+                logging.error('rev-list failed for %s: %s' % (branch, se))
+                continue
+            for chash in so.split():
+                current = commits.get(chash)
+                if current is None or \
+                        rank.get(current, len(order)) > rank[branch]:
+                    commits[chash] = branch
+
+        self._dump_json(
+            'ansible.version.commits.json',
+            {'heads_key': heads_key, 'heads': heads, 'commits': commits}
+        )
+        self._commit_index = commits
+        return self._commit_index
+
     def ansible_version_by_commit(self, commithash, config=None):
 
         # $ git branch --contains e620fed755a9c7e07df846b7deb32bbbf3164ac7
@@ -385,13 +532,17 @@ class AnsibleVersionIndexer(object):
 
         if commithash in self.COMMITVERSIONS:
             aversion = self.COMMITVERSIONS[commithash]
+        elif commithash in self.commit_index:
+            branch = str(self.commit_index[commithash])
+            if branch == 'devel':
+                aversion = self.devel_version
+            else:
+                aversion = branch.replace('release', '')
+                aversion = aversion.replace('stable-', '')
+            self.COMMITVERSIONS[commithash] = aversion
         else:
-            # get devel's version
-            vpath = os.path.join(self.checkoutdir, 'VERSION')
-            vpath = os.path.expanduser(vpath)
-            devel_version = None
-            with open(vpath, 'rb') as f:
-                devel_version = f.read().strip().split()[0]
+            # not in any indexed branch, ask git directly
+            devel_version = self.devel_version
 
             cmd = 'cd %s;' % self.checkoutdir
             cmd += 'git branch -r --contains %s' % commithash
@@ -442,17 +593,59 @@ class AnsibleVersionIndexer(object):
 
         return aversion
 
+    def _get_date_versions(self):
+        '''[date, hash] for every commit on HEAD in git log order'''
+
+        cmd = 'cd %s;' % self.checkoutdir
+        cmd += 'git rev-parse HEAD'
+        (rc, so, se) = run_command(cmd)
+        head = so.strip()
+
+        cached = self._load_json('ansible.version.dates.json')
+        if cached and cached.get('head') == head:
+            return cached['dates']
+
+        cmd = 'cd %s;' % self.checkoutdir
+        cmd += 'git log --date=short --pretty=format:"%ad;%H"'
+
+        dates = []
+        if cached and cached.get('head'):
+            # only log what is new since the last indexed HEAD
+            acmd = 'cd %s;' % self.checkoutdir
+            acmd += 'git merge-base --is-ancestor %s HEAD' % cached['head']
+            (rc, so, se) = run_command(acmd)
+            if rc == 0:
+                cmd += ' %s..HEAD' % cached['head']
+                dates = cached['dates']
+
+        (rc, so, se) = run_command(cmd)
+        lines = [x.strip() for x in so.split('\n') if x.strip()]
+        dates = [x.split(';') for x in lines] + dates
+
+        self._dump_json(
+            'ansible.version.dates.json',
+            {'head': head, 'dates': dates}
+        )
+        return dates
+
+    def _index_date_versions(self):
+        # first (newest) commit in git log order for each month
+        self._month_commits = {}
+        for dv in self.DATEVERSIONS:
+            self._month_commits.setdefault(dv[0][0:7], dv[1])
+
+        # dates sorted ascending for bisecting, newest commit last on ties
+        entries = sorted(
+            [(dv[0], -idx, dv[1]) for idx, dv in enumerate(self.DATEVERSIONS)]
+        )
+        self._date_keys = [x[0] for x in entries]
+        self._date_commits = [x[2] for x in entries]
+
     def ansible_version_by_date(self, dateobj, devel=False):
 
         if not self.DATEVERSIONS:
-            self.DATEVERSIONS = []
-            cmd = 'cd %s;' % self.checkoutdir
-            cmd += 'git log --date=short --pretty=format:"%ad;%H"'
-            (rc, so, se) = run_command(cmd)
-            lines = [x.strip() for x in so.split('\n') if x.strip()]
-            for x in lines:
-                parts = x.split(';')
-                self.DATEVERSIONS.append(parts)
+            self.DATEVERSIONS = self._get_date_versions()
+            self._index_date_versions()
 
         last_commit_date = self.DATEVERSIONS[0][0]
         last_commit_date = datetime.datetime.strptime(
@@ -464,19 +657,14 @@ class AnsibleVersionIndexer(object):
         if dateobj >= last_commit_date:
             acommit = self.DATEVERSIONS[0][1]
         else:
-            acommit = None
+            # newest commit from the same month
             datestr = str(dateobj).split()[0]
-            for dv in reversed(self.DATEVERSIONS):
-                if dv[0] == datestr:
-                    #accommit = dv[1]
-                    break
+            acommit = self._month_commits.get(datestr[0:7])
             if not acommit:
-                datestr = '-'.join(datestr.split('-')[0:2])
-                for dv in self.DATEVERSIONS:
-                    dvs = '-'.join(dv[0].split('-')[0:2])
-                    if dvs == datestr:
-                        acommit = dv[1]
-                        break
+                # no commits that month, use the last one before the date
+                idx = bisect.bisect_right(self._date_keys, datestr)
+                if idx > 0:
+                    acommit = self._date_commits[idx - 1]
 
         aversion = None
         if acommit:
@@ -0,0 +1,159 @@
+#!/usr/bin/env python
+
+# webhook_queue.py
+#
+#   WebhookQueue - durable (repo, number, event) work items
+#
+#   scripts/ansibot_webhooks.py verifies github's webhook deliveries and
+#   puts the issue each one touches into this queue, a sqlite file both
+#   processes open. The triager (triage_ansible.py --webhooks) claims
+#   batches, triages the issues and acks the items when done. Claims
+#   that are never acked, because the triager died mid batch, become
+#   claimable again after claim_timeout seconds. Redelivered webhooks
+#   are dropped by their delivery id.
+#
+#   Usage:
+#       wq = WebhookQueue('~/.ansibullbot/cache/webhooks.sqlite')
+#       wq.put('ansible/ansible', 1, 'issue_comment', delivery=guid)
+#       items = wq.claim()
+#       ...
+#       wq.ack([x[0] for x in items])
+
+import hashlib
+import hmac
+import os
+import sqlite3
+import threading
+import time
+
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    delivery TEXT UNIQUE,
+    repo TEXT NOT NULL,
+    number INTEGER NOT NULL,
+    event TEXT,
+    received REAL,
+    claimed REAL
+);
+'''
+
+# payload key that carries the issue for each event
+EVENT_OBJECTS = {
+    'issues': 'issue',
+    'issue_comment': 'issue',
+    'pull_request': 'pull_request',
+    'pull_request_review': 'pull_request',
+    'pull_request_review_comment': 'pull_request',
+}
+
+
+def get_signature(secret, body, algorithm='sha256'):
+    digest = hmac.new(secret, body, getattr(hashlib, algorithm)).hexdigest()
+    return '%s=%s' % (algorithm, digest)
+
+
+def verify_signature(secret, body, signature):
+    '''Check an X-Hub-Signature(-256) header against the raw body'''
+    if not secret or not signature or '=' not in signature:
+        return False
+    # headers and config values may come in as unicode
+    signature = str(signature)
+    algorithm = signature.split('=', 1)[0]
+    if algorithm not in ['sha1', 'sha256']:
+        return False
+    expected = get_signature(str(secret), body, algorithm=algorithm)
+    return hmac.compare_digest(expected, signature)
+
+
+def parse_event(event, payload, botnames=[]):
+    '''Return the (repo, number) an event touches or None'''
+    key = EVENT_OBJECTS.get(event)
+    if not key or key not in payload:
+        return None
+    # the bot's own comments and labels don't need another pass
+    if payload.get('sender', {}).get('login') in botnames:
+        return None
+    return (
+        payload['repository']['full_name'],
+        int(payload[key]['number'])
+    )
+
+
+class WebhookQueue(object):
+    '''A claim/ack work queue in a sqlite file'''
+
+    def __init__(self, dbfile, claim_timeout=600):
+        self.dbfile = os.path.expanduser(dbfile)
+        self.claim_timeout = claim_timeout
+        dbdir = os.path.dirname(self.dbfile)
+        if dbdir and not os.path.isdir(dbdir):
+            os.makedirs(dbdir)
+
+        self._lock = threading.Lock()
+        # autocommit, claim() opens its own transaction
+        self._conn = sqlite3.connect(
+            self.dbfile,
+            timeout=60,
+            isolation_level=None,
+            check_same_thread=False
+        )
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.executescript(SCHEMA)
+
+    def put(self, repo, number, event, delivery=None):
+        '''Queue an item, False if the delivery was already queued'''
+        with self._lock:
+            try:
+                self._conn.execute(
+                    'INSERT INTO events '
+                    '(delivery, repo, number, event, received) '
+                    'VALUES (?, ?, ?, ?, ?)',
+                    (delivery, repo, int(number), event, time.time())
+                )
+            except sqlite3.IntegrityError:
+                return False
+        return True
+
+    def claim(self, limit=100):
+        '''Claim the oldest items, [(id, repo, number, event), ...]'''
+        now = time.time()
+        with self._lock:
+            # BEGIN IMMEDIATE so two consumers never claim the same rows
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                rows = self._conn.execute(
+                    'SELECT id, repo, number, event FROM events '
+                    'WHERE claimed IS NULL OR claimed < ? '
+                    'ORDER BY id LIMIT ?',
+                    (now - self.claim_timeout, limit)
+                ).fetchall()
+                self._conn.executemany(
+                    'UPDATE events SET claimed=? WHERE id=?',
+                    [(now, x[0]) for x in rows]
+                )
+            finally:
+                self._conn.execute('COMMIT')
+        return rows
+
+    def ack(self, ids):
+        with self._lock:
+            self._conn.executemany(
+                'DELETE FROM events WHERE id=?',
+                [(x,) for x in ids]
+            )
+
+    def release(self, ids):
+        '''Hand claimed items back without waiting for the timeout'''
+        with self._lock:
+            self._conn.executemany(
+                'UPDATE events SET claimed=NULL WHERE id=?',
+                [(x,) for x in ids]
+            )
+
+    def depth(self):
+        with self._lock:
+            return self._conn.execute(
+                'SELECT COUNT(*) FROM events'
+            ).fetchone()[0]
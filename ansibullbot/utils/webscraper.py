@@ -5,12 +5,11 @@ import logging
 import re
 import requests
 import os
-import shutil
-import tempfile
 import time
 import urllib2
 from bs4 import BeautifulSoup
 
+from ansibullbot.utils.cache_store import get_cache_store
 from ansibullbot.utils.receiver_client import post_to_receiver
 import ansibullbot.constants as C
 
@@ -28,70 +27,78 @@ class GithubWebScraper(object):
             self.cachedir = '/tmp/gws'
         if not os.path.isdir(self.cachedir):
             os.makedirs(self.cachedir)
+        # repo_path -> {number: summary}, read through to the store
+        self.summaries = {}
+        self._store = None
 
     def split_repo_url(self, repo_url):
         rparts = repo_url.split('/')
         rparts = [x.strip() for x in rparts if x.strip()]
         return (rparts[-2], rparts[-1])
 
+    @property
+    def store(self):
+        if self._store is None:
+            self._store = get_cache_store(self.cachedir)
+        return self._store
+
+    def get_repo_path(self, repo_url):
+        return '%s/%s' % self.split_repo_url(repo_url)
+
+    def _load_repo_summaries(self, repo_path):
+        '''The in-process copy of a repo's summaries, keyed by number'''
+        if repo_path not in self.summaries:
+            summaries = self.store.get_all(repo_path, 'summary')
+            if not summaries:
+                summaries = self._import_summaries_json(repo_path)
+            self.summaries[repo_path] = summaries
+        return self.summaries[repo_path]
+
+    def _import_summaries_json(self, repo_path):
+        '''Move a summaries.json from before the cache store into it'''
+        cachefile = os.path.join(self.cachedir, repo_path, 'summaries.json')
+        if not os.path.isfile(cachefile):
+            return {}
+
+        logging.info('importing %s' % cachefile)
+        try:
+            with open(cachefile, 'rb') as f:
+                issues = json.load(f)
+        except Exception as e:
+            logging.error(e)
+            if C.DEFAULT_BREAKPOINTS:
+                logging.error('breakpoint!')
+                import epdb; epdb.st()
+            else:
+                raise Exception(str(e))
+
+        summaries = dict((int(k), v) for k,v in issues.items())
+        self.store.put_many(repo_path, 'summary', summaries.items())
+        return summaries
+
     def load_summaries(self, repo_url):
-        issues = {}
-        ns,repo = self.split_repo_url(repo_url)
-        cachefile = os.path.join(self.cachedir, ns, repo, 'summaries.json')
-        if os.path.isfile(cachefile):
-            try:
-                with open(cachefile, 'rb') as f:
-                    issues = json.load(f)
-            except Exception as e:
-                logging.error(e)
-                issues = {}
-                if C.DEFAULT_BREAKPOINTS:
-                    logging.error('breakpoint!')
-                    import epdb; epdb.st()
-                else:
-                    raise Exception(str(e))
-        return issues
+        repo_path = self.get_repo_path(repo_url)
+        summaries = self._load_repo_summaries(repo_path)
+        return dict((u'%s' % k, v) for k,v in summaries.items())
+
+    def load_summary(self, repo_url, number):
+        '''Cached summary for a single number without loading the repo'''
+        repo_path = self.get_repo_path(repo_url)
+        number = int(number)
+        if repo_path in self.summaries:
+            return self.summaries[repo_path].get(number)
+        return self.store.get(repo_path, number, 'summary')[1]
+
+    def dump_summary(self, repo_url, number, summary):
+        repo_path = self.get_repo_path(repo_url)
+        number = int(number)
+        self.store.put(repo_path, number, 'summary', summary)
+        if repo_path in self.summaries:
+            self.summaries[repo_path][number] = summary
+
+    def dump_summaries(self, repo_url, issues):
+        '''Upsert the summaries that differ from what is stored'''
 
-    def dump_summaries(self, repo_url, issues, filename="summaries"):
-
-        """
-        [jtanner@fedmac ansibullbot]$ sudo ls -al /proc/10895/fd
-        total 0
-        dr-x------ 2 jtanner docker  0 Jan 13 08:51 .
-        dr-xr-xr-x 9 jtanner docker  0 Jan 13 08:42 ..
-        lrwx------ 1 jtanner docker 64 Jan 13 08:51 0 -> /dev/pts/2
-        lrwx------ 1 jtanner docker 64 Jan 13 08:51 1 -> /dev/pts/2
-        lr-x------ 1 jtanner docker 64 Jan 13 08:51 10 -> /dev/urandom
-        lrwx------ 1 jtanner d 64 Jan 13 08:51 11 -> /tmp/tmpag2rAb (deleted)
-        lrwx------ 1 jtanner d 64 Jan 13 08:51 12 -> /tmp/tmpD2plk9 (deleted)
-        lrwx------ 1 jtanner d 64 Jan 13 08:51 13 -> /tmp/tmpfkSSPA (deleted)
-        lrwx------ 1 jtanner d 64 Jan 13 08:51 14 -> /tmp/tmpIDY_wb (deleted)
-        lrwx------ 1 jtanner d 64 Jan 13 08:51 15 -> /tmp/tmpbQBvI2 (deleted)
-        lrwx------ 1 jtanner d 64 Jan 13 08:51 16 -> /tmp/tmpknP5os (deleted)
-        lrwx------ 1 jtanner d 64 Jan 13 08:51 17 -> /tmp/tmpDJgEnc (deleted)
-        lrwx------ 1 jtanner d 64 Jan 13 08:51 18 -> /tmp/tmprWLicP (deleted)
-        lrwx------ 1 jtanner d 64 Jan 13 08:51 19 -> /tmp/tmpm6d8Qx (deleted)
-        lrwx------ 1 jtanner d 64 Jan 13 08:51 2 -> /dev/pts/2
-        lrwx------ 1 jtanner d 64 Jan 13 08:51 20 -> /tmp/tmp_w9Sth (deleted)
-        lrwx------ 1 jtanner d 64 Jan 13 08:51 21 -> /tmp/tmpRGnb3p (deleted)
-        lrwx------ 1 jtanner d 64 Jan 13 08:51 22 -> /tmp/tmpiVYdTE (deleted)
-        lrwx------ 1 jtanner d 64 Jan 13 08:51 23 -> /tmp/tmpEyGXuP (deleted)
-        l-wx------ 1 jtanner d 64 Jan 13 08:51 3 -> /var/log/ansibullbot.log
-        lrwx------ 1 jtanner d 64 Jan 13 08:51 4 -> /tmp/tmpIlHOg_ (deleted)
-        lrwx------ 1 jtanner d 64 Jan 13 08:51 5 -> /tmp/tmp5P8Mya (deleted)
-        lrwx------ 1 jtanner d 64 Jan 13 08:51 6 -> /tmp/tmpDW4MRD (deleted)
-        lrwx------ 1 jtanner d 64 Jan 13 08:51 7 -> /tmp/tmpUyBIFB (deleted)
-        lrwx------ 1 jtanner d 64 Jan 13 08:51 8 -> /tmp/tmpYcWaLe (deleted)
-        lrwx------ 1 jtanner d 64 Jan 13 08:51 9 -> /tmp/tmp_Qcxrt (deleted)
-        """
-
-        ns,repo = self.split_repo_url(repo_url)
-        cachefile = os.path.join(
-            self.cachedir,
-            ns,
-            repo,
-            '%s.json' % filename
-        )
         if not issues:
             if C.DEFAULT_BREAKPOINTS:
                 logging.error('breakpoint!')
@@ -99,17 +106,14 @@ class GithubWebScraper(object):
             else:
                 raise Exception('no issues')
 
-        tfh, tfn = tempfile.mkstemp()
-        os.close(tfh)
-        with open(tfn, 'wb') as f:
-            f.write(json.dumps(issues, sort_keys=True, indent=2))
-
-        if os.path.isfile(cachefile):
-            os.remove(cachefile)
-        shutil.move(tfn, cachefile)
-
-    def dump_summaries_tmp(self, repo_url, issues):
-        self.dump_summaries(repo_url, issues, filename="summaries-tmp")
+        repo_path = self.get_repo_path(repo_url)
+        summaries = self._load_repo_summaries(repo_path)
+        changed = [(int(k), v) for k,v in issues.items()
+                   if summaries.get(int(k)) != v]
+        if changed:
+            logging.debug('storing %s summaries' % len(changed))
+            self.store.put_many(repo_path, 'summary', changed)
+            summaries.update(changed)
 
     def get_last_number(self, repo_path):
         repo_url = self.baseurl + '/' + repo_path
@@ -151,10 +155,11 @@ class GithubWebScraper(object):
             # send to receiver
             post_to_receiver('summaries', {'user': namespace, 'repo': reponame}, data['issues'])
             # update master list
-            issues.update(data['issues'])
+            for k,v in data['issues'].iteritems():
+                issues[u'%s' % k] = v
 
         if not baseurl:
-            self.dump_summaries_tmp(repo_url, issues)
+            self.dump_summaries(repo_url, issues)
 
         while data['next_page']:
             rr = self._request_url(self.baseurl + data['next_page'])
@@ -186,7 +191,7 @@ class GithubWebScraper(object):
                 logging.info('changed: %s' % ','.join(x for x in changed))
 
             if not baseurl:
-                self.dump_summaries_tmp(repo_url, issues)
+                self.dump_summaries(repo_url, issues)
 
             if not changes:
                 break
@@ -232,10 +237,10 @@ class GithubWebScraper(object):
         '''Scrape the summary for a specific issue'''
 
         # get cached
-        issues = self.load_summaries(repo_url)
+        summary = self.load_summary(repo_url, number)
 
-        if number in issues and not force:
-            return issues[number]
+        if summary and not force:
+            return summary
         else:
             if repo_url.startswith('http'):
                 url = repo_url
@@ -247,14 +252,12 @@ class GithubWebScraper(object):
             rr = self._request_url(url)
             soup = BeautifulSoup(rr.text, 'html.parser')
             if soup.text.lower().strip() != 'not found':
-                summary = self.parse_issue_page_to_summary(soup, url=rr.url)
-                if summary:
-                    issues[number] = summary
+                scraped = self.parse_issue_page_to_summary(soup, url=rr.url)
+                if scraped:
+                    summary = scraped
+                    self.dump_summary(repo_url, number, summary)
 
-        if number in issues:
-            return issues[number]
-        else:
-            return {}
+        return summary or {}
 
     def _issue_urls_from_links(self, links, checkstring=None):
         issue_urls = []
@@ -0,0 +1,152 @@
+#!/usr/bin/env python
+
+# write_pacer.py
+#
+#   WritePacer - keep api writes under github's secondary rate limits
+#
+#   Besides the hourly quota github blocks clients that write too fast
+#   ("You have been blocked from content creation", abuse detection).
+#   Every POST/PATCH/PUT/DELETE sent through the requester is spaced at
+#   least interval seconds from the previous one, and content creation
+#   (POSTs: comments, issues) is kept within a count per time window.
+#   When github still answers 403 with a Retry-After, no further writes
+#   are sent before that time.
+#
+#   Usage:
+#       gh = Github(token)
+#       install_write_pacer(gh, interval=1.0, limits=[(20, 60)])
+#       ...
+#       get_write_pacer().get_stats()
+
+import collections
+import logging
+import threading
+import time
+
+
+WRITE_VERBS = ['POST', 'PATCH', 'PUT', 'DELETE']
+
+# verbs that create content, comments and issues
+CONTENT_VERBS = ['POST']
+
+# (requests, seconds) for content creation
+DEFAULT_LIMITS = [(20, 60), (450, 3600)]
+
+PACER = None
+PACER_LOCK = threading.Lock()
+
+
+def parse_limits(values):
+    '''['20:60', ...] (from a config list) -> [(20, 60), ...]'''
+    limits = []
+    for value in values or []:
+        if ':' in value:
+            (count, seconds) = value.split(':', 1)
+            limits.append((int(count), int(seconds)))
+    return limits
+
+
+def get_write_pacer():
+    '''The process wide pacer, None until a connection is made'''
+    return PACER
+
+
+def install_write_pacer(gh, interval=1.0, limits=None):
+    global PACER
+    with PACER_LOCK:
+        if PACER is None:
+            PACER = WritePacer(interval=interval, limits=limits)
+    PACER.install(gh._Github__requester)
+    return PACER
+
+
+class WritePacer(object):
+    '''Spaces write requests and caps content creation per window'''
+
+    def __init__(self, interval=1.0, limits=None):
+        self.interval = interval
+        self.limits = limits or DEFAULT_LIMITS
+        self.last_write = 0
+        self.blocked_until = 0
+        # send times of the content creating requests
+        self.content = collections.deque()
+        self.stats = {'writes': 0, 'content': 0, 'waited': 0.0, 'blocked': 0}
+        self._lock = threading.Lock()
+        # replaced in the tests
+        self._time = time.time
+        self._sleep = time.sleep
+
+    def install(self, requester):
+        if getattr(requester, '_write_pacer', None) is self:
+            return
+
+        original = requester._Requester__requestRaw
+
+        def request_raw(cnx, verb, url, requestHeaders, input):
+            if verb not in WRITE_VERBS:
+                return original(cnx, verb, url, requestHeaders, input)
+            self.wait(verb)
+            (status, headers, output) = \
+                original(cnx, verb, url, requestHeaders, input)
+            self.update(status, headers)
+            return (status, headers, output)
+
+        requester._Requester__requestRaw = request_raw
+        requester._write_pacer = self
+
+    def get_delay(self, verb, now):
+        '''Seconds to wait before a write can be sent'''
+        delay = max(
+            self.blocked_until - now,
+            self.last_write + self.interval - now,
+            0
+        )
+        if verb in CONTENT_VERBS:
+            for (count, seconds) in self.limits:
+                sent = [x for x in self.content if x > now - seconds]
+                if len(sent) >= count:
+                    # until the oldest one in the window drops out
+                    delay = max(delay, sent[-count] + seconds - now)
+        return delay
+
+    def wait(self, verb):
+        '''Block until the write is within the limits, then count it'''
+        with self._lock:
+            delay = self.get_delay(verb, self._time())
+            if delay > 0:
+                if delay > 5:
+                    logging.info('pacing writes, sleeping %ss' % int(delay))
+                self.stats['waited'] += delay
+                self._sleep(delay)
+
+            now = self._time()
+            self.last_write = now
+            self.stats['writes'] += 1
+            if verb in CONTENT_VERBS:
+                self.stats['content'] += 1
+                self.content.append(now)
+                longest = max(x[1] for x in self.limits)
+                while self.content and self.content[0] <= now - longest:
+                    self.content.popleft()
+
+    def update(self, status, headers):
+        '''Back off after a secondary rate limit response'''
+        if status != 403 or 'retry-after' not in headers:
+            return
+        try:
+            retry_after = int(headers['retry-after'])
+        except ValueError:
+            return
+        with self._lock:
+            self.stats['blocked'] += 1
+            self.blocked_until = max(
+                self.blocked_until,
+                self._time() + retry_after
+            )
+        logging.warning('writes blocked for %ss by github' % retry_after)
+
+    def get_stats(self):
+        with self._lock:
+            stats = self.stats.copy()
+        stats['waited'] = round(stats['waited'], 1)
+        return stats
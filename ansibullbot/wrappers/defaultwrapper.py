@@ -22,7 +22,6 @@ import json
 import logging
 import operator
 import os
-import pickle
 import shutil
 import sys
 import time
@@ -31,8 +30,10 @@ from datetime import datetime
 # remember to pip install PyGithub, kids!
 import github
 
+from ansibullbot.utils.cache_store import get_cache_store
 from ansibullbot.utils.extractors import extract_template_sections
 from ansibullbot.utils.extractors import extract_template_data
+from ansibullbot.utils.raw_objects import to_raw_objects
 from ansibullbot.wrappers.historywrapper import HistoryWrapper
 
 from ansibullbot.decorators.github import RateLimited
@@ -126,6 +127,17 @@ class DefaultWrapper(object):
         self.valid_assignees = []
         #self.raw_data_issue = self.load_update_fetch('raw_data', obj='issue')
         self._raw_data_issue = None
+        self._store = None
+
+    @property
+    def store(self):
+        '''The shared cache store for this repo'''
+        if self._store is None:
+            self._store = get_cache_store(
+                self.cachedir,
+                repo_path=self.repo.repo_path
+            )
+        return self._store
 
     def get_rate_limit(self):
         return self.repo.gh.get_rate_limit()
@@ -134,20 +146,8 @@ class DefaultWrapper(object):
         return datetime.utcnow()
 
     def save_issue(self):
-        pfile = os.path.join(
-            self.cachedir,
-            'issues',
-            str(self.instance.number),
-            'issue.pickle'
-        )
-        pdir = os.path.dirname(pfile)
-
-        if not os.path.isdir(pdir):
-            os.makedirs(pdir)
-
-        logging.debug('dump %s' % pfile)
-        with open(pfile, 'wb') as f:
-            pickle.dump(self.instance, f)
+        logging.debug('dump %s' % self.instance.number)
+        self.repo.save_issue(self.instance)
 
     @RateLimited
     def get_comments(self):
@@ -164,14 +164,18 @@ class DefaultWrapper(object):
             lines = body.split('\n')
             lines = [y.strip() for y in lines if y.strip()]
 
-            if lines[-1].startswith('<!---') \
-                    and lines[-1].endswith('--->') \
-                    and 'boilerplate:' in lines[-1]\
-                    and x.user.login == 'ansibot':
+            if x.user.login != 'ansibot':
+                continue
+
+            # coalesced comments carry several boilerplates
+            for line in lines:
+                if line.startswith('<!---') \
+                        and line.endswith('--->') \
+                        and 'boilerplate:' in line:
 
-                parts = lines[-1].split()
-                boilerplate = parts[2]
-                self.current_bot_comments.append(boilerplate)
+                    parts = line.split()
+                    boilerplate = parts[2]
+                    self.current_bot_comments.append(boilerplate)
 
         return self.current_comments
 
@@ -279,43 +283,27 @@ class DefaultWrapper(object):
         # so we can't take advantage of the caching scheme used
         # for the issue it's self. Instead this function calls
         # those methods by their given name, and write the data
-        # to a pickle file with a timestamp for the fetch time.
-        # Upon later loading of the pickle, the timestamp is
+        # to the cache store with a timestamp for the fetch time.
+        # Upon later loading of the record, the timestamp is
         # compared to the issue's update_at timestamp and if the
-        # pickle data is behind, the process will be repeated.
+        # record is behind, the process will be repeated.
 
-        edata = None
-        events = []
-        updated = None
         update = False
         write_cache = False
 
-        pfile = os.path.join(
-            self.cachedir,
-            'issues',
-            str(self.instance.number),
-            '%s.pickle' % property_name
+        (updated, events) = self.store.get(
+            self.repo.repo_path,
+            self.instance.number,
+            property_name
         )
-        pdir = os.path.dirname(pfile)
-
-        if not os.path.isdir(pdir):
-            os.makedirs(pdir)
-
-        if os.path.isfile(pfile):
-            try:
-                with open(pfile, 'rb') as f:
-                    edata = pickle.load(f)
-            except Exception as e:
-                update = True
-                write_cache = True
 
         # check the timestamp on the cache
-        if edata:
-            updated = edata[0]
-            events = edata[1]
-            if updated < self.instance.updated_at:
-                update = True
-                write_cache = True
+        if events is None:
+            events = []
+            write_cache = True
+        elif updated < self.instance.updated_at:
+            update = True
+            write_cache = True
 
         baseobj = None
         if obj:
@@ -373,11 +361,21 @@ class DefaultWrapper(object):
                         raise Exception(str(e))
                 events = [x for x in methodToCall()]
 
-        if write_cache or not os.path.isfile(pfile):
-            # need to dump the pickle back to disk
-            edata = [updated, events]
-            with open(pfile, 'wb') as f:
-                pickle.dump(edata, f)
+        # lists are kept as raw api data and read back as RawObjects
+        if isinstance(events, list):
+            events = to_raw_objects(events)
+            rdata = [x.raw_data for x in events]
+        else:
+            rdata = events
+
+        if write_cache:
+            self.store.put(
+                self.repo.repo_path,
+                self.instance.number,
+                property_name,
+                rdata,
+                updated_at=updated
+            )
 
         return events
 
@@ -553,6 +551,12 @@ class DefaultWrapper(object):
         """Removes a label from the Issue using the GitHub API"""
         self.get_issue().remove_from_labels(label)
 
+    @RateLimited
+    def set_labels(self, labels):
+        """Replaces all labels on the Issue with one API call"""
+        self.get_issue().set_labels(*labels)
+        self._labels = [x for x in labels]
+
     @RateLimited
     def add_comment(self, comment=None):
         """Adds a comment to the Issue using the GitHub API"""
@@ -608,6 +612,10 @@ class DefaultWrapper(object):
             assignees.remove(user)
             self._edit_assignees(assignees)
 
+    def set_assignees(self, assignees):
+        self._edit_assignees(assignees)
+        self._assignees = [x for x in assignees]
+
     @RateLimited
     def _edit_assignees(self, assignees):
         # https://github.com/PyGithub/PyGithub/pull/469/files
@@ -780,29 +788,21 @@ class DefaultWrapper(object):
         rd = self.pullrequest_raw_data
         surl = rd['statuses_url']
 
-        pfile = os.path.join(
-            self.cachedir,
-            'issues',
-            str(self.number),
-            'pr_status.pickle'
+        (updated, pdata) = self.store.get(
+            self.repo.repo_path,
+            self.number,
+            'pr_status'
         )
-        pdir = os.path.dirname(pfile)
-        if not os.path.isdir(pdir):
-            os.makedirs(pdir)
-
-        if os.path.isfile(pfile):
-            logging.info('pullrequest_status load pfile')
-            with open(pfile, 'rb') as f:
-                pdata = pickle.load(f)
 
         if pdata:
+            logging.info('pullrequest_status load cache')
             # is the data stale?
-            if pdata[0] < self.pullrequest.updated_at or force_fetch:
+            if updated < self.pullrequest.updated_at or force_fetch:
                 logging.info('fetching pr status: <date')
                 jdata = self._fetch_api_url(surl)
                 fetched = True
             else:
-                jdata = pdata[1]
+                jdata = pdata
 
         # missing?
         if not jdata:
@@ -810,11 +810,15 @@ class DefaultWrapper(object):
             jdata = self._fetch_api_url(surl)
             fetched = True
 
-        if fetched or not os.path.isfile(pfile):
-            logging.info('writing %s' % pfile)
-            pdata = (self.pullrequest.updated_at, jdata)
-            with open(pfile, 'wb') as f:
-                pickle.dump(pdata, f, protocol=2)
+        if fetched or pdata is None:
+            logging.info('writing pr_status for %s' % self.number)
+            self.store.put(
+                self.repo.repo_path,
+                self.number,
+                'pr_status',
+                jdata,
+                updated_at=self.pullrequest.updated_at
+            )
 
         # remove intermediate duplicates
         #jdata = sort_unique_statuses(jdata)
@@ -1122,22 +1126,13 @@ class DefaultWrapper(object):
         #   - repo.full_name
 
         sha = self.pullrequest.head.sha
-        pdata = None
         resp = None
-        cachefile = os.path.join(
-            self.cachedir,
-            'issues',
-            str(self.number),
-            'shippable_yml.pickle'
+        (updated, pdata) = self.store.get(
+            self.repo.repo_path,
+            self.number,
+            'shippable_yml'
         )
 
-        try:
-            if os.path.isfile(cachefile):
-                with open(cachefile, 'rb') as f:
-                    pdata = pickle.load(f)
-        except Exception as e:
-            logging.error('failed to unpickle %s %s' % (cachefile, str(e)))
-
         if not pdata or pdata[0] != sha:
 
             if self.pullrequest.head.repo:
@@ -1159,8 +1154,12 @@ class DefaultWrapper(object):
                 resp = [None]
 
             pdata = [sha, resp]
-            with open(cachefile, 'wb') as f:
-                pickle.dump(pdata, f, protocol=2)
+            self.store.put(
+                self.repo.repo_path,
+                self.number,
+                'shippable_yml',
+                pdata
+            )
 
         else:
             resp = pdata[1]
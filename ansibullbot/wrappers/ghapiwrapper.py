@@ -2,21 +2,26 @@
 
 from __future__ import print_function
 
-import glob
 import pickle
 import logging
 import os
 import re
 import requests
 import shutil
-#import time
+import time
 #import urllib2
 from datetime import datetime
 
 import ansibullbot.constants as C
 
 from bs4 import BeautifulSoup
+from github.Issue import Issue
+from github.PullRequest import PullRequest
 from ansibullbot.decorators.github import RateLimited
+from ansibullbot.utils.cache_store import get_cache_store
+from ansibullbot.utils.raw_objects import to_raw_objects
+from ansibullbot.utils.reference_data import get_reference_data
+from ansibullbot.utils.systemtools import write_atomic
 
 
 class GithubWrapper(object):
@@ -46,6 +51,12 @@ class RepoWrapper(object):
         self.cachedir = os.path.expanduser(cachedir)
         self.cachefile = os.path.join(self.cachedir, repo_path)
         self.cachefile = '%s/repo.pickle' % self.cachefile
+        self.store = get_cache_store(self.cachedir, repo_path=repo_path)
+        self.reference = get_reference_data(
+            self.cachedir,
+            ttl=C.DEFAULT_REFERENCE_TTL
+        )
+        self.repo_updated = 0
 
         self.updated_at_previous = None
         self.updated = False
@@ -68,8 +79,7 @@ class RepoWrapper(object):
             print("Debug: " + msg)
 
     def save_repo(self):
-        with open(self.cachefile, 'wb') as f:
-            pickle.dump(self.repo, f)
+        write_atomic(self.cachefile, pickle.dumps(self.repo))
 
     def get_last_issue_number(self):
         '''Scrape the newest issue/pr number'''
@@ -110,21 +120,15 @@ class RepoWrapper(object):
 
     @RateLimited
     def get_issue(self, number):
-        issue = None
-        while True:
-            try:
-                issue = self.load_issue(number)
-                if issue:
-                    if issue.update():
-                        self.save_issue(issue)
-                else:
-                    issue = self.repo.get_issue(number)
-                    self.save_issue(issue)
-                break
-            except UnicodeDecodeError:
-                # https://github.com/ansible/ansibullbot/issues/610
-                logging.warning('cleaning cache for %s' % number)
-                self.clean_issue_cache(number)
+        # unreadable records come back as missing and get refetched
+        # https://github.com/ansible/ansibullbot/issues/610
+        issue = self.load_issue(number)
+        if issue:
+            if issue.update():
+                self.save_issue(issue)
+        else:
+            issue = self.repo.get_issue(number)
+            self.save_issue(issue)
 
         return issue
 
@@ -147,6 +151,35 @@ class RepoWrapper(object):
             self._assignees = self.load_update_fetch('assignees')
         return self._assignees
 
+    @RateLimited
+    def fetch_assignee_logins(self):
+        return [x.login for x in self.repo.get_assignees()]
+
+    @property
+    def assignee_logins(self):
+        '''frozenset of the users issues can be assigned to'''
+        return self.reference.get(
+            self.repo_path,
+            'assignees',
+            self.fetch_assignee_logins
+        )
+
+    @property
+    def label_names(self):
+        '''frozenset of the repo's label names'''
+        return self.reference.get(
+            self.repo_path,
+            'labels',
+            lambda: [x.name for x in self.get_labels()]
+        )
+
+    def update_repo(self):
+        '''Refresh the repo object at most once per reference ttl'''
+        now = time.time()
+        if now - self.repo_updated >= C.DEFAULT_REFERENCE_TTL:
+            self.repo.update()
+            self.repo_updated = now
+
     '''
     @RateLimited
     def get_assignees(self):
@@ -181,139 +214,82 @@ class RepoWrapper(object):
         return prs
 
     def is_missing(self, number):
-        mfile = os.path.join(self.cachedir, 'issues', str(number), 'missing')
-        if os.path.isfile(mfile):
-            return True
-        else:
-            return False
+        return self.store.exists(self.repo_path, number, 'missing')
 
     def set_missing(self, number):
-        mfile = os.path.join(self.cachedir, 'issues', str(number), 'missing')
-        mdir = os.path.dirname(mfile)
-        if not os.path.isdir(mdir):
-            os.makedirs(mdir)
-        with open(mfile, 'wb') as f:
-            f.write('\n')
+        self.store.put(self.repo_path, number, 'missing', True)
 
     def load_issues(self, state='open', filter=None):
         issues = []
-        gfiles = glob.glob('%s/issues/*/issue.pickle' % self.cachedir)
-        for gf in gfiles:
-
-            if filter:
-                gf_parts = gf.split('/')
-                this_number = gf_parts[-2]
-                this_number = int(this_number)
-                if this_number not in filter:
-                    continue
-
-            logging.debug('load %s' % gf)
-            issue = None
-            try:
-                with open(gf, 'rb') as f:
-                    issue = pickle.load(f)
-            except EOFError as e:
-                # this is bad, get rid of it
-                logging.error(e)
-                os.remove(gf)
+        numbers = self.store.numbers(self.repo_path, 'issue')
+        for number in numbers:
+
+            if filter and number not in filter:
+                continue
+
+            logging.debug('load %s' % number)
+            issue = self.load_issue(number)
             if issue:
                 issues.append(issue)
         return issues
 
-    def load_issue(self, number):
-        pfile = os.path.join(
-            self.cachedir,
-            'issues',
-            str(number),
-            'issue.pickle'
-        )
-        if os.path.isfile(pfile):
-            with open(pfile, 'rb') as f:
-                issue = pickle.load(f)
-            return issue
-        else:
+    def _load_github_object(self, number, kind, klass):
+        '''Rebuild a pygithub object from its cached raw data'''
+        (updated_at, rdata) = self.store.get(self.repo_path, number, kind)
+        if not rdata:
             return False
+        # the stored headers keep the etag so update() stays conditional
+        return self.gh.create_from_raw_data(
+            klass,
+            rdata['raw_data'],
+            headers=rdata['headers']
+        )
 
-    def load_pullrequest(self, number):
-        pfile = os.path.join(
-            self.cachedir,
-            'issues',
-            str(number),
-            'pullrequest.pickle'
+    def _save_github_object(self, obj, kind):
+        rdata = {'raw_data': obj.raw_data, 'headers': obj.raw_headers}
+        self.store.put(
+            self.repo_path,
+            obj.number,
+            kind,
+            rdata,
+            updated_at=obj.updated_at
         )
-        pdir = os.path.dirname(pfile)
-        if not os.path.isdir(pdir):
-            os.makedirs(pdir)
-        if os.path.isfile(pfile):
-            with open(pfile, 'rb') as f:
-                issue = pickle.load(f)
-            return issue
-        else:
-            return False
+
+    def load_issue(self, number):
+        return self._load_github_object(number, 'issue', Issue)
+
+    def load_pullrequest(self, number):
+        return self._load_github_object(number, 'pullrequest', PullRequest)
 
     def save_issues(self, issues):
         for issue in issues:
             self.save_issue(issue)
 
     def save_issue(self, issue):
-        cfile = os.path.join(
-            self.cachedir,
-            'issues',
-            str(issue.number),
-            'issue.pickle'
-        )
-        cdir = os.path.dirname(cfile)
-        if not os.path.isdir(cdir):
-            os.makedirs(cdir)
-        logging.debug('dump %s' % cfile)
-        with open(cfile, 'wb') as f:
-            pickle.dump(issue, f)
+        logging.debug('dump %s' % issue.number)
+        self._save_github_object(issue, 'issue')
 
     def save_pullrequest(self, issue):
-        cfile = os.path.join(
-            self.cachedir,
-            'issues',
-            str(issue.number),
-            'pullrequest.pickle'
-        )
-        cdir = os.path.dirname(cfile)
-        if not os.path.isdir(cdir):
-            os.makedirs(cdir)
-        with open(cfile, 'wb') as f:
-            pickle.dump(issue, f)
+        self._save_github_object(issue, 'pullrequest')
 
     @RateLimited
     def load_update_fetch(self, property_name):
         '''Fetch a get() property for an object'''
 
-        edata = None
         events = []
-        updated = None
         update = False
         write_cache = False
-        self.repo.update()
-
-        pfile = os.path.join(self.cachedir, '%s.pickle' % property_name)
-        pdir = os.path.dirname(pfile)
+        self.update_repo()
 
-        if not os.path.isdir(pdir):
-            os.makedirs(pdir)
+        # repo level records are stored as number 0
+        (updated, events) = self.store.get(self.repo_path, 0, property_name)
 
-        if os.path.isfile(pfile):
-            try:
-                with open(pfile, 'rb') as f:
-                    edata = pickle.load(f)
-            except Exception as e:
-                update = True
-                write_cache = True
-
-            # check the timestamp on the cache
-            if edata:
-                updated = edata[0]
-                events = edata[1]
-                if updated < self.repo.updated_at:
-                    update = True
-                    write_cache = True
+        # check the timestamp on the cache
+        if events is None:
+            write_cache = True
+        elif updated < self.repo.updated_at:
+            update = True
+            write_cache = True
 
         # pull all events if timestamp is behind or no events cached
         if update or not events:
@@ -330,11 +306,17 @@ class RepoWrapper(object):
                     raise Exception('unable to get %s' % property_name)
             events = [x for x in methodToCall()]
 
-        if write_cache or not os.path.isfile(pfile):
-            # need to dump the pickle back to disk
-            edata = [updated, events]
-            with open(pfile, 'wb') as f:
-                pickle.dump(edata, f)
+        # only the raw api data is kept, cached or not
+        events = to_raw_objects(events)
+
+        if write_cache:
+            self.store.put(
+                self.repo_path,
+                0,
+                property_name,
+                [x.raw_data for x in events],
+                updated_at=updated
+            )
 
         return events
 
@@ -372,9 +354,11 @@ class RepoWrapper(object):
 
     def clean_issue_cache(self, number):
         # https://github.com/ansible/ansibullbot/issues/610
+        self.store.delete(self.repo_path, number)
         cdir = os.path.join(
             self.cachedir,
             'issues',
             str(number)
         )
-        shutil.rmtree(cdir)
+        if os.path.isdir(cdir):
+            shutil.rmtree(cdir)
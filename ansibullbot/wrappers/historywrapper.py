@@ -2,12 +2,11 @@
 
 import datetime
 import logging
-import os
-import pickle
 import pytz
 from operator import itemgetter
 from github import GithubObject
 from ansibullbot.decorators.github import RateLimited
+from ansibullbot.utils.cache_store import get_cache_store
 
 import ansibullbot.constants as C
 
@@ -34,44 +33,10 @@ class HistoryWrapper(object):
         self.maincache = cachedir
         self._waffled_labels = None
 
-        if issue.repo.repo_path not in cachedir and 'issues' not in cachedir:
-            self.cachefile = os.path.join(
-                self.maincache,
-                issue.repo.repo_path,
-                'issues',
-                str(issue.instance.number),
-                'history.pickle'
-            )
-        elif issue.repo.repo_path not in cachedir:
-            self.cachefile = os.path.join(
-                self.maincache,
-                issue.repo.repo_path,
-                'issues',
-                str(issue.instance.number),
-                'history.pickle'
-            )
-        elif 'issues' not in cachedir:
-            self.cachefile = os.path.join(
-                self.maincache,
-                'issues',
-                str(issue.instance.number),
-                'history.pickle'
-            )
-        else:
-            self.cachefile = os.path.join(
-                self.maincache,
-                str(issue.instance.number),
-                'history.pickle'
-            )
-
-        self.cachedir = os.path.dirname(self.cachefile)
-        if 'issues' not in self.cachedir:
-            logging.error(self.cachedir)
-            if C.DEFAULT_BREAKPOINTS:
-                logging.error('breakpoint!')
-                import epdb; epdb.st()
-            else:
-                raise Exception('')
+        self.store = get_cache_store(
+            cachedir,
+            repo_path=issue.repo.repo_path
+        )
 
         if not usecache:
             self.history = self.process()
@@ -106,31 +71,26 @@ class HistoryWrapper(object):
         return self.issue.repo.gh.get_rate_limit()
 
     def _load_cache(self):
-        if not os.path.isdir(self.cachedir):
-            os.makedirs(self.cachedir)
-        if not os.path.isfile(self.cachefile):
-            logging.info('!%s' % self.cachefile)
+        (updated_at, history) = self.store.get(
+            self.issue.repo.repo_path,
+            self.issue.instance.number,
+            'history'
+        )
+        if history is None:
+            logging.info('!history %s' % self.issue.instance.number)
             return None
-        try:
-            with open(self.cachefile, 'rb') as f:
-                cachedata = pickle.load(f)
-        except Exception as e:
-            logging.debug(e)
-            logging.info('%s failed to load' % self.cachefile)
-            cachedata = None
-        return cachedata
+        return {'updated_at': updated_at, 'history': history}
 
     def _dump_cache(self):
-        if not os.path.isdir(self.cachedir):
-            os.makedirs(self.cachedir)
-
         # keep the timestamp
-        cachedata = {'updated_at': self.issue.instance.updated_at,
-                     'history': self.history}
-
         try:
-            with open(self.cachefile, 'wb') as f:
-                pickle.dump(cachedata, f)
+            self.store.put(
+                self.issue.repo.repo_path,
+                self.issue.instance.number,
+                'history',
+                self.history,
+                updated_at=self.issue.instance.updated_at
+            )
         except Exception as e:
             logging.error(e)
             if C.DEFAULT_BREAKPOINTS:
@@ -479,11 +439,13 @@ class HistoryWrapper(object):
             if 'boilerplate:' in comment['body']:
                 lines = [x for x in comment['body'].split('\n')
                          if x.strip() and 'boilerplate:' in x]
-                bp = lines[0].split()[2]
-                if dates:
-                    boilerplates.append((comment['created_at'], bp))
-                else:
-                    boilerplates.append(bp)
+                # coalesced comments carry several boilerplates
+                for line in lines:
+                    bp = line.split()[2]
+                    if dates:
+                        boilerplates.append((comment['created_at'], bp))
+                    else:
+                        boilerplates.append(bp)
         return boilerplates
 
     def get_boilerplate_comments_content(self, botname='ansibot', bfilter=None):
@@ -495,9 +457,9 @@ class HistoryWrapper(object):
             if 'boilerplate:' in comment['body']:
                 lines = [x for x in comment['body'].split('\n')
                          if x.strip() and 'boilerplate:' in x]
-                bp = lines[0].split()[2]
+                bps = [x.split()[2] for x in lines]
                 if bfilter:
-                    if bp == bfilter:
+                    if bfilter in bps:
                         boilerplates.append(comment['body'])
                 else:
                     boilerplates.append(comment['body'])
@@ -2,6 +2,7 @@
 
 # $ curl -v -X POST --header "Content-Type: application/json" -d@summaries.json 'http://localhost:5001/summaries?user=ansible&repo=ansible'
 
+import hashlib
 import json
 
 from flask import Flask
@@ -9,53 +10,183 @@ from flask import jsonify
 from flask import request
 from flask_pymongo import PyMongo
 from pprint import pprint
+from pymongo import ASCENDING
+from pymongo import ReplaceOne
+from pymongo import UpdateOne
+from pymongo.errors import DuplicateKeyError
+from pymongo.errors import OperationFailure
 from werkzeug.exceptions import BadRequest
 
 app = Flask(__name__)
 app.config['MONGO_DBNAME'] = 'ansibot_reciever'
 mongo = PyMongo(app)
 
+COLLECTIONS = ['summaries', 'metadata']
 
-def get_summary_numbers_for_repo(org, repo):
-    pipeline = [
-        {'$match': {'github_org': org, 'github_repo': repo}},
-        {'$project': {'_id': 0, 'number': 1}}
-    ]
+# one document per issue in every collection
+DOCUMENT_KEY = [
+    ('github_org', ASCENDING),
+    ('github_repo', ASCENDING),
+    ('github_number', ASCENDING),
+]
+
+# duplicate ids removed per round trip by the dedupe
+DEDUPE_BATCH_SIZE = 1000
+
+
+def get_content_hash(content):
+    return hashlib.sha1(json.dumps(content, sort_keys=True)).hexdigest()
+
+
+def backfill_github_number(collection):
+    '''Copy number into github_number on documents that lack it'''
+    cursor = collection.find(
+        {'github_number': None, 'number': {'$ne': None}},
+        {'number': 1}
+    )
+    operations = []
+    for res in cursor:
+        operations.append(
+            UpdateOne(
+                {'_id': res['_id']},
+                {'$set': {'github_number': res['number']}}
+            )
+        )
+        if len(operations) >= DEDUPE_BATCH_SIZE:
+            collection.bulk_write(operations, ordered=False)
+            operations = []
+    if operations:
+        collection.bulk_write(operations, ordered=False)
+
+
+def dedupe_collection(collection):
+    '''Keep the oldest document per issue, streaming over the keys'''
+    # the unique index is on github_number, older documents only have
+    # number and must sort and group with the newer ones
+    backfill_github_number(collection)
+    cursor = collection.find(
+        {},
+        {'github_org': 1, 'github_repo': 1, 'github_number': 1}
+    ).sort(DOCUMENT_KEY + [('_id', ASCENDING)])
+
+    removed = 0
+    previous = None
+    duplicates = []
+    for res in cursor:
+        key = (
+            res.get('github_org'),
+            res.get('github_repo'),
+            res.get('github_number')
+        )
+        if key == previous:
+            duplicates.append(res['_id'])
+            if len(duplicates) >= DEDUPE_BATCH_SIZE:
+                removed += collection.delete_many(
+                    {'_id': {'$in': duplicates}}
+                ).deleted_count
+                duplicates = []
+        previous = key
+
+    if duplicates:
+        removed += collection.delete_many(
+            {'_id': {'$in': duplicates}}
+        ).deleted_count
+
+    return removed
+
+
+def ensure_indexes(db):
+    for cname in COLLECTIONS:
+        try:
+            db[cname].create_index(DOCUMENT_KEY, unique=True)
+        except (DuplicateKeyError, OperationFailure):
+            # older databases have duplicates, clear them and retry
+            dedupe_collection(db[cname])
+            db[cname].create_index(DOCUMENT_KEY, unique=True)
+
+
+def bulk_upsert(collection, org, repo, content):
+    '''Upsert a dict of number: document in one round trip
+
+    Documents carry a hash of the posted content, anything whose hash
+    matches the stored one is skipped without being sent to mongo.
+    '''
+
+    res = {
+        'inserted': 0,
+        'replaced': 0,
+        'skipped': 0
+    }
+
+    documents = {}
+    for k,v in content.items():
+        number = int(k)
+        data = v.copy()
+        data['github_org'] = org
+        data['github_repo'] = repo
+        data['github_number'] = number
+        data['number'] = number
+        data['content_hash'] = get_content_hash(v)
+        documents[number] = data
+
+    if not documents:
+        return res
+
+    # the stored hashes for every posted number
+    cursor = collection.find(
+        {
+            'github_org': org,
+            'github_repo': repo,
+            'github_number': {'$in': list(documents.keys())}
+        },
+        {'_id': 0, 'github_number': 1, 'content_hash': 1}
+    )
+    known = dict((x['github_number'], x.get('content_hash')) for x in cursor)
+
+    operations = []
+    for number,data in documents.items():
+        if number not in known:
+            res['inserted'] += 1
+        elif known[number] == data['content_hash']:
+            res['skipped'] += 1
+            continue
+        else:
+            res['replaced'] += 1
+        operations.append(
+            ReplaceOne(
+                {'github_org': org, 'github_repo': repo, 'github_number': number},
+                data,
+                upsert=True
+            )
+        )
+
+    if operations:
+        collection.bulk_write(operations, ordered=False)
 
-    cursor = mongo.db.summaries.aggregate(pipeline)
-    res = list(cursor)
-    res = [x['number'] for x in res]
     return res
 
 
+def find_documents(collection, org, repo, number=None):
+    query = {'github_org': org, 'github_repo': repo}
+    if number:
+        query['github_number'] = number
+    cursor = collection.find(query, {'_id': 0, 'content_hash': 0})
+    return [dict(x) for x in cursor]
+
+
+@app.before_first_request
+def setup_indexes():
+    ensure_indexes(mongo.db)
+
+
 @app.route('/dedupe', methods=['GET'])
 def dedupe_summaries():
 
-    # summaries
-    cursor = mongo.db.summaries.find()
-    results = list(cursor)
-    summaries = {}
-    for res in results:
-        gn = res.get('github_number') or res.get('number')
-        key = '%s-%s-%s' % (res['github_org'], res['github_repo'], gn)
-        if key not in summaries:
-            summaries[key] = res
-        else:
-            mongo.db.summaries.remove(res)
-
-    # metadata
-    cursor = mongo.db.metadata.find()
-    results = list(cursor)
-    metadata = {}
-    for res in results:
-        gn = res.get('github_number') or res.get('number')
-        key = '%s-%s-%s' % (res['github_org'], res['github_repo'], gn)
-        if key not in metadata:
-            metadata[key] = res
-        else:
-            mongo.db.metadata.remove(res)
+    res = {'result': 'ok'}
+    for cname in COLLECTIONS:
+        res[cname] = dedupe_collection(mongo.db[cname])
 
-    return jsonify({'result': 'ok'})
+    return jsonify(res)
 
 
 @app.route('/metadata', methods=['GET', 'POST'])
@@ -68,50 +199,28 @@ def metadata():
     if number:
         number = int(number)
 
-    if not username or not reponame or not number:
-        raise BadRequest('user and repo and number must be supplied as parameters')
+    if not username or not reponame:
+        raise BadRequest('user and repo must be supplied as parameters')
 
     if request.method == 'POST':
 
-        res = {'result': None}
-
         content = request.get_json()
-        data = content.copy()
-        data['github_org'] = username
-        data['github_repo'] = reponame
-        data['github_number'] = number
-        data['number'] = number
 
-        # get the existing document
-        doc = mongo.db.metadata.find_one(
-            {'github_org': username, 'github_repo': reponame, 'github_number': number}
-        )
-
-        if not doc:
-            mongo.db.metadata.insert_one(data)
-            res['result'] = 'inserted'
-        else:
-            # compare it
-            cdict = dict(doc)
-            cdict.pop('_id', None)
-            if cdict == data:
-                res['result'] = 'skipped'
-            else:
-                mongo.db.metadata.replace_one(doc, data)
-                res['result'] = 'replaced'
+        if number:
+            res = bulk_upsert(
+                mongo.db.metadata, username, reponame, {number: content}
+            )
+            return jsonify({'result': [k for k,v in res.items() if v][0]})
 
+        # bulk form, a dict of number: metadata
+        res = bulk_upsert(mongo.db.metadata, username, reponame, content)
         return jsonify(res)
 
     elif request.method == 'GET':
-        # get the existing document
-        cursor = mongo.db.metadata.find(
-            {'github_org': username, 'github_repo': reponame, 'github_number': number}
-        )
-        docs = list(cursor)
-        docs = [dict(x) for x in docs]
-        for idx,x in enumerate(docs):
-            x.pop('_id', None)
-            docs[idx] = x
+        if not number:
+            raise BadRequest('number must be supplied as a parameter')
+
+        docs = find_documents(mongo.db.metadata, username, reponame, number)
         return jsonify(docs)
 
     return ""
@@ -133,78 +242,13 @@ def summaries():
 
     if request.method == 'POST':
         content = request.get_json()
-        res = {
-            'inserted': 0,
-            'replaced': 0,
-            'skipped': 0
-        }
-
-        # make list of known numbers for namespace/repo
-        known = get_summary_numbers_for_repo(username, reponame)
-        print('total known: %s' % len(known))
-
-        # group by missing or needs evaluation
-        to_insert = []
-        to_inspect = []
-        for k,v in content.items():
-
-            if v['number'] not in known:
-                to_insert.append(k)
-            else:
-                to_inspect.append(k)
-
-        # uniqify
-        to_insert = sorted(set(to_insert))
-        to_inspect = sorted(set(to_inspect))
-
-        # bulk insert
-        if to_insert:
-            documents = []
-            for x in to_insert:
-                data = content[x].copy()
-                data['github_org'] = username
-                data['github_repo'] = reponame
-                data['github_number'] = data['number']
-                documents.append(data)
-
-            mongo.db.summaries.insert_many(documents)
-            res['inserted'] += len(documents)
-
-        # incremental inspect and replace
-        if to_inspect:
-            for x in to_inspect:
-                data = content[x].copy()
-                data['github_org'] = username
-                data['github_repo'] = reponame
-                data['github_number'] = data['number']
-
-                # get the existing document
-                doc = mongo.db.summaries.find_one(
-                    {'github_org': username, 'github_repo': reponame, 'number': data['number']}
-                )
-                # compare it
-                cdict = dict(doc)
-                cdict.pop('_id', None)
-                if cdict == data:
-                   #print('skip %s' % x)
-                    res['skipped'] += 1
-                else:
-                    #print('replace %s' % x)
-                    mongo.db.summaries.replace_one(doc, data)
-                    res['replaced'] += 1
-
+        # summaries are keyed by the number they carry
+        content = dict((v['number'], v) for v in content.values())
+        res = bulk_upsert(mongo.db.summaries, username, reponame, content)
         return jsonify(res)
 
     elif request.method == 'GET':
-        # get the existing document
-        cursor = mongo.db.summaries.find(
-            {'github_org': username, 'github_repo': reponame, 'number': number}
-        )
-        docs = list(cursor)
-        docs = [dict(x) for x in docs]
-        for idx,x in enumerate(docs):
-            x.pop('_id', None)
-            docs[idx] = x
+        docs = find_documents(mongo.db.summaries, username, reponame, number)
         return jsonify(docs)
 
     return 'summaries\n'
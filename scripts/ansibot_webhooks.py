@@ -0,0 +1,131 @@
+#!/usr/bin/env python
+
+# ansibot_webhooks.py - queue the issues github webhooks touch
+#
+#   Point a github webhook (content type application/json, with the
+#   secret from the [webhooks] section of ansibullbot.cfg) at
+#   http://<host>:5002/webhook and run the triager with --webhooks.
+#   Every delivery is checked against its X-Hub-Signature(-256), the
+#   issue or pullrequest it touches is put into the local webhook queue
+#   and the triager picks it up within seconds.
+#
+#   --record DIR keeps every verified delivery as a json file that
+#   scripts/replay_webhooks.py can send again.
+#
+#   python scripts/ansibot_webhooks.py [--port 5002] [--record DIR]
+
+import argparse
+import json
+import logging
+import os
+import sys
+
+from flask import Flask
+from flask import abort
+from flask import jsonify
+from flask import request
+
+# hack
+sys.path[0] = sys.path[0].replace('/scripts', '')
+import ansibullbot.constants as C
+from ansibullbot.utils.webhook_queue import WebhookQueue
+from ansibullbot.utils.webhook_queue import parse_event
+from ansibullbot.utils.webhook_queue import verify_signature
+
+
+# comments starting a line with one of these are triaged first
+COMMANDS = C.VALID_COMMANDS + C.PLUGIN_COMMANDS
+
+app = Flask(__name__)
+app.config['SECRET'] = C.DEFAULT_WEBHOOK_SECRET
+app.config['QUEUE'] = C.DEFAULT_WEBHOOK_QUEUE
+app.config['RECORD'] = None
+
+QUEUE = None
+
+
+def get_queue():
+    global QUEUE
+    if QUEUE is None:
+        QUEUE = WebhookQueue(app.config['QUEUE'])
+    return QUEUE
+
+
+def has_command(event, payload):
+    '''Does a new comment carry a bot command'''
+    if event != 'issue_comment' or payload.get('action') != 'created':
+        return False
+    body = payload.get('comment', {}).get('body') or ''
+    for line in body.splitlines():
+        words = line.strip().split()
+        if words and words[0] in COMMANDS:
+            return True
+    return False
+
+
+def record_delivery(event, delivery, body):
+    fn = os.path.join(app.config['RECORD'], '%s-%s.json' % (event, delivery))
+    with open(fn, 'wb') as f:
+        f.write(json.dumps({'event': event, 'delivery': delivery, 'body': body}))
+
+
+@app.route('/webhook', methods=['POST'])
+def webhook():
+    # the signature covers the raw bytes, not the parsed json
+    body = request.get_data()
+    signature = request.headers.get('X-Hub-Signature-256') or \
+        request.headers.get('X-Hub-Signature')
+    if not verify_signature(app.config['SECRET'], body, signature):
+        logging.warning('rejected delivery with a bad signature')
+        abort(403)
+
+    event = request.headers.get('X-GitHub-Event')
+    delivery = request.headers.get('X-GitHub-Delivery')
+    if event == 'ping':
+        return jsonify({'result': 'pong'})
+
+    if app.config['RECORD']:
+        record_delivery(event, delivery, body)
+
+    payload = json.loads(body)
+    # deliveries caused by the bot itself are not queued
+    target = parse_event(event, payload, botnames=C.BOTNAMES)
+    if not target:
+        return jsonify({'result': 'ignored'})
+
+    # the triager schedules these ahead of everything else
+    if has_command(event, payload):
+        event = 'command'
+
+    if get_queue().put(target[0], target[1], event, delivery=delivery):
+        logging.info('queued %s %s#%s' % (event, target[0], target[1]))
+        return jsonify({'result': 'queued'})
+    return jsonify({'result': 'duplicate'})
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=5002)
+    parser.add_argument('--queue', default=C.DEFAULT_WEBHOOK_QUEUE,
+                        help='sqlite file the triager reads')
+    parser.add_argument('--record',
+                        help='keep the verified deliveries in this dir')
+    args = parser.parse_args()
+
+    if not app.config['SECRET']:
+        logging.error('no webhook secret configured')
+        sys.exit(1)
+
+    app.config['QUEUE'] = args.queue
+    if args.record:
+        if not os.path.isdir(args.record):
+            os.makedirs(args.record)
+        app.config['RECORD'] = args.record
+
+    logging.basicConfig(level=logging.INFO)
+    app.run(host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
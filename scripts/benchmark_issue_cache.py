@@ -0,0 +1,235 @@
+#!/usr/bin/env python
+
+# benchmark_issue_cache.py - compare pickled pygithub caches to raw json
+#
+#   * Builds a synthetic cache of N issues (default 1000), each with its
+#     issue, comments and events, once the old way (a directory of
+#     pickled pygithub objects per issue) and once in the cache store
+#     (raw api data, rehydrated into RawObjects).
+#   * Reports disk usage, the time to load every issue and the resident
+#     memory the loaded issues take. Each load runs in a fresh process so
+#     the memory numbers don't bleed into each other.
+#
+#   python scripts/benchmark_issue_cache.py [issues] [comments] [events]
+
+import multiprocessing
+import os
+import pickle
+import resource
+import shutil
+import sys
+import tempfile
+import time
+
+import github
+from github.Issue import Issue
+from github.IssueComment import IssueComment
+from github.IssueEvent import IssueEvent
+
+# hack
+sys.path[0] = sys.path[0].replace('/scripts', '')
+from ansibullbot.utils.cache_store import CacheStore
+from ansibullbot.utils.raw_objects import to_raw_objects
+
+
+REPO = 'ansible/ansible'
+API = 'https://api.github.com/repos/' + REPO
+
+
+def get_user(idx):
+    login = 'user%s' % idx
+    return {
+        'login': login,
+        'id': idx,
+        'avatar_url': 'https://avatars.githubusercontent.com/u/%s?v=3' % idx,
+        'gravatar_id': '',
+        'url': 'https://api.github.com/users/' + login,
+        'html_url': 'https://github.com/' + login,
+        'followers_url': 'https://api.github.com/users/%s/followers' % login,
+        'repos_url': 'https://api.github.com/users/%s/repos' % login,
+        'events_url': 'https://api.github.com/users/%s/events{/privacy}' % login,
+        'type': 'User',
+        'site_admin': False,
+    }
+
+
+def get_issue(number):
+    return {
+        'id': 100000 + number,
+        'number': number,
+        'url': '%s/issues/%s' % (API, number),
+        'html_url': 'https://github.com/%s/issues/%s' % (REPO, number),
+        'comments_url': '%s/issues/%s/comments' % (API, number),
+        'events_url': '%s/issues/%s/events' % (API, number),
+        'title': 'synthetic issue %s' % number,
+        'body': '##### ISSUE TYPE\n - Bug Report\n' + 'lorem ipsum ' * 100,
+        'user': get_user(number % 50),
+        'labels': [{'name': 'bug_report', 'color': 'fc2929',
+                    'url': API + '/labels/bug_report'}],
+        'state': 'open',
+        'assignees': [],
+        'comments': 0,
+        'created_at': '2017-01-01T00:00:00Z',
+        'updated_at': '2017-06-01T00:00:00Z',
+        'closed_at': None,
+    }
+
+
+def get_comments(number, count):
+    return [{
+        'id': number * 1000 + idx,
+        'url': '%s/issues/comments/%s' % (API, number * 1000 + idx),
+        'html_url': 'https://github.com/%s/issues/%s#issuecomment-%s' %
+                    (REPO, number, number * 1000 + idx),
+        'issue_url': '%s/issues/%s' % (API, number),
+        'user': get_user(idx),
+        'body': 'comment %s ' % idx + 'lorem ipsum ' * 40,
+        'created_at': '2017-02-01T00:%02d:00Z' % (idx % 60),
+        'updated_at': '2017-02-01T00:%02d:00Z' % (idx % 60),
+    } for idx in range(count)]
+
+
+def get_events(number, count):
+    return [{
+        'id': number * 1000 + idx,
+        'url': '%s/issues/events/%s' % (API, number * 1000 + idx),
+        'actor': get_user(idx),
+        'event': 'labeled',
+        'label': {'name': 'needs_info', 'color': 'ededed'},
+        'commit_id': None,
+        'commit_url': None,
+        'created_at': '2017-03-01T00:%02d:00Z' % (idx % 60),
+    } for idx in range(count)]
+
+
+def build_pickles(cachedir, requester, numbers, ncomments, nevents):
+    for number in numbers:
+        idir = os.path.join(cachedir, 'issues', str(number))
+        os.makedirs(idir)
+        issue = Issue(requester, {}, get_issue(number), completed=True)
+        with open(os.path.join(idir, 'issue.pickle'), 'wb') as f:
+            pickle.dump(issue, f)
+        comments = [IssueComment(requester, {}, x, completed=False)
+                    for x in get_comments(number, ncomments)]
+        with open(os.path.join(idir, 'comments.pickle'), 'wb') as f:
+            pickle.dump([issue.updated_at, comments], f)
+        events = [IssueEvent(requester, {}, x, completed=False)
+                  for x in get_events(number, nevents)]
+        with open(os.path.join(idir, 'events.pickle'), 'wb') as f:
+            pickle.dump([issue.updated_at, events], f)
+
+
+def build_store(dbfile, numbers, ncomments, nevents):
+    store = CacheStore(dbfile)
+    for number in numbers:
+        rdata = get_issue(number)
+        store.put(REPO, number, 'issue', {'raw_data': rdata, 'headers': {}})
+        store.put(REPO, number, 'comments', get_comments(number, ncomments))
+        store.put(REPO, number, 'events', get_events(number, nevents))
+
+
+def load_pickles(cachedir, numbers):
+    loaded = []
+    for number in numbers:
+        idir = os.path.join(cachedir, 'issues', str(number))
+        for fn in ['issue.pickle', 'comments.pickle', 'events.pickle']:
+            with open(os.path.join(idir, fn), 'rb') as f:
+                loaded.append(pickle.load(f))
+    return loaded
+
+
+def load_store(dbfile, gh, numbers):
+    store = CacheStore(dbfile)
+    loaded = []
+    for number in numbers:
+        rdata = store.get(REPO, number, 'issue')[1]
+        loaded.append(gh.create_from_raw_data(
+            Issue, rdata['raw_data'], headers=rdata['headers']
+        ))
+        for kind in ['comments', 'events']:
+            loaded.append(to_raw_objects(store.get(REPO, number, kind)[1]))
+    return loaded
+
+
+def touch(loaded):
+    '''Read the attributes the triager reads'''
+    for x in loaded:
+        if isinstance(x, list) and len(x) == 2 and isinstance(x[1], list):
+            x = x[1]
+        if not isinstance(x, list):
+            x.title
+            continue
+        for y in x:
+            if hasattr(y, 'body'):
+                (y.user.login, y.body, y.created_at)
+            else:
+                (y.actor.login, y.event, y.created_at, y.label)
+
+
+def measure(func, args, queue):
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.time()
+    loaded = func(*args)
+    touch(loaded)
+    elapsed = time.time() - start
+    used = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss
+    queue.put((elapsed, used))
+
+
+def run(func, args):
+    queue = multiprocessing.Queue()
+    proc = multiprocessing.Process(target=measure, args=(func, args, queue))
+    proc.start()
+    result = queue.get()
+    proc.join()
+    return result
+
+
+def disk_usage(path):
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    total = 0
+    for root, dirs, files in os.walk(path):
+        total += sum(os.path.getsize(os.path.join(root, x)) for x in files)
+    return total
+
+
+def main():
+    nissues = 1000
+    ncomments = 10
+    nevents = 15
+    if len(sys.argv) > 1:
+        nissues = int(sys.argv[1])
+    if len(sys.argv) > 2:
+        ncomments = int(sys.argv[2])
+    if len(sys.argv) > 3:
+        nevents = int(sys.argv[3])
+
+    numbers = range(1, nissues + 1)
+    gh = github.Github('fake-token')
+    requester = gh._Github__requester
+
+    tmpdir = tempfile.mkdtemp()
+    try:
+        picklesdir = os.path.join(tmpdir, 'pickles')
+        dbfile = os.path.join(tmpdir, 'cache.sqlite')
+        build_pickles(picklesdir, requester, numbers, ncomments, nevents)
+        build_store(dbfile, numbers, ncomments, nevents)
+
+        print('%s issues, %s comments and %s events each' %
+              (nissues, ncomments, nevents))
+        print('%-24s %10s %10s %10s' % ('', 'disk KB', 'load s', 'rss KB'))
+        for (name, path, func, args) in [
+                ('pickled pygithub', picklesdir, load_pickles,
+                 (picklesdir, numbers)),
+                ('raw json store', dbfile, load_store,
+                 (dbfile, gh, numbers))]:
+            (elapsed, used) = run(func, args)
+            print('%-24s %10d %10.2f %10d' %
+                  (name, disk_usage(path) / 1024, elapsed, used))
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+if __name__ == "__main__":
+    main()
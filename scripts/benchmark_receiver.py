@@ -0,0 +1,123 @@
+#!/usr/bin/env python
+
+# benchmark_receiver.py - per document upserts vs the bulk upsert path
+#
+#   * Posts N synthetic summaries (default 1000) to the receiver's
+#     storage layer three times: an initial load, an unchanged repost and
+#     a repost where 10% of the summaries changed.
+#   * The old path (find_one + compare + replace_one per document) is
+#     reimplemented here so both run against the same database.
+#   * Uses mongomock unless a mongodb url is given, mongomock has no
+#     network round trips and checks unique indexes with a full scan,
+#     so the initial load favours the per document path there. A real
+#     mongod shows the round trip savings.
+#
+#   python scripts/benchmark_receiver.py [summaries] [mongodb://host:port]
+
+import os
+import sys
+import time
+
+# the receiver lives next to this script
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from ansibot_receiver import bulk_upsert
+from ansibot_receiver import dedupe_collection
+from ansibot_receiver import ensure_indexes
+
+
+ORG = 'ansible'
+REPO = 'ansible'
+
+
+def get_db(url=None):
+    if url:
+        import pymongo
+        client = pymongo.MongoClient(url)
+        client.drop_database('ansibot_receiver_benchmark')
+        return client['ansibot_receiver_benchmark']
+    import mongomock
+    return mongomock.MongoClient()['ansibot_receiver_benchmark']
+
+
+def get_summaries(count, changed=0):
+    summaries = {}
+    for idx in range(1, count + 1):
+        updated_at = '2017-06-01T00:00:00'
+        if idx <= changed:
+            updated_at = '2017-07-01T00:00:00'
+        summaries[str(idx)] = {
+            'number': idx,
+            'state': 'open',
+            'type': 'pullrequest' if idx % 2 else 'issue',
+            'title': 'issue %s' % idx,
+            'labels': ['bug_report', 'module'],
+            'updated_at': updated_at,
+        }
+    return summaries
+
+
+def legacy_upsert(collection, org, repo, content):
+    '''The receiver's original one document at a time path'''
+    res = {'inserted': 0, 'replaced': 0, 'skipped': 0}
+    for k,v in content.items():
+        data = v.copy()
+        data['github_org'] = org
+        data['github_repo'] = repo
+        data['github_number'] = data['number']
+        doc = collection.find_one(
+            {'github_org': org, 'github_repo': repo, 'number': data['number']}
+        )
+        if not doc:
+            collection.insert_one(data)
+            res['inserted'] += 1
+            continue
+        cdict = dict(doc)
+        cdict.pop('_id', None)
+        if cdict == data:
+            res['skipped'] += 1
+        else:
+            collection.replace_one(doc, data)
+            res['replaced'] += 1
+    return res
+
+
+def run(name, func, collection, rounds):
+    print('%s' % name)
+    for (label, content) in rounds:
+        start = time.time()
+        res = func(collection, ORG, REPO, content)
+        print('  %-10s %8.3fs  %s' % (label, time.time() - start, res))
+
+
+def main():
+    count = 1000
+    url = None
+    if len(sys.argv) > 1:
+        count = int(sys.argv[1])
+    if len(sys.argv) > 2:
+        url = sys.argv[2]
+
+    rounds = [
+        ('initial', get_summaries(count)),
+        ('unchanged', get_summaries(count)),
+        ('10% new', get_summaries(count, changed=count // 10)),
+    ]
+
+    db = get_db(url)
+    run('per document', legacy_upsert, db.legacy, rounds)
+
+    ensure_indexes(db)
+    run('bulk upsert', bulk_upsert, db.summaries, rounds)
+
+    # the dedupe over a collection with every document posted twice
+    db.duplicated.insert_many(
+        [dict(v, github_org=ORG, github_repo=REPO, github_number=v['number'])
+         for x in range(2) for v in get_summaries(count).values()]
+    )
+    start = time.time()
+    removed = dedupe_collection(db.duplicated)
+    print('dedupe       %8.3fs  %s removed' % (time.time() - start, removed))
+
+
+if __name__ == '__main__':
+    main()
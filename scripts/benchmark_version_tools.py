@@ -0,0 +1,133 @@
+#!/usr/bin/env python
+
+# benchmark_version_tools.py - time ansible version parsing and validation
+#
+#   * Feeds the "ansible version" sections of the issue fixtures used by the
+#     template extractor tests through strip_ansible_version and
+#     is_valid_version, the same way the triager does for every issue.
+#   * Uses a synthetic VALIDVERSIONS so no ansible checkout is needed.
+#
+#   python scripts/benchmark_version_tools.py [iterations]
+
+import glob
+import os
+import sys
+import timeit
+
+import yaml
+
+# hack
+sys.path[0] = sys.path[0].replace('/scripts', '')
+from ansibullbot.utils.extractors import SECTIONS
+from ansibullbot.utils.extractors import extract_template_data
+from ansibullbot.utils.version_tools import AnsibleVersionIndexer
+
+
+FIXTURES = os.path.join(sys.path[0], 'tests', 'fixtures')
+
+# version strings from tests/unit/utils/test_template_extractor.py
+EXTRA_VERSIONS = [
+    '1.9.x',
+    '\n'.join([
+        '```',
+        'ansible 2.2.1.0',
+        '  config file = /home/kellerfuchs/hashbang/admin-tools/ansible.cfg',
+        '  configured module search path = Default w/o overrides',
+        '```',
+    ]),
+]
+
+
+def get_versions():
+    '''Branch and tag names roughly the size of ansible's'''
+    versions = {'2.4.0': 'devel'}
+    for major in range(1, 3):
+        for minor in range(0, 10):
+            versions['%s.%s' % (major, minor)] = 'branch'
+            for patch in range(0, 6):
+                vstring = '%s.%s.%s' % (major, minor, patch)
+                versions[vstring] = 'tag'
+                versions[vstring + '.0-1'] = 'tag'
+                versions[vstring + '-0.1.rc1'] = 'tag'
+    return versions
+
+
+def get_rawtexts():
+    rawtexts = EXTRA_VERSIONS[:]
+    for fn in sorted(glob.glob(os.path.join(FIXTURES, '*.yml'))):
+        with open(fn, 'rb') as f:
+            ydata = yaml.load(f.read())
+        if not ydata or not ydata.get('body'):
+            continue
+        tdata = extract_template_data(
+            ydata['body'],
+            issue_number=ydata.get('number', 1),
+            issue_class='issue',
+            SECTIONS=SECTIONS
+        )
+        if tdata.get('ansible version'):
+            rawtexts.append(tdata['ansible version'])
+    return rawtexts
+
+
+def linear_is_valid_version(versions, version):
+    '''is_valid_version before the trie'''
+    if not version:
+        return False
+    if version in versions:
+        return True
+    for k in sorted(set(versions.keys())):
+        if k.startswith(version) or version.startswith(k):
+            return True
+    return False
+
+
+def main():
+    iterations = 1000
+    if len(sys.argv) > 1:
+        iterations = int(sys.argv[1])
+
+    avi = AnsibleVersionIndexer.__new__(AnsibleVersionIndexer)
+    avi.VALIDVERSIONS = get_versions()
+    avi._index_versions()
+
+    rawtexts = get_rawtexts()
+    parsed = [avi.strip_ansible_version(x) for x in rawtexts]
+    parsed = [x for x in parsed if x] + ['2.5', '3.0', 'foo']
+
+    print('%s version strings, %s known versions, %s iterations' %
+          (len(rawtexts), len(avi.VALIDVERSIONS), iterations))
+
+    def strip_uncached():
+        for x in rawtexts:
+            avi._strip_ansible_version(x.replace('`', '').strip().lower())
+
+    def strip_cached():
+        for x in rawtexts:
+            avi.strip_ansible_version(x)
+
+    def validate_linear():
+        for x in parsed:
+            linear_is_valid_version(avi.VALIDVERSIONS, x)
+
+    def validate_trie():
+        for x in parsed:
+            avi.is_valid_version(x)
+
+    for name, func in [('strip_ansible_version (uncached)', strip_uncached),
+                       ('strip_ansible_version (memoised)', strip_cached),
+                       ('is_valid_version (linear scan)', validate_linear),
+                       ('is_valid_version (trie)', validate_trie)]:
+        # keep the parser's diagnostic prints out of the way
+        stdout = sys.stdout
+        sys.stdout = open(os.devnull, 'w')
+        try:
+            elapsed = timeit.timeit(func, number=iterations)
+        finally:
+            sys.stdout.close()
+            sys.stdout = stdout
+        print('%-34s %8.2f ms' % (name, elapsed * 1000))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+#!/usr/bin/env python
+
+# replay_webhooks.py - send recorded webhook deliveries to a receiver
+#
+#   Takes the json files written by ansibot_webhooks.py --record and
+#   posts them, signed with the configured secret, the way github would.
+#   Useful for testing the receiver and the triager's --webhooks mode
+#   against a local server.
+#
+#   The recorded delivery ids are kept, so the receiver drops replays of
+#   deliveries it already queued. --fresh sends them as new deliveries.
+#
+#   python scripts/replay_webhooks.py [--fresh] URL FILE...
+
+import argparse
+import json
+import sys
+import uuid
+
+import requests
+
+# hack
+sys.path[0] = sys.path[0].replace('/scripts', '')
+import ansibullbot.constants as C
+from ansibullbot.utils.webhook_queue import get_signature
+
+
+def replay(url, fn, secret, fresh=False):
+    with open(fn, 'rb') as f:
+        recorded = json.loads(f.read())
+    body = recorded['body'].encode('utf-8')
+    delivery = recorded['delivery']
+    if fresh:
+        delivery = str(uuid.uuid4())
+    headers = {
+        'Content-Type': 'application/json',
+        'X-GitHub-Event': recorded['event'],
+        'X-GitHub-Delivery': delivery,
+        'X-Hub-Signature-256': get_signature(secret, body),
+    }
+    rr = requests.post(url, data=body, headers=headers)
+    return (rr.status_code, rr.text.strip())
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--fresh', action='store_true',
+                        help='send with new delivery ids')
+    parser.add_argument('url')
+    parser.add_argument('files', nargs='+')
+    args = parser.parse_args()
+
+    for fn in args.files:
+        (status, text) = replay(
+            args.url,
+            fn,
+            C.DEFAULT_WEBHOOK_SECRET,
+            fresh=args.fresh
+        )
+        print('%s %s %s' % (fn, status, text))
+
+
+if __name__ == '__main__':
+    main()
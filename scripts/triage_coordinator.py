@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+
+# triage_coordinator.py - run several triage workers on this host
+#
+#   Starts N triage_ansible.py processes, each with its own --worker_id
+#   and logfile, and restarts any that exit. The workers split the
+#   issues between them through the lease store in the [sharding]
+#   section of ansibullbot.cfg, workers on other hosts join the same
+#   split when they point at a shared lease store backend.
+#
+#   Everything after -- is passed to every worker.
+#
+#   python scripts/triage_coordinator.py --workers 4 -- --daemonize --force
+
+import argparse
+import logging
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+
+
+TRIAGE = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    'triage_ansible.py'
+)
+
+# a worker that dies sooner than this is restarted with a delay
+MIN_UPTIME = 60
+
+STOPPING = False
+
+
+def stop(signum, frame):
+    global STOPPING
+    STOPPING = True
+
+
+def get_command(worker_id, triage_args, logdir):
+    cmd = [sys.executable, TRIAGE, '--worker_id', worker_id]
+    if '--logfile' not in triage_args:
+        cmd += [
+            '--logfile',
+            os.path.join(logdir, 'ansibullbot.%s.log' % worker_id)
+        ]
+    return cmd + triage_args
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--prefix', default=socket.gethostname(),
+                        help='worker ids are <prefix>-<n>')
+    parser.add_argument('--logdir', default='/var/log',
+                        help='where each worker logs to')
+    parser.add_argument('triage_args', nargs=argparse.REMAINDER)
+    args = parser.parse_args()
+
+    triage_args = args.triage_args
+    if triage_args and triage_args[0] == '--':
+        triage_args = triage_args[1:]
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s %(levelname)s %(message)s'
+    )
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    # worker_id -> [process, started]
+    workers = {}
+    for idx in range(args.workers):
+        workers['%s-%s' % (args.prefix, idx)] = [None, 0]
+
+    while not STOPPING:
+        for worker_id,worker in sorted(workers.items()):
+            if worker[0] and worker[0].poll() is None:
+                continue
+            if worker[0]:
+                logging.warning(
+                    '%s exited with %s' % (worker_id, worker[0].returncode)
+                )
+                worker[0] = None
+            # don't spin on a worker that fails at startup
+            if time.time() - worker[1] < MIN_UPTIME:
+                continue
+            cmd = get_command(worker_id, triage_args, args.logdir)
+            logging.info('starting %s' % ' '.join(cmd))
+            worker[0] = subprocess.Popen(cmd)
+            worker[1] = time.time()
+        time.sleep(5)
+
+    logging.info('stopping workers')
+    for worker in workers.values():
+        if worker[0] and worker[0].poll() is None:
+            worker[0].terminate()
+    for worker in workers.values():
+        if worker[0]:
+            worker[0].wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,30 @@
+#!/usr/bin/env python
+
+import os
+import unittest
+
+from ansibullbot.constants import get_config
+
+
+class TestGetConfig(unittest.TestCase):
+
+    def test_list(self):
+        value = get_config(
+            None, 'defaults', 'write_limits', None, '20:60,450:3600',
+            value_type='list'
+        )
+        assert value == ['20:60', '450:3600']
+
+        os.environ['ANSIBULLBOT_TEST_TOKENS'] = 'abc, def'
+        try:
+            value = get_config(
+                None, 'defaults', 'tokens', 'ANSIBULLBOT_TEST_TOKENS', '',
+                value_type='list'
+            )
+        finally:
+            del os.environ['ANSIBULLBOT_TEST_TOKENS']
+        assert value == ['abc', 'def']
+
+        assert get_config(
+            None, 'defaults', 'tokens', None, '', value_type='list'
+        ) == ''
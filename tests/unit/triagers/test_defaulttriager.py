@@ -0,0 +1,217 @@
+#!/usr/bin/env python
+
+import argparse
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from github import Github
+
+import ansibullbot.constants as C
+from ansibullbot.triagers.defaulttriager import DefaultTriager
+from ansibullbot.utils.action_journal import ActionJournal
+
+
+class TestWriteBehindConnections(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.saved = (
+            C.DEFAULT_PREFETCH_ISSUES,
+            C.DEFAULT_WRITE_BEHIND,
+            C.DEFAULT_CONDITIONAL_REQUESTS,
+            C.DEFAULT_ACTION_JOURNAL
+        )
+        C.DEFAULT_PREFETCH_ISSUES = 0
+        C.DEFAULT_WRITE_BEHIND = True
+        C.DEFAULT_CONDITIONAL_REQUESTS = False
+        C.DEFAULT_ACTION_JOURNAL = os.path.join(self.tmpdir, 'actions.sqlite')
+
+    def tearDown(self):
+        (
+            C.DEFAULT_PREFETCH_ISSUES,
+            C.DEFAULT_WRITE_BEHIND,
+            C.DEFAULT_CONDITIONAL_REQUESTS,
+            C.DEFAULT_ACTION_JOURNAL
+        ) = self.saved
+        shutil.rmtree(self.tmpdir)
+
+    def get_triager(self, **kwargs):
+        # skip __init__, it reads the config and connects
+        triager = DefaultTriager.__new__(DefaultTriager)
+        triager.args = argparse.Namespace(**kwargs)
+        triager.cachedir_base = self.tmpdir
+        return triager
+
+    def test_executor_gets_its_own_connection(self):
+        triager = self.get_triager(
+            force=True,
+            daemonize=True,
+            dry_run=False,
+            worker_id=None
+        )
+        assert triager.use_write_behind()
+        # what _connect does on every (re)connect
+        triager.gh = Github(login_or_token='token')
+        triager.install_connection_hooks(triager.gh)
+        requester = triager.gh._Github__requester
+        assert requester._thread_connections is not None
+
+        requester._thread_connections = None
+        triager.start_action_executor()
+        try:
+            assert requester._thread_connections is not None
+        finally:
+            triager.executor.stop(timeout=5)
+
+    def test_shared_connection_without_threads(self):
+        triager = self.get_triager(force=False, daemonize=True)
+        assert not triager.use_write_behind()
+        gh = Github(login_or_token='token')
+        triager.install_connection_hooks(gh)
+        assert getattr(
+            gh._Github__requester, '_thread_connections', None
+        ) is None
+
+    def test_replay_after_restart(self):
+        # written out by the last run of the bot
+        ActionJournal(C.DEFAULT_ACTION_JOURNAL).put(
+            'ansible/ansible', 1, 'rebuild', 123
+        )
+
+        triager = self.get_triager(
+            force=True,
+            daemonize=True,
+            dry_run=False,
+            worker_id=None
+        )
+        triager.gh = Github(login_or_token='token')
+        triager.ghw = FakeGithubWrapper()
+        triager.repos = {}
+        triager.SR = FakeShippableRuns()
+        triager.start_action_executor()
+        try:
+            for x in range(50):
+                if triager.SR.rebuilt:
+                    break
+                time.sleep(0.05)
+        finally:
+            triager.executor.stop(timeout=5)
+        assert triager.SR.rebuilt == [123]
+        # the triage thread owns the collected repos
+        assert triager.repos == {}
+
+
+class FakeIssue(object):
+    number = 1
+    html_url = 'https://github.com/ansible/ansible/issues/1'
+
+
+class FakeRepo(object):
+
+    def get_issue(self, number):
+        return FakeIssue()
+
+
+class FakeGithubWrapper(object):
+
+    def get_repo(self, repo_path, verbose=True):
+        return FakeRepo()
+
+
+class FakeShippableRuns(object):
+
+    def __init__(self):
+        self.rebuilt = []
+
+    def rebuild(self, run_number):
+        self.rebuilt.append(run_number)
+
+
+class Issue(object):
+    '''Labels and assignees of an issue, records the writes'''
+
+    def __init__(self, labels, assignees):
+        self.labels = labels
+        self.assignees = assignees
+        self.writes = []
+        self.updates = 0
+        self.instance = self
+
+    def update(self):
+        self.updates += 1
+
+    def get_labels(self):
+        return [x for x in self.labels]
+
+    def get_assignees(self):
+        return [x for x in self.assignees]
+
+    def set_labels(self, labels):
+        self.writes.append(('labels', labels))
+        self.labels = labels
+
+    def set_assignees(self, assignees):
+        self.writes.append(('assignees', assignees))
+        self.assignees = assignees
+
+
+class TestActionCalls(unittest.TestCase):
+
+    def get_actions(self, **kwargs):
+        actions = {
+            'comments': [],
+            'close': False,
+            'close_migrated': False,
+            'newlabel': [],
+            'unlabel': [],
+            'assign': [],
+            'unassign': []
+        }
+        actions.update(kwargs)
+        return actions
+
+    def get_triager(self):
+        triager = DefaultTriager.__new__(DefaultTriager)
+        triager.valid_labels = ['bug', 'P1', 'needs_triage']
+        return triager
+
+    def test_deltas_applied_to_the_current_sets(self):
+        triager = self.get_triager()
+        issue = Issue(['needs_triage'], ['alice'])
+        actions = self.get_actions(
+            newlabel=['bug'],
+            unlabel=['needs_triage'],
+            assign=['bob'],
+            unassign=['alice']
+        )
+        calls = triager.get_action_calls(issue, actions)
+        assert [x[0] for x in calls] == ['labels', 'assignees']
+
+        # changed by someone else before the calls were applied
+        issue.labels = ['needs_triage', 'P1']
+        issue.assignees = ['alice', 'carol']
+        for (action, payload) in calls:
+            triager.execute_action(issue, action, payload)
+        assert issue.writes == [
+            ('labels', ['P1', 'bug']),
+            ('assignees', ['carol', 'bob'])
+        ]
+        # refetched before each replace call
+        assert issue.updates == 2
+
+    def test_unknown_labels_are_dropped(self):
+        triager = self.get_triager()
+        issue = Issue(['needs_triage'], [])
+        actions = self.get_actions(newlabel=['bug', 'typo'])
+        for (action, payload) in triager.get_action_calls(issue, actions):
+            triager.execute_action(issue, action, payload)
+        assert issue.writes == [('labels', ['needs_triage', 'bug'])]
+
+    def test_nothing_to_change(self):
+        triager = self.get_triager()
+        issue = Issue(['bug'], [])
+        actions = self.get_actions(newlabel=['bug'], unassign=['alice'])
+        assert triager.get_action_calls(issue, actions) == []
@@ -0,0 +1,157 @@
+#!/usr/bin/env python
+
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from ansibullbot.utils.action_journal import ActionExecutor
+from ansibullbot.utils.action_journal import ActionJournal
+
+
+class FakeClock(object):
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        return self.now
+
+
+class Api(object):
+    '''Records the applied actions, fails the ones in fail'''
+
+    def __init__(self, fail=None):
+        self.fail = fail or []
+        self.applied = []
+
+    def __call__(self, repo, number, action, payload):
+        if action in self.fail:
+            raise Exception('%s failed' % action)
+        self.applied.append((number, action, payload))
+
+
+class TestActionJournal(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.dbfile = os.path.join(self.tmpdir, 'actions.sqlite')
+        self.clock = FakeClock()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def get_journal(self, **kwargs):
+        journal = ActionJournal(self.dbfile, **kwargs)
+        journal._time = self.clock.time
+        return journal
+
+    def test_idempotency(self):
+        journal = self.get_journal()
+        assert journal.put('ansible/ansible', 1, 'comment', 'hi')
+        assert not journal.put('ansible/ansible', 1, 'comment', 'hi')
+        assert journal.put('ansible/ansible', 2, 'comment', 'hi')
+        assert journal.put('ansible/ansible', 1, 'labels', ['bug'])
+
+        entry = journal.next()
+        assert entry[1:] == ('ansible/ansible', 1, 'comment', 'hi')
+        journal.done(entry[0])
+        # once written the same action can be needed again
+        assert journal.put('ansible/ansible', 1, 'comment', 'hi')
+        assert journal.get_stats() == {'pending': 3, 'done': 1, 'failed': 0}
+
+    def test_survives_a_restart(self):
+        journal = self.get_journal()
+        journal.put('ansible/ansible', 1, 'labels', ['bug', 'needs_info'])
+        journal = self.get_journal()
+        assert journal.next()[1:] == \
+            ('ansible/ansible', 1, 'labels', ['bug', 'needs_info'])
+        assert journal.pending('ansible/ansible', 1) == 1
+
+    def test_retry_blocks_the_issue(self):
+        journal = self.get_journal(retry_interval=60, max_attempts=2)
+        journal.put('ansible/ansible', 1, 'comment', 'hi')
+        journal.put('ansible/ansible', 1, 'labels', ['bug'])
+        journal.put('ansible/ansible', 2, 'close')
+
+        entry = journal.next()
+        assert journal.retry(entry[0], 'timeout')
+        # the labels of 1 wait behind its comment, 2 goes ahead
+        assert journal.next()[1:] == ('ansible/ansible', 2, 'close', None)
+        journal.done(journal.next()[0])
+        assert journal.next() is None
+
+        self.clock.now += 60
+        assert journal.next()[0] == entry[0]
+        assert not journal.retry(entry[0], 'timeout')
+        assert journal.next()[3] == 'labels'
+
+        self.clock.now += 86401
+        journal.purge()
+        assert journal.get_stats() == {'pending': 1, 'done': 0, 'failed': 0}
+
+
+class TestActionExecutor(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.journal = ActionJournal(
+            os.path.join(self.tmpdir, 'actions.sqlite'),
+            max_attempts=1
+        )
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def drain(self, executor):
+        entry = self.journal.next()
+        while entry:
+            executor.run_entry(entry)
+            entry = self.journal.next()
+
+    def test_order_and_failures(self):
+        api = Api(fail=['merge'])
+        finished = []
+        executor = ActionExecutor(
+            self.journal,
+            api,
+            after=lambda repo, number: finished.append(number)
+        )
+        executor.submit('ansible/ansible', 1, [
+            ('comment', 'hi'), ('merge', None), ('rebuild', 123)
+        ])
+        executor.submit('ansible/ansible', 2, [('labels', ['bug'])])
+        self.drain(executor)
+        # the rebuild is dropped with the merge it follows
+        assert api.applied == [(1, 'comment', 'hi'), (2, 'labels', ['bug'])]
+        assert finished == [1, 2]
+        assert self.journal.get_stats() == \
+            {'pending': 0, 'done': 2, 'failed': 2}
+
+    def test_refused(self):
+        api = Api()
+        executor = ActionExecutor(
+            self.journal,
+            api,
+            before=lambda repo, number: number != 1
+        )
+        executor.submit('ansible/ansible', 1, [('comment', 'hi')])
+        executor.submit('ansible/ansible', 2, [('comment', 'hi')])
+        self.drain(executor)
+        assert api.applied == [(2, 'comment', 'hi')]
+
+    def test_thread(self):
+        api = Api()
+        executor = ActionExecutor(self.journal, api, poll_interval=10)
+        executor.start()
+        try:
+            executor.submit('ansible/ansible', 1, [('close', None)])
+            # submit wakes the thread up
+            for x in range(50):
+                if api.applied:
+                    break
+                time.sleep(0.05)
+        finally:
+            executor.stop(timeout=5)
+        assert api.applied == [(1, 'close', None)]
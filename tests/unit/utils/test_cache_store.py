@@ -0,0 +1,78 @@
+#!/usr/bin/env python
+
+import datetime
+import os
+import pytz
+import shutil
+import tempfile
+import unittest
+
+from ansibullbot.utils.cache_store import CacheStore
+from ansibullbot.utils.cache_store import get_cache_store
+
+
+class TestCacheStore(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.dbfile = os.path.join(self.tmpdir, 'cache.sqlite')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_get_put(self):
+        ts = datetime.datetime(2017, 6, 1, 12, 30, 5)
+        cs = CacheStore(self.dbfile)
+        assert cs.get('ansible/ansible', 1, 'comments') == (None, None)
+        cs.put('ansible/ansible', 1, 'comments', [{'id': 1}], updated_at=ts)
+        assert cs.get('ansible/ansible', 1, 'comments') == (ts, [{'id': 1}])
+
+        # keyed by repo and kind as well as number
+        assert cs.get('ansible/ansible-modules-core', 1, 'comments')[1] is None
+        assert cs.get('ansible/ansible', 1, 'events')[1] is None
+
+        # persisted across instances
+        cs = CacheStore(self.dbfile)
+        assert cs.get('ansible/ansible', 1, 'comments')[1] == [{'id': 1}]
+
+    def test_datetimes(self):
+        ts = datetime.datetime(2017, 6, 1, 12, 30, 5)
+        utc = pytz.utc.localize(ts)
+        cs = CacheStore(self.dbfile)
+        cs.put('ansible/ansible', 2, 'history',
+               [{'created_at': ts}, {'created_at': utc}])
+        (updated_at, history) = cs.get('ansible/ansible', 2, 'history')
+        assert history == [{'created_at': ts}, {'created_at': utc}]
+        assert history[0]['created_at'].tzinfo is None
+        assert history[1]['created_at'].tzinfo is pytz.utc
+
+    def test_unserializable(self):
+        cs = CacheStore(self.dbfile)
+        with self.assertRaises(TypeError):
+            cs.put('ansible/ansible', 2, 'events', [object()])
+
+    def test_delete_and_numbers(self):
+        cs = CacheStore(self.dbfile)
+        cs.put('ansible/ansible', 3, 'issue', {'number': 3})
+        cs.put('ansible/ansible', 3, 'events', [])
+        cs.put('ansible/ansible', 4, 'issue', {'number': 4})
+        assert cs.numbers('ansible/ansible', 'issue') == [3, 4]
+        assert cs.exists('ansible/ansible', 3, 'events')
+
+        cs.delete('ansible/ansible', 3)
+        assert cs.numbers('ansible/ansible', 'issue') == [4]
+        assert not cs.exists('ansible/ansible', 3, 'events')
+
+    def test_shared_store(self):
+        base = get_cache_store(self.tmpdir)
+        repo = get_cache_store(
+            os.path.join(self.tmpdir, 'ansible/ansible'),
+            repo_path='ansible/ansible'
+        )
+        issues = get_cache_store(
+            os.path.join(self.tmpdir, 'ansible/ansible/issues'),
+            repo_path='ansible/ansible'
+        )
+        assert base is repo
+        assert base is issues
+        assert base.dbfile == self.dbfile
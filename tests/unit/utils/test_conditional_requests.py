@@ -0,0 +1,148 @@
+#!/usr/bin/env python
+
+import json
+import shutil
+import tempfile
+import unittest
+
+from github import Github
+
+from ansibullbot.utils.cache_store import CacheStore
+from ansibullbot.utils.conditional_requests import ConditionalRequests
+
+
+REPO = {
+    'id': 1,
+    'name': 'ansible',
+    'full_name': 'ansible/ansible',
+    'url': 'https://api.github.com/repos/ansible/ansible',
+}
+
+
+class FakeResponse(object):
+
+    def __init__(self, status, headers, body):
+        self.status = status
+        self.headers = headers
+        self.body = body
+
+    def getheaders(self):
+        return self.headers.items()
+
+    def read(self):
+        return self.body
+
+
+class FakeConnection(object):
+    '''Answers 304 whenever the request carries the current etag'''
+
+    def __init__(self, server):
+        self.server = server
+
+    def request(self, verb, url, input, headers):
+        self.server.requests.append((verb, url, headers))
+
+    def getresponse(self):
+        (verb, url, headers) = self.server.requests[-1]
+        rheaders = {'x-ratelimit-remaining': '4999',
+                    'x-ratelimit-limit': '5000'}
+        if headers.get('If-None-Match') == self.server.etag:
+            return FakeResponse(304, rheaders, '')
+        rheaders['etag'] = self.server.etag
+        return FakeResponse(200, rheaders, json.dumps(self.server.data))
+
+    def close(self):
+        pass
+
+
+class FakeServer(object):
+
+    def __init__(self, data):
+        self.data = data
+        self.etag = '"1"'
+        self.requests = []
+
+
+class TestConditionalRequests(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.store = CacheStore(self.tmpdir + '/cache.sqlite')
+        self.server = FakeServer(REPO.copy())
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def get_github(self, cr):
+        gh = Github('fake-token')
+        requester = gh._Github__requester
+        requester._Requester__createConnection = \
+            lambda: FakeConnection(self.server)
+        cr.install(requester)
+        return gh
+
+    def test_not_modified_is_served_from_the_store(self):
+        cr = ConditionalRequests(self.store)
+        gh = self.get_github(cr)
+
+        assert gh.get_repo('ansible/ansible').full_name == 'ansible/ansible'
+        assert 'If-None-Match' not in self.server.requests[-1][2]
+
+        # a new connection still finds the etag in the store
+        gh = self.get_github(ConditionalRequests(self.store))
+        repo = gh.get_repo('ansible/ansible')
+        assert repo.full_name == 'ansible/ansible'
+        assert self.server.requests[-1][2]['If-None-Match'] == '"1"'
+
+        self.server.data['full_name'] = 'ansible/ansible2'
+        self.server.etag = '"2"'
+        gh = self.get_github(cr)
+        assert gh.get_repo('ansible/ansible').full_name == 'ansible/ansible2'
+
+        stats = cr.get_stats()
+        assert stats['requests'] == 2
+        assert stats['misses'] == 2
+        assert stats['conditional'] == 1
+        assert stats['not_modified_ratio'] == 0.0
+
+    def test_stats(self):
+        cr = ConditionalRequests(self.store)
+        gh = self.get_github(cr)
+        for x in range(4):
+            gh.get_repo('ansible/ansible')
+
+        stats = cr.get_stats()
+        assert stats['requests'] == 4
+        assert stats['hits'] == 3
+        assert stats['conditional'] == 3
+        assert stats['hit_ratio'] == 0.75
+        assert stats['not_modified_ratio'] == 1.0
+
+        cr.reset_stats()
+        assert cr.get_stats()['requests'] == 0
+
+    def test_writes_are_not_conditional(self):
+        cr = ConditionalRequests(self.store)
+        gh = self.get_github(cr)
+        gh.get_repo('ansible/ansible')
+        requester = gh._Github__requester
+        requester.requestJsonAndCheck(
+            'POST', '/repos/ansible/ansible/issues', input={}
+        )
+        assert 'If-None-Match' not in self.server.requests[-1][2]
+        assert cr.get_stats()['requests'] == 1
+
+    def test_eviction(self):
+        cr = ConditionalRequests(self.store)
+        for x in range(10):
+            cr.save('url%s' % x, {'etag': '"%s"' % x}, 'x' * 100 * x)
+        cr.load('url1')
+
+        cr.maxsize = cr._size / 3
+        cr.evict()
+
+        assert cr.load('url1') is not None
+        assert cr.load('url9') is not None
+        assert cr.load('url2') is None
+        # the size survives a restart
+        assert ConditionalRequests(self.store)._size == cr._size
@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+
+import unittest
+
+from ansibullbot.utils.fact_pipeline import LazyMeta
+from ansibullbot.utils.fact_pipeline import declare_facts
+
+
+CALLS = []
+
+
+@declare_facts(['is_backport'], inputs=['is_pullrequest'])
+def get_backport_facts(meta):
+    CALLS.append('backports')
+    return {'is_backport': meta['is_pullrequest']}
+
+
+@declare_facts(['needs_rebuild'], inputs=['is_backport'])
+def get_rebuild_facts(meta):
+    CALLS.append('rebuild')
+    return {'needs_rebuild': meta['is_backport']}
+
+
+@declare_facts(['needs_rebuild', 'admin_merge'], inputs=['needs_rebuild'])
+def get_rebuild_merge_facts(meta):
+    CALLS.append('rebuild_merge')
+    return {'needs_rebuild': not meta['needs_rebuild'], 'admin_merge': False}
+
+
+@declare_facts(['is_filament'])
+def get_filament_facts(meta):
+    CALLS.append('filament')
+    meta['is_filament'] = False
+    return meta
+
+
+def get_meta():
+    meta = LazyMeta({'is_pullrequest': True})
+    meta.add_plugin('backports', get_backport_facts)
+    meta.add_plugin('filament', get_filament_facts)
+    meta.add_plugin('rebuild', get_rebuild_facts)
+    meta.add_plugin('rebuild_merge', get_rebuild_merge_facts)
+    return meta
+
+
+class TestLazyMeta(unittest.TestCase):
+
+    def setUp(self):
+        del CALLS[:]
+
+    def test_computed_on_first_access(self):
+        meta = get_meta()
+        assert CALLS == []
+        assert meta['is_backport'] is True
+        assert meta.get('is_backport') is True
+        assert 'is_backport' in meta
+        assert CALLS == ['backports']
+        assert meta.get_skipped() == ['filament', 'rebuild', 'rebuild_merge']
+        # only what was read is dumped
+        assert meta.copy() == {'is_pullrequest': True, 'is_backport': True}
+
+    def test_refined_facts(self):
+        meta = get_meta()
+        # rebuild_merge starts from the value of rebuild
+        assert meta['needs_rebuild'] is False
+        assert CALLS == ['rebuild', 'backports', 'rebuild_merge']
+
+        # asked for admin_merge first, rebuild still runs before it
+        del CALLS[:]
+        meta = get_meta()
+        assert meta['admin_merge'] is False
+        assert meta['needs_rebuild'] is False
+        assert CALLS == ['rebuild_merge', 'rebuild', 'backports']
+
+    def test_plugins_filling_in_the_meta(self):
+        meta = get_meta()
+        assert meta['is_filament'] is False
+        meta.compute_all()
+        assert CALLS == ['filament', 'backports', 'rebuild', 'rebuild_merge']
+        assert meta.get_skipped() == []
+
+    def test_undeclared(self):
+        meta = get_meta()
+        # an unknown key gives every plugin the chance to set it
+        assert meta.get('missing') is None
+        assert meta.get_skipped() == []
+        self.assertRaises(KeyError, meta.__getitem__, 'missing')
+
+    def test_declarations_are_checked(self):
+        meta = LazyMeta()
+        self.assertRaises(
+            Exception,
+            meta.add_plugin, 'backports', get_backport_facts
+        )
+        self.assertRaises(
+            Exception,
+            meta.add_plugin, 'other', lambda meta: {}
+        )
@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+
+import threading
+import time
+import unittest
+
+from ansibullbot.utils.iterators import PrefetchingRepoIssuesIterator
+from ansibullbot.utils.iterators import RepoIssuesIterator
+
+
+class FakeRepo(object):
+    '''Slow get_issue that remembers what was fetched'''
+
+    def __init__(self, delay=0.05, fail=None):
+        self.delay = delay
+        self.fail = fail
+        self.fetched = []
+        self._lock = threading.Lock()
+
+    def get_issue(self, number):
+        time.sleep(self.delay)
+        if number == self.fail:
+            raise Exception('fetching %s failed' % number)
+        with self._lock:
+            self.fetched.append(number)
+        return 'issue-%s' % number
+
+
+class TestRepoIssuesIterator(unittest.TestCase):
+
+    def test_order(self):
+        repo = FakeRepo(delay=0)
+        ri = RepoIssuesIterator(repo, [3, 1, 3, 2], issuecache={1: 'cached'})
+        assert list(ri) == ['issue-3', 'cached', 'issue-2']
+
+
+class TestPrefetchingRepoIssuesIterator(unittest.TestCase):
+
+    def test_order_and_readahead(self):
+        repo = FakeRepo()
+        numbers = range(20, 0, -1)
+        pi = PrefetchingRepoIssuesIterator(
+            repo,
+            numbers,
+            issuecache={5: 'cached'},
+            readahead=3
+        )
+        issues = []
+        for issue in pi:
+            # never more than readahead issues ahead of the loop
+            assert len(repo.fetched) <= len(issues) + 1 + 3
+            issues.append(issue)
+        assert issues == [
+            'cached' if x == 5 else 'issue-%s' % x for x in numbers
+        ]
+        assert 5 not in repo.fetched
+        assert pi.closed
+
+    def test_overlaps_the_loop(self):
+        repo = FakeRepo(delay=0.1)
+        pi = PrefetchingRepoIssuesIterator(repo, range(8), readahead=4)
+        start = time.time()
+        for issue in pi:
+            # the triage of each issue
+            time.sleep(0.1)
+        # serial fetching would take 8 * 0.2
+        assert time.time() - start < 1.3
+
+    def test_break_cancels(self):
+        repo = FakeRepo()
+        pi = PrefetchingRepoIssuesIterator(repo, range(100), readahead=2)
+        for issue in pi:
+            if issue == 'issue-3':
+                break
+        assert pi.closed
+        time.sleep(0.2)
+        fetched = len(repo.fetched)
+        time.sleep(0.2)
+        assert fetched == len(repo.fetched)
+        assert fetched <= 7
+
+    def test_errors_reach_the_loop(self):
+        repo = FakeRepo(delay=0, fail=2)
+        pi = PrefetchingRepoIssuesIterator(repo, [1, 2, 3], readahead=2)
+        issues = []
+        try:
+            for issue in pi:
+                issues.append(issue)
+        except Exception as e:
+            assert 'fetching 2 failed' in str(e)
+        assert issues == ['issue-1']
+        assert pi.closed
@@ -0,0 +1,52 @@
+#!/usr/bin/env python
+
+import datetime
+import os
+import shutil
+import tempfile
+import unittest
+
+from ansibullbot.utils.cache_store import CacheStore
+from ansibullbot.utils.meta_index import MetaIndex
+
+
+class TestMetaIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.store = CacheStore(os.path.join(self.tmpdir, 'cache.sqlite'))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_update_and_get(self):
+        mi = MetaIndex(self.store)
+        assert mi.get('ansible/ansible', 1) is None
+
+        meta = {
+            'time': '2017-06-01T12:30:05.123456',
+            'updated_at': '2017-05-30T10:00:00',
+            'labels': ['bug_report'],
+        }
+        entry = mi.update('ansible/ansible', 1, meta)
+        assert entry.time == datetime.datetime(2017, 6, 1, 12, 30, 5, 123456)
+        assert entry.updated_at == '2017-05-30T10:00:00'
+
+        # a new index reads the entries back from the store
+        mi = MetaIndex(self.store)
+        assert mi.get('ansible/ansible', 1) == entry
+        assert mi.numbers('ansible/ansible') == [1]
+        assert mi.numbers('ansible/ansible-modules-core') == []
+
+    def test_hash_ignores_time(self):
+        mi = MetaIndex(self.store)
+        meta = {'time': '2017-06-01T12:30:05', 'updated_at': None}
+        first = mi.update('ansible/ansible', 2, meta)
+        meta['time'] = '2017-06-02T12:30:05'
+        second = mi.update('ansible/ansible', 2, meta)
+        assert first.hash == second.hash
+        assert first.time < second.time
+
+        meta['labels'] = ['needs_info']
+        third = mi.update('ansible/ansible', 2, meta)
+        assert third.hash != second.hash
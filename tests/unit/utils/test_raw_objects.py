@@ -0,0 +1,53 @@
+#!/usr/bin/env python
+
+import datetime
+import pickle
+import unittest
+
+from github.IssueComment import IssueComment
+from ansibullbot.utils.raw_objects import RawObject
+from ansibullbot.utils.raw_objects import to_raw_objects
+
+
+COMMENT = {
+    'id': 1,
+    'url': 'https://api.github.com/repos/ansible/ansible/issues/comments/1',
+    'body': 'shipit',
+    'user': {'login': 'jctanner', 'id': 2},
+    'created_at': '2017-06-01T12:30:05Z',
+    'updated_at': None,
+    'labels': [{'name': 'bug'}],
+}
+
+
+class TestRawObject(unittest.TestCase):
+
+    def test_attributes(self):
+        comment = RawObject(COMMENT)
+        assert comment.id == 1
+        assert comment.body == 'shipit'
+        assert comment.user.login == 'jctanner'
+        assert comment.created_at == datetime.datetime(2017, 6, 1, 12, 30, 5)
+        assert comment.updated_at is None
+        assert comment.labels[0].name == 'bug'
+        assert comment.raw_data is COMMENT
+        assert not hasattr(comment, 'milestone')
+
+    def test_read_only(self):
+        comment = RawObject(COMMENT)
+        with self.assertRaises(AttributeError):
+            comment.body = 'foo'
+        with self.assertRaises(AttributeError):
+            comment.extra = 'foo'
+
+    def test_pickle(self):
+        comment = pickle.loads(pickle.dumps(RawObject(COMMENT), protocol=2))
+        assert comment.user.login == 'jctanner'
+
+    def test_to_raw_objects(self):
+        # pygithub objects are unwrapped without completing them
+        pgcomment = IssueComment(None, {}, COMMENT.copy(), completed=False)
+        comments = to_raw_objects([pgcomment, COMMENT])
+        assert comments[0] == comments[1]
+        assert comments[0].created_at == pgcomment.created_at
+        assert comments[0].user.login == pgcomment.user.login
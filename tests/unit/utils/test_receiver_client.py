@@ -0,0 +1,132 @@
+#!/usr/bin/env python
+
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+import ansibullbot.constants as C
+import ansibullbot.utils.receiver_client as receiver_client
+from ansibullbot.utils.receiver_client import ReceiverClient
+
+
+class RecordingClient(ReceiverClient):
+    '''Keeps the posts instead of sending them'''
+
+    def __init__(self, *args, **kwargs):
+        self.sent = []
+        self.down = False
+        ReceiverClient.__init__(self, *args, **kwargs)
+
+    def _send(self, path, params, data):
+        if self.down:
+            raise Exception('connection refused')
+        self.sent.append((path, params, data))
+
+
+def wait_for(check, timeout=5):
+    stop = time.time() + timeout
+    while time.time() < stop:
+        if check():
+            return True
+        time.sleep(0.05)
+    return False
+
+
+class TestReceiverClient(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.spooldir = os.path.join(self.tmpdir, 'spool')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_batching(self):
+        rc = RecordingClient('http://localhost:5001', self.spooldir,
+                             batch_size=4, flush_interval=60)
+        params = {'user': 'ansible', 'repo': 'ansible'}
+        rc.post('summaries', params, {'1': {'number': 1}})
+        rc.post('metadata', dict(params, number=1), {'labels': []})
+        rc.post('metadata', dict(params, number=2), {'labels': []})
+        # a later post for the same number replaces the queued one
+        rc.post('metadata', dict(params, number=2), {'labels': ['bug']})
+        rc.post('summaries', params, {'2': {'number': 2}})
+
+        assert wait_for(lambda: len(rc.sent) == 2)
+        sent = dict((x[0], x) for x in rc.sent)
+        assert sent['metadata'][1] == params
+        assert sent['metadata'][2] == \
+            {'1': {'labels': []}, '2': {'labels': ['bug']}}
+        assert sorted(sent['summaries'][2].keys()) == ['1', '2']
+
+        rc.close()
+        metrics = rc.get_metrics()
+        assert metrics['sent'] == 4
+        assert metrics['batches'] == 2
+        assert metrics['queue_depth'] == 0
+
+    def test_spool_and_retry(self):
+        rc = RecordingClient('http://localhost:5001', self.spooldir,
+                             batch_size=1, flush_interval=60)
+        rc.down = True
+        params = {'user': 'ansible', 'repo': 'ansible', 'number': 1}
+        rc.post('metadata', params, {'labels': []})
+        assert wait_for(lambda: rc.get_metrics()['spool_depth'] == 1)
+        assert rc.get_metrics()['failures'] == 1
+
+        # the spool is resent once the backoff has passed
+        rc.down = False
+        assert wait_for(lambda: rc.sent)
+        assert rc.sent[0][2] == {'1': {'labels': []}}
+        assert wait_for(lambda: rc.get_metrics()['spool_depth'] == 0)
+        rc.close()
+
+    def test_close_spools_undeliverable(self):
+        rc = RecordingClient('http://localhost:5001', self.spooldir,
+                             batch_size=100, flush_interval=60)
+        rc.down = True
+        rc.post('summaries', {'user': 'ansible', 'repo': 'ansible'},
+                {'1': {'number': 1}})
+        rc.close()
+        assert rc.get_metrics()['spool_depth'] == 1
+
+        # a new client picks the spool up
+        rc = RecordingClient('http://localhost:5001', self.spooldir,
+                             batch_size=100, flush_interval=60)
+        assert wait_for(lambda: rc.sent)
+        rc.close()
+
+    def test_errors_do_not_stop_the_sender(self):
+        rc = RecordingClient('http://localhost:5001', self.spooldir,
+                             batch_size=1, flush_interval=60)
+        errors = []
+
+        def spool(batch):
+            errors.append(batch)
+            raise IOError('No space left on device')
+
+        rc.down = True
+        rc._spool = spool
+        rc.post('metadata', {'user': 'ansible', 'number': 1}, {'labels': []})
+        assert wait_for(lambda: errors)
+
+        rc.down = False
+        rc._retry_at = 0
+        rc.post('metadata', {'user': 'ansible', 'number': 2}, {'labels': []})
+        assert wait_for(lambda: rc.sent)
+        assert rc.sent[0][2] == {'2': {'labels': []}}
+        rc.close()
+
+    def test_worker_spool(self):
+        saved = (receiver_client.WORKER_ID, C.DEFAULT_RECEIVER_SPOOL)
+        try:
+            C.DEFAULT_RECEIVER_SPOOL = '~/.ansibullbot/cache/receiver.spool/'
+            assert receiver_client.get_receiver_spool() == \
+                '~/.ansibullbot/cache/receiver.spool'
+            receiver_client.set_receiver_worker('w1')
+            assert receiver_client.get_receiver_spool() == \
+                '~/.ansibullbot/cache/receiver.spool.w1'
+        finally:
+            (receiver_client.WORKER_ID, C.DEFAULT_RECEIVER_SPOOL) = saved
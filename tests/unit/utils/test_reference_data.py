@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from ansibullbot.utils.cache_store import CacheStore
+from ansibullbot.utils.reference_data import ReferenceData
+
+
+class Fetcher(object):
+    '''Counts the calls and can be made to fail'''
+
+    def __init__(self, values):
+        self.values = values
+        self.calls = 0
+        self.fail = False
+
+    def __call__(self):
+        self.calls += 1
+        if self.fail:
+            raise Exception('api down')
+        return self.values
+
+
+class TestReferenceData(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.store = CacheStore(os.path.join(self.tmpdir, 'cache.sqlite'))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_cached_within_ttl(self):
+        rd = ReferenceData(self.store, ttl=3600)
+        fetch = Fetcher(['jdoe', 'bcoca'])
+        assignees = rd.get('ansible/ansible', 'assignees', fetch)
+        assert assignees == frozenset(['jdoe', 'bcoca'])
+        assert rd.get('ansible/ansible', 'assignees', fetch) is assignees
+        assert fetch.calls == 1
+
+        # a restart or another worker reads it from the store
+        rd = ReferenceData(self.store, ttl=3600)
+        assert rd.get('ansible/ansible', 'assignees', fetch) == assignees
+        assert fetch.calls == 1
+
+        # names are kept apart
+        assert rd.get('ansible', 'members', Fetcher(['x'])) == frozenset(['x'])
+
+    def test_refresh(self):
+        rd = ReferenceData(self.store, ttl=0)
+        fetch = Fetcher(['bug', 'feature'])
+        labels = rd.get('ansible/ansible', 'labels', fetch)
+        # unchanged data keeps the same set
+        assert rd.get('ansible/ansible', 'labels', fetch) is labels
+        fetch.values = ['bug']
+        assert rd.get('ansible/ansible', 'labels', fetch) == frozenset(['bug'])
+        assert fetch.calls == 3
+
+    def test_failed_refresh_keeps_the_old_set(self):
+        rd = ReferenceData(self.store, ttl=0)
+        fetch = Fetcher(['bug'])
+        rd.get('ansible/ansible', 'labels', fetch)
+        fetch.fail = True
+        assert rd.get('ansible/ansible', 'labels', fetch) == frozenset(['bug'])
+
+        fetch = Fetcher([])
+        fetch.fail = True
+        self.assertRaises(Exception, rd.get, 'ansible', 'members', fetch)
@@ -0,0 +1,78 @@
+#!/usr/bin/env python
+
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from ansibullbot.utils.response_cache import ResponseCache
+
+
+class TestResponseCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.dbfile = os.path.join(self.tmpdir, 'responses.sqlite')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_get_set(self):
+        rc = ResponseCache(self.dbfile)
+        assert rc.get('https://api.shippable.com/runs') is None
+        rc.set('https://api.shippable.com/runs', 200, [{'id': 1}])
+        assert rc.get('https://api.shippable.com/runs') == \
+            (200, [{'id': 1}], True)
+
+        # persisted across instances
+        rc = ResponseCache(self.dbfile)
+        assert rc.get('https://api.shippable.com/runs')[1] == [{'id': 1}]
+
+    def test_ttl_and_pin(self):
+        rc = ResponseCache(self.dbfile)
+        rc.set('https://api.shippable.com/runs/1', 200, {'id': 1})
+        rc.set('https://api.shippable.com/runs/2', 200, {'id': 2})
+        rc.pin(['https://api.shippable.com/runs/2'])
+        time.sleep(0.1)
+        assert rc.get('https://api.shippable.com/runs/1', ttl=0.05)[2] is False
+        assert rc.get('https://api.shippable.com/runs/2', ttl=0.05)[2] is True
+
+    def test_newer_than(self):
+        rc = ResponseCache(self.dbfile)
+        rc.set('https://api.shippable.com/jobs?runIds=1', 200, [{'id': 1}])
+        rc.pin(['https://api.shippable.com/jobs?runIds=1'])
+        now = time.time()
+        assert rc.get('https://api.shippable.com/jobs?runIds=1',
+                      newer_than=now - 60) is not None
+        # even pinned entries from before newer_than are refetched
+        assert rc.get('https://api.shippable.com/jobs?runIds=1',
+                      newer_than=now + 60) is None
+
+    def test_eviction(self):
+        rc = ResponseCache(self.dbfile)
+        rc.set('https://api.shippable.com/runs/1', 200, {'id': 1})
+        rc.pin(['https://api.shippable.com/runs/1'])
+        for x in range(2, 10):
+            rc.set('https://api.shippable.com/runs/%s' % x, 200, {'id': x})
+        rc.get('https://api.shippable.com/runs/2')
+
+        rc.maxsize = rc._size / 3
+        rc.evict()
+
+        assert rc.get('https://api.shippable.com/runs/1') is not None
+        assert rc.get('https://api.shippable.com/runs/2') is not None
+        assert rc.get('https://api.shippable.com/runs/3') is None
+
+    def test_pinned_entries_are_evicted_last(self):
+        rc = ResponseCache(self.dbfile)
+        for x in range(10):
+            rc.set('https://api.shippable.com/runs/%s' % x, 200, {'id': x},
+                   pin=x > 0)
+
+        rc.maxsize = rc._size / 2
+        rc.evict()
+        # pinned entries don't hold the cache over maxsize
+        assert 0 < rc._size <= rc.maxsize
+        assert rc.get('https://api.shippable.com/runs/0') is None
+        assert rc.get('https://api.shippable.com/runs/9') is not None
@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+
+import datetime
+import unittest
+
+from ansibullbot.utils.scheduler import LatencyHistogram
+from ansibullbot.utils.scheduler import PriorityScheduler
+from ansibullbot.utils.scheduler import parse_class_values
+
+
+NOW = datetime.datetime(2019, 1, 10, 12, 0, 0)
+
+
+def ago(**kwargs):
+    return NOW - datetime.timedelta(**kwargs)
+
+
+class TestPriorityScheduler(unittest.TestCase):
+
+    def test_classify(self):
+        ps = PriorityScheduler(now=NOW)
+        assert ps.classify(command=True, stale=True) == 'command'
+        assert ps.classify(
+            ci_completed=ago(hours=1), last_triaged=ago(hours=2)
+        ) == 'ci'
+        # ci finished before the last triage, nothing new
+        assert ps.classify(
+            ci_completed=ago(hours=2), last_triaged=ago(hours=1)
+        ) == 'updated'
+        assert ps.classify(stale=True) == 'stale'
+        assert ps.classify() == 'updated'
+
+    def test_ordering(self):
+        ps = PriorityScheduler(now=NOW)
+        ps.add(1, updated_at=ago(days=30), last_triaged=ago(days=30),
+               stale=True)
+        ps.add(2, updated_at=ago(hours=5))
+        ps.add(3, updated_at=ago(minutes=1))
+        ps.add(4, updated_at=ago(days=2), command=True)
+        ps.add(5, updated_at=ago(days=1), ci_completed=ago(hours=1),
+               last_triaged=ago(days=1))
+        assert ps.get_numbers() == [4, 5, 1, 3, 2]
+        assert ps.get_class(5) == 'ci'
+        assert ps.get_class(6) is None
+
+    def test_budgets(self):
+        ps = PriorityScheduler(budgets={'stale': 2}, now=NOW)
+        for number in range(1, 6):
+            ps.add(number, last_triaged=ago(days=7 + number), stale=True)
+        ps.add(10, updated_at=ago(hours=1))
+        # the oldest stale issues go first, the rest wait
+        assert ps.get_numbers() == [10, 5, 4]
+        assert ps.deferred == [3, 2, 1]
+
+    def test_record_triaged(self):
+        histograms = {}
+        ps = PriorityScheduler(histograms=histograms, now=NOW)
+        ps.add(1, updated_at=ago(minutes=10))
+        ps.add(2, last_triaged=ago(days=8), stale=True)
+        ps.add(3)
+        assert ps.record_triaged(1, finished=NOW) == 600
+        assert ps.record_triaged(2, finished=NOW) == 86400
+        assert ps.record_triaged(3, finished=NOW) is None
+        assert histograms['updated'].count == 1
+        assert histograms['stale'].get_stats()['p50'] == 24 * 3600
+
+
+class TestLatencyHistogram(unittest.TestCase):
+
+    def test_percentile(self):
+        lh = LatencyHistogram(buckets=[10, 100])
+        assert lh.percentile(50) is None
+        for seconds in [1, 5, 50, 500]:
+            lh.observe(seconds)
+        assert lh.percentile(50) == 10
+        assert lh.percentile(75) == 100
+        assert lh.percentile(90) == float('inf')
+        stats = lh.get_stats()
+        assert stats['count'] == 4
+        assert stats['buckets'] == {'10': 2, '100': 1, 'inf': 1}
+
+    def test_parse_class_values(self):
+        assert parse_class_values(['stale:200', 'ci: 0', 'bogus'], cast=int) \
+            == {'stale': 200, 'ci': 0}
+        assert parse_class_values('') == {}
@@ -0,0 +1,116 @@
+#!/usr/bin/env python
+
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from ansibullbot.utils.sharding import HashRing
+from ansibullbot.utils.sharding import ShardWorker
+from ansibullbot.utils.sharding import SQLiteLeaseStore
+from ansibullbot.utils.sharding import get_lease_store
+from ansibullbot.utils.sharding import get_shard_key
+
+
+KEYS = [get_shard_key('ansible/ansible', x) for x in range(1000)]
+
+
+class TestHashRing(unittest.TestCase):
+
+    def test_balance(self):
+        ring = HashRing(['a', 'b', 'c'])
+        counts = {}
+        for key in KEYS:
+            node = ring.get_node(key)
+            counts[node] = counts.get(node, 0) + 1
+        assert sorted(counts.keys()) == ['a', 'b', 'c']
+        assert min(counts.values()) > 200
+        assert HashRing([]).get_node(KEYS[0]) is None
+
+    def test_adding_a_node_moves_few_keys(self):
+        before = HashRing(['a', 'b', 'c'])
+        after = HashRing(['a', 'b', 'c', 'd'])
+        moved = [
+            x for x in KEYS if before.get_node(x) != after.get_node(x)
+        ]
+        # only keys that now belong to the new node move
+        assert all(after.get_node(x) == 'd' for x in moved)
+        assert len(moved) < 400
+
+
+class TestLeases(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.url = 'sqlite://' + os.path.join(self.tmpdir, 'leases.sqlite')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_home_directory_url(self):
+        home = os.environ.get('HOME')
+        os.environ['HOME'] = self.tmpdir
+        try:
+            # the form of the default lease_store
+            store = get_lease_store(
+                'sqlite:///~/.ansibullbot/cache/leases.sqlite'
+            )
+        finally:
+            if home is None:
+                del os.environ['HOME']
+            else:
+                os.environ['HOME'] = home
+        assert store.dbfile == os.path.join(
+            self.tmpdir, '.ansibullbot', 'cache', 'leases.sqlite'
+        )
+        assert os.path.isfile(store.dbfile)
+
+    def test_lease(self):
+        # two workers, two connections to the same file
+        store1 = get_lease_store(self.url)
+        store2 = get_lease_store(self.url)
+        assert isinstance(store1, SQLiteLeaseStore)
+
+        assert store1.acquire('issue:1', 'w1', 60)
+        assert not store2.acquire('issue:1', 'w2', 60)
+        assert not store2.renew('issue:1', 'w2', 60)
+        assert store1.acquire('issue:1', 'w1', 60)
+        assert store1.renew('issue:1', 'w1', 60)
+
+        # releasing someone else's lease does nothing
+        store2.release('issue:1', 'w2')
+        assert store2.holders('issue:') == {'issue:1': 'w1'}
+        store1.release('issue:1', 'w1')
+        assert store2.acquire('issue:1', 'w2', 60)
+
+    def test_expired_lease(self):
+        store = get_lease_store(self.url)
+        assert store.acquire('issue:1', 'w1', 0.1)
+        time.sleep(0.2)
+        assert store.holders() == {}
+        assert store.acquire('issue:1', 'w2', 60)
+        # the first worker finds out before applying anything
+        assert not store.renew('issue:1', 'w1', 60)
+
+    def test_workers_split_the_issues(self):
+        w1 = ShardWorker('w1', get_lease_store(self.url))
+        w2 = ShardWorker('w2', get_lease_store(self.url))
+        w1.heartbeat()
+        w2.heartbeat()
+        w1.heartbeat()
+
+        owned1 = [x for x in range(200) if w1.owns('ansible/ansible', x)]
+        owned2 = [x for x in range(200) if w2.owns('ansible/ansible', x)]
+        assert owned1 and owned2
+        assert sorted(owned1 + owned2) == range(200)
+
+        # w1 leaves, w2 picks up everything on its next heartbeat
+        w1.stop()
+        w2.heartbeat()
+        assert all(w2.owns('ansible/ansible', x) for x in range(200))
+
+        assert w2.acquire('ansible/ansible', 1)
+        assert not w1.acquire('ansible/ansible', 1)
+        w2.release('ansible/ansible', 1)
+        assert w1.acquire('ansible/ansible', 1)
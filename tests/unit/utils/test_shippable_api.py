@@ -0,0 +1,163 @@
+#!/usr/bin/env python
+
+import datetime
+import shutil
+import tempfile
+import unittest
+
+import ansibullbot.utils.shippable_api as shippable_api
+from ansibullbot.utils.shippable_api import ShippableRuns
+
+
+RAWDATA = [
+    {
+        'id': '58caf30337380a0800e31219',
+        'commitUrl': 'https://github.com/ansible/ansible/pull/100',
+        'pullRequestNumber': 100,
+        'createdAt': '2017-02-07T00:27:06.482Z',
+        'startedAt': '2017-02-07T00:28:06.482Z',
+        'endedAt': '2017-02-07T01:27:06.482Z',
+    },
+    {
+        'id': '58caf30337380a0800e3121a',
+        'commitUrl': 'https://github.com/ansible/ansible/pull/100',
+        'pullRequestNumber': 100,
+        'createdAt': '2017-02-08T00:27:06.482Z',
+        'startedAt': '2017-02-08T00:28:06.482Z',
+        'endedAt': '2017-02-08T01:27:06.482Z',
+    },
+    {
+        'id': '58caf30337380a0800e3121b',
+        'commitUrl': 'https://github.com/ansible/ansible/pull/1100',
+        'pullRequestNumber': 1100,
+        'createdAt': '2017-02-09T00:27:06.482Z',
+        'startedAt': None,
+        'endedAt': None,
+    },
+]
+
+
+class TestShippableRunsIndex(unittest.TestCase):
+
+    def get_runs(self):
+        SR = ShippableRuns(cachedir='/tmp/shippable.test', writecache=False)
+        SR._rawdata = [x.copy() for x in RAWDATA]
+        SR._process_raw_data()
+        return SR
+
+    def test_pullrequest_runs(self):
+        SR = self.get_runs()
+        assert len(SR.get_pullrequest_runs(100)) == 2
+        assert len(SR.get_pullrequest_runs('1100')) == 1
+        assert SR.get_pullrequest_runs(10) == []
+
+    def test_last_completion(self):
+        SR = self.get_runs()
+        assert SR.get_last_completion(100) == \
+            datetime.datetime(2017, 2, 8, 1, 27, 6, 482000)
+        assert SR.get_last_completion(1100) is None
+        assert SR.get_last_completion(10) is None
+
+    def test_updated_since(self):
+        SR = self.get_runs()
+        since = datetime.datetime(2017, 2, 8, 1, 0, 0)
+        assert SR.get_updated_since(since) == [100, 1100]
+        since = datetime.datetime(2017, 2, 8, 2, 0, 0)
+        assert SR.get_updated_since(since) == [1100]
+        since = datetime.datetime(2017, 2, 10)
+        assert SR.get_updated_since(since) == []
+
+    def test_incremental_update(self):
+        SR = self.get_runs()
+        first = SR.get_pullrequest_runs(100)
+
+        rawdata = [x.copy() for x in RAWDATA]
+        rawdata[2]['startedAt'] = '2017-02-09T00:28:06.482Z'
+        SR._rawdata = rawdata
+        SR._process_raw_data()
+
+        # unchanged runs are carried over, changed runs are reconverted
+        assert SR.get_pullrequest_runs(100)[0] is first[0]
+        assert SR.get_pullrequest_runs(1100)[0]['startedAt'] == \
+            datetime.datetime(2017, 2, 9, 0, 28, 6, 482000)
+
+
+RUN_ID = '58caf30337380a0800e31219'
+RUN_URL = 'https://api.shippable.com/runs/' + RUN_ID
+JOBS_URL = 'https://api.shippable.com/jobs?runIds=' + RUN_ID
+REPORT_URL = 'https://api.shippable.com/jobs/1/jobTestReports'
+
+
+class Response(object):
+
+    def __init__(self, data):
+        self.status_code = 200
+        self.data = data
+
+    def json(self):
+        return self.data
+
+
+class TestShippableTestResults(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.SR = ShippableRuns(cachedir=self.tmpdir, writecache=False)
+        self.fetched = []
+        self.responses = {
+            RUN_URL: {
+                'id': RUN_ID,
+                'commitSha': 'abc',
+                'statusCode': 30,
+                'endedAt': '2017-02-07T01:27:06.482Z',
+            },
+            JOBS_URL: [{'id': 1, 'runNumber': 1, 'jobNumber': 1,
+                        'statusCode': 30}],
+            REPORT_URL: [{'path': 'x.json', 'contents': '{"verified": 1}'}],
+        }
+        self.SR.fetch = self.fetch
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def fetch(self, url):
+        self.fetched.append(url)
+        return Response(self.responses[url])
+
+    def test_finished_run_refetches_older_entries(self):
+        # the run was still going when its jobs were last cached
+        self.SR.response_cache.set(JOBS_URL, 200, [])
+        self.SR.response_cache._conn.execute(
+            'UPDATE responses SET fetched=0'
+        )
+        self.SR.response_cache._conn.commit()
+
+        (run_data, sha, results, verified) = \
+            self.SR.get_test_results(RUN_ID, usecache=True)
+        assert self.fetched == [RUN_URL, JOBS_URL, REPORT_URL]
+        assert results[0]['contents'] == {'verified': 1}
+
+        # final now, kept and pinned
+        self.SR.get_test_results(RUN_ID, usecache=True)
+        assert len(self.fetched) == 3
+        assert self.SR.response_cache.get(JOBS_URL, ttl=0)[2] is True
+
+    def test_running_run_is_not_kept(self):
+        self.responses[RUN_URL]['statusCode'] = 20
+        self.SR.get_test_results(RUN_ID)
+        assert self.SR._test_results == {}
+        assert self.SR.response_cache.get(JOBS_URL, ttl=0)[2] is False
+
+    def test_kept_results_are_bounded(self):
+        saved = shippable_api.TEST_RESULTS_CACHE_SIZE
+        shippable_api.TEST_RESULTS_CACHE_SIZE = 2
+        try:
+            self.SR.get_test_results(RUN_ID)
+            self.SR.get_test_results(RUN_ID, filter_paths=['x'])
+            # reading a result makes it the most recent one
+            self.SR.get_test_results(RUN_ID)
+            self.SR.get_test_results(RUN_ID, filter_paths=['y'])
+        finally:
+            shippable_api.TEST_RESULTS_CACHE_SIZE = saved
+        assert list(self.SR._test_results.keys()) == \
+            [(RUN_ID, ()), (RUN_ID, ('y',))]
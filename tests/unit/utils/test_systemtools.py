@@ -0,0 +1,27 @@
+#!/usr/bin/env python
+
+import os
+import shutil
+import stat
+import tempfile
+import unittest
+
+from ansibullbot.utils.systemtools import write_atomic
+
+
+class TestWriteAtomic(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.umask = os.umask(0o022)
+
+    def tearDown(self):
+        os.umask(self.umask)
+        shutil.rmtree(self.tmpdir)
+
+    def test_mode_follows_the_umask(self):
+        path = os.path.join(self.tmpdir, 'meta.json')
+        write_atomic(path, '{}')
+        with open(path) as f:
+            assert f.read() == '{}'
+        assert stat.S_IMODE(os.stat(path).st_mode) == 0o644
@@ -0,0 +1,129 @@
+#!/usr/bin/env python
+
+import time
+import unittest
+
+import ansibullbot.utils.token_pool as token_pool
+from ansibullbot.decorators.github import get_reset_time
+from ansibullbot.utils.token_pool import TokenPool
+
+
+def get_headers(remaining, reset=None):
+    return {
+        'x-ratelimit-remaining': str(remaining),
+        'x-ratelimit-limit': '5000',
+        'x-ratelimit-reset': str(int(reset or time.time() + 3600)),
+    }
+
+
+class FakeRequester(object):
+    '''Remembers the auth of each request and answers with its quota'''
+
+    def __init__(self, quota):
+        self.quota = quota
+        self.sent = []
+
+    def _Requester__requestRaw(self, cnx, verb, url, requestHeaders, input):
+        auth = requestHeaders['Authorization']
+        self.sent.append((verb, auth))
+        self.quota[auth] -= 1
+        return (200, get_headers(self.quota[auth]), '{}')
+
+
+class TestTokenPool(unittest.TestCase):
+
+    def test_reads_go_to_the_most_quota(self):
+        pool = TokenPool('token bot', ['token a', 'token b'])
+        pool.update('token a', get_headers(100))
+        pool.update('token b', get_headers(4000))
+        pool.update('token bot', get_headers(4000))
+        # the bot keeps a reserve for writes
+        assert pool.get_read_auth() == ('token b', 0)
+        pool.update('token b', get_headers(10))
+        assert pool.get_read_auth() == ('token bot', 0)
+        assert pool.get_quota('token bot')['remaining'] == 3999
+
+    def test_only_the_bot(self):
+        pool = TokenPool('token bot')
+        pool.update('token bot', get_headers(10))
+        # no reserve without other tokens to read with
+        assert pool.get_read_auth() == ('token bot', 0)
+
+    def test_exhausted(self):
+        reset = time.time() + 60
+        pool = TokenPool('token bot', ['token a'])
+        pool.update('token a', get_headers(0, reset=reset))
+        pool.update('token bot', get_headers(500, reset=reset + 60))
+        (auth, wait) = pool.get_read_auth()
+        assert auth is None
+        assert 60 <= wait <= 66
+        assert 60 <= pool.get_reset_time() <= 66
+
+        # quota comes back once the reset time has passed
+        pool.update('token a', get_headers(0, reset=time.time() - 1))
+        assert pool.get_read_auth() == ('token a', 0)
+
+    def test_graphql_is_tracked_separately(self):
+        pool = TokenPool('token bot', ['token a'])
+        pool.update('token a', get_headers(0), resource='graphql')
+        assert pool.get_read_auth(resource='graphql')[0] == 'token bot'
+        assert pool.get_read_auth()[0] == 'token a'
+
+    def test_install(self):
+        requester = FakeRequester({'token bot': 4000, 'token a': 5000})
+        pool = TokenPool('token bot', ['token a'])
+        pool.install(requester)
+
+        headers = {'Authorization': 'token bot'}
+        requester._Requester__requestRaw(None, 'GET', '/a', headers, None)
+        requester._Requester__requestRaw(None, 'POST', '/a', headers, None)
+        assert requester.sent == [('GET', 'token a'), ('POST', 'token bot')]
+        # the callers headers are left alone
+        assert headers == {'Authorization': 'token bot'}
+        assert pool.get_quota('token a')['remaining'] == 4999
+        assert pool.get_quota()['remaining'] == 3999
+
+    def test_membership_reads_use_the_bot(self):
+        requester = FakeRequester({'token bot': 4000, 'token a': 5000})
+        pool = TokenPool('token bot', ['token a'])
+        pool.install(requester)
+
+        headers = {'Authorization': 'token bot'}
+        for url in ['/orgs/ansible/members?per_page=100',
+                    '/teams/1/members',
+                    '/repos/ansible/ansible/assignees',
+                    '/repos/ansible/ansible/collaborators/bob',
+                    '/repos/ansible/ansible/issues/1']:
+            requester._Requester__requestRaw(None, 'GET', url, headers, None)
+        assert [x[1] for x in requester.sent] == \
+            ['token bot'] * 4 + ['token a']
+
+
+class TestRateLimitedResetTime(unittest.TestCase):
+
+    def setUp(self):
+        self.saved = token_pool.POOL
+
+    def tearDown(self):
+        token_pool.POOL = self.saved
+
+    def test_reads_wait_for_the_pool(self):
+        reset = time.time() + 60
+        pool = TokenPool('token bot', ['token a'])
+        pool.update('token a', get_headers(0, reset=reset))
+        pool.update('token bot', get_headers(500, reset=reset + 3000))
+        token_pool.POOL = pool
+        # the read token resets long before the bot's quota
+        assert 60 <= get_reset_time(None, None) <= 66
+
+        # another read token has quota, retry right away
+        pool.update('token b', get_headers(4000))
+        pool.read_auths.append('token b')
+        assert get_reset_time(None, None) == 5
+
+    def test_writes_wait_for_the_bot(self):
+        reset = time.time() + 600
+        pool = TokenPool('token bot', ['token a'])
+        pool.update('token bot', get_headers(0, reset=reset))
+        token_pool.POOL = pool
+        assert 600 <= get_reset_time(None, None) <= 606
@@ -0,0 +1,55 @@
+#!/usr/bin/env python
+
+import unittest
+
+from ansibullbot.utils.version_tools import AnsibleVersionIndexer
+
+
+VERSIONS = {
+    '2.4.0': 'devel',
+    '1.9': 'branch',
+    '1.9.4': 'branch',
+    '2.2': 'branch',
+    '2.2.1.0-1': 'tag',
+    '2.3': 'branch',
+    '2.3.1.0-1': 'tag',
+}
+
+
+class TestAnsibleVersionIndexer(unittest.TestCase):
+
+    def get_indexer(self):
+        # skip the checkout
+        avi = AnsibleVersionIndexer.__new__(AnsibleVersionIndexer)
+        avi.VALIDVERSIONS = VERSIONS.copy()
+        avi._index_versions()
+        return avi
+
+    def test_is_valid_version(self):
+        avi = self.get_indexer()
+        assert avi.is_valid_version('2.3')
+        assert avi.is_valid_version('2.3.1.0')
+        assert avi.is_valid_version('2.2.1.0-1-beta')
+        assert avi.is_valid_version('2')
+        assert not avi.is_valid_version('2.5')
+        assert not avi.is_valid_version('3')
+        assert not avi.is_valid_version('')
+        assert not avi.is_valid_version(None)
+
+    def test_strip_ansible_version(self):
+        avi = self.get_indexer()
+        assert avi.strip_ansible_version('devel') == 'devel'
+        assert avi.strip_ansible_version(' `N/A` ') == 'devel'
+        assert avi.strip_ansible_version('1.x') == '1.9.4'
+        assert avi.strip_ansible_version('2.2.x') == '2.2.1.0-1'
+        assert avi.strip_ansible_version('ansible 2.3.1.0') == '2.3.1.0'
+        rawtext = '\n'.join([
+            'ansible 2.2.1.0',
+            '  config file = /etc/ansible/ansible.cfg',
+            '  configured module search path = Default w/o overrides',
+        ])
+        assert avi.strip_ansible_version(rawtext) == '2.2.1.0'
+
+        # memoised on the normalised text
+        assert avi.strip_ansible_version('ANSIBLE 2.3.1.0 ') == '2.3.1.0'
+        assert 'ansible 2.3.1.0' in avi._strip_cache
@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from ansibullbot.utils.webhook_queue import WebhookQueue
+from ansibullbot.utils.webhook_queue import get_signature
+from ansibullbot.utils.webhook_queue import parse_event
+from ansibullbot.utils.webhook_queue import verify_signature
+
+
+def get_payload(key='issue', number=1, sender='jdoe'):
+    return {
+        'action': 'created',
+        key: {'number': number},
+        'repository': {'full_name': 'ansible/ansible'},
+        'sender': {'login': sender},
+    }
+
+
+class TestSignatures(unittest.TestCase):
+
+    def test_verify(self):
+        body = '{"action": "created"}'
+        for algorithm in ['sha1', 'sha256']:
+            signature = get_signature('secret', body, algorithm=algorithm)
+            assert verify_signature('secret', body, signature)
+            assert not verify_signature('other', body, signature)
+            assert not verify_signature('secret', body + ' ', signature)
+
+        assert not verify_signature('secret', body, None)
+        assert not verify_signature('', body, get_signature('', body))
+        assert not verify_signature('secret', body, 'md5=abc')
+
+    def test_parse_event(self):
+        assert parse_event('issue_comment', get_payload()) == \
+            ('ansible/ansible', 1)
+        assert parse_event(
+            'pull_request_review',
+            get_payload(key='pull_request', number=2)
+        ) == ('ansible/ansible', 2)
+        assert parse_event('push', get_payload()) is None
+        assert parse_event(
+            'issue_comment',
+            get_payload(sender='ansibot'),
+            botnames=['ansibot']
+        ) is None
+
+
+class TestWebhookQueue(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.dbfile = os.path.join(self.tmpdir, 'webhooks.sqlite')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_claim_and_ack(self):
+        wq = WebhookQueue(self.dbfile)
+        assert wq.put('ansible/ansible', 1, 'issues', delivery='a')
+        assert wq.put('ansible/ansible', 2, 'issue_comment', delivery='b')
+        # github redelivered 'a'
+        assert not wq.put('ansible/ansible', 1, 'issues', delivery='a')
+
+        # a second process sees the same queue
+        consumer = WebhookQueue(self.dbfile)
+        items = consumer.claim(limit=1)
+        assert [x[1:] for x in items] == [('ansible/ansible', 1, 'issues')]
+        # claimed items aren't handed out twice
+        assert [x[2] for x in consumer.claim()] == [2]
+        assert consumer.claim() == []
+
+        consumer.ack([items[0][0]])
+        assert wq.depth() == 1
+
+    def test_unacked_claims_expire(self):
+        wq = WebhookQueue(self.dbfile, claim_timeout=0.2)
+        wq.put('ansible/ansible', 1, 'issues')
+        items = wq.claim()
+        assert wq.claim() == []
+        time.sleep(0.3)
+        assert wq.claim() == items
+
+        wq = WebhookQueue(self.dbfile)
+        wq.release([items[0][0]])
+        assert wq.claim() == items
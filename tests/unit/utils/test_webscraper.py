@@ -0,0 +1,64 @@
+#!/usr/bin/env python
+
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from ansibullbot.utils.webscraper import GithubWebScraper
+
+
+REPO_URL = 'https://github.com/ansible/ansible'
+
+
+def get_summary(number, updated_at='2017-06-01T00:00:00+00:00'):
+    return {
+        'number': number,
+        'state': 'open',
+        'type': 'issue',
+        'updated_at': updated_at,
+    }
+
+
+class TestSummaryStore(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_dump_and_load(self):
+        gws = GithubWebScraper(cachedir=self.tmpdir)
+        gws.dump_summaries(REPO_URL, {u'1': get_summary(1), 2: get_summary(2)})
+        gws.dump_summaries(REPO_URL, {u'2': get_summary(2, '2017-07-01')})
+
+        # a fresh scraper reads the records back from the store
+        gws = GithubWebScraper(cachedir=self.tmpdir)
+        summaries = gws.load_summaries(REPO_URL)
+        assert sorted(summaries.keys()) == [u'1', u'2']
+        assert summaries[u'2']['updated_at'] == '2017-07-01'
+
+    def test_single_lookup(self):
+        gws = GithubWebScraper(cachedir=self.tmpdir)
+        gws.dump_summaries(REPO_URL, {u'1': get_summary(1)})
+
+        gws = GithubWebScraper(cachedir=self.tmpdir)
+        assert gws.get_single_issue_summary(REPO_URL, 1) == get_summary(1)
+        assert gws.get_single_issue_summary('ansible/ansible', '1') == \
+            get_summary(1)
+        # looking up a single issue doesn't load the whole repo
+        assert gws.summaries == {}
+
+    def test_import_summaries_json(self):
+        cachefile = os.path.join(
+            self.tmpdir, 'ansible', 'ansible', 'summaries.json'
+        )
+        os.makedirs(os.path.dirname(cachefile))
+        with open(cachefile, 'wb') as f:
+            f.write(json.dumps({'3': get_summary(3)}))
+
+        gws = GithubWebScraper(cachedir=self.tmpdir)
+        assert gws.load_summaries(REPO_URL) == {u'3': get_summary(3)}
+        assert gws.load_summary(REPO_URL, 3) == get_summary(3)
@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+
+import unittest
+
+from ansibullbot.utils.write_pacer import WritePacer
+from ansibullbot.utils.write_pacer import parse_limits
+
+
+class FakeClock(object):
+
+    def __init__(self):
+        self.now = 1000.0
+        self.slept = []
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.slept.append(seconds)
+        self.now += seconds
+
+
+class FakeRequester(object):
+
+    def __init__(self, status=200, headers=None):
+        self.status = status
+        self.headers = headers or {}
+        self.sent = []
+
+    def _Requester__requestRaw(self, cnx, verb, url, requestHeaders, input):
+        self.sent.append(verb)
+        return (self.status, self.headers, '{}')
+
+
+def get_pacer(interval=1.0, limits=None):
+    clock = FakeClock()
+    pacer = WritePacer(interval=interval, limits=limits)
+    pacer._time = clock.time
+    pacer._sleep = clock.sleep
+    return (pacer, clock)
+
+
+class TestWritePacer(unittest.TestCase):
+
+    def test_interval(self):
+        (pacer, clock) = get_pacer(interval=1.0)
+        pacer.wait('PUT')
+        pacer.wait('PATCH')
+        assert clock.slept == [1.0]
+        clock.now += 5
+        pacer.wait('DELETE')
+        assert clock.slept == [1.0]
+
+    def test_content_limits(self):
+        (pacer, clock) = get_pacer(interval=0, limits=[(2, 60)])
+        pacer.wait('POST')
+        pacer.wait('POST')
+        # labels and assignees don't count as content
+        pacer.wait('PUT')
+        assert clock.slept == []
+        pacer.wait('POST')
+        assert clock.slept == [60]
+        assert pacer.get_stats() == {
+            'writes': 4, 'content': 3, 'waited': 60, 'blocked': 0
+        }
+
+    def test_install(self):
+        (pacer, clock) = get_pacer(interval=1.0)
+        requester = FakeRequester(
+            status=403,
+            headers={'retry-after': '30'}
+        )
+        pacer.install(requester)
+        requester._Requester__requestRaw(None, 'GET', '/a', {}, None)
+        requester._Requester__requestRaw(None, 'POST', '/a', {}, None)
+        assert clock.slept == []
+        # github asked for 30s
+        requester._Requester__requestRaw(None, 'POST', '/a', {}, None)
+        assert clock.slept == [30]
+        assert requester.sent == ['GET', 'POST', 'POST']
+        assert pacer.get_stats()['blocked'] == 2
+
+    def test_parse_limits(self):
+        assert parse_limits(['20:60', '450:3600', 'bad']) == \
+            [(20, 60), (450, 3600)]
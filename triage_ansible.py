@@ -68,6 +68,15 @@ def main():
     parser.add_argument("--daemonize_interval", type=int, default=(30 * 60),
                         help="seconds to sleep between loop iterations")
 
+    parser.add_argument("--webhooks", action="store_true",
+                        help="triage issues from the webhook queue as they "
+                             "arrive, with a full run every "
+                             "daemonize_interval")
+
+    parser.add_argument("--worker_id", type=str,
+                        help="triage only this worker's share of the issues "
+                             "(see scripts/triage_coordinator.py)")
+
     parser.add_argument("--skiprepo", action='append',
                         help="Github repo to skip triaging")
 